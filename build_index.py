@@ -0,0 +1,78 @@
+"""
+Offline indexing: build the knowledge base for a directory tree of documents.
+Writes the same on-disk index (RAG_DATA_DIR) that server.py loads at startup,
+using the same batched pipeline as /upload/bulk. Stop the server first - the
+index files are not safe to write from two processes at once.
+
+    python build_index.py docs/ --category general
+    python build_index.py library/ --by-folder --workers 8
+"""
+
+import os
+import sys
+import time
+import logging
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+from ocr import extract_pages, UPLOAD_EXTENSIONS
+from rag import KnowledgeBase, EmbeddingCache
+from rag.constants import RAG_DATA_DIR, EMBEDDING_CACHE_SIZE
+from rag.model_loader import load_embedding_model, encoder_name
+from rag.pipeline import ingest_documents
+
+logger = logging.getLogger("build_index")
+
+
+def find_documents(root: str, category: str, by_folder: bool):
+    """(relative path, absolute path, category) for every indexable file under root."""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))
+        for name in sorted(filenames):
+            if name.startswith(".") or os.path.splitext(name)[1].lower() not in UPLOAD_EXTENSIONS:
+                continue
+            path = os.path.join(dirpath, name)
+            rel = os.path.relpath(path, root)
+            source = rel.split(os.sep)[0] if by_folder and os.sep in rel else category
+            yield rel, path, source
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Index a directory of documents into the RAG knowledge base.")
+    parser.add_argument("root", help="Directory to index (walked recursively)")
+    parser.add_argument("--category", default="general", help="Category for all documents (default: general)")
+    parser.add_argument("--by-folder", action="store_true",
+                        help="Use each top-level subfolder's name as the category of the files inside it")
+    parser.add_argument("--data-dir", default=RAG_DATA_DIR, help=f"Index directory (default: {RAG_DATA_DIR})")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) - 1),
+                        help="Extraction / OCR processes (default: CPU count - 1)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+    if not os.path.isdir(args.root):
+        parser.error(f"{args.root} is not a directory")
+    if not args.data_dir:
+        parser.error("an index directory is required (--data-dir or RAG_DATA_DIR)")
+
+    start = time.time()
+    embedding_cache = EmbeddingCache(encoder_name(), max_entries=EMBEDDING_CACHE_SIZE,
+                                     path=os.path.join(args.data_dir, "embedding_cache.sqlite"))
+    kb = KnowledgeBase(load_embedding_model(warmup_batch=0), data_dir=args.data_dir,
+                       embedding_cache=embedding_cache)
+
+    documents = find_documents(args.root, args.category, args.by_folder)
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        result = ingest_documents(kb, documents, extract=extract_pages, executor=executor,
+                                  parallelism=args.workers)
+
+    for doc in result["documents"]:
+        if doc.get("error"):
+            logger.warning(f"FAILED {doc['filename']}: {doc['error']}")
+    logger.info(f"Indexed {len(result['documents']) - result['failed']} documents "
+                f"({result['failed']} failed), {result['chunks']} chunks into {args.data_dir} "
+                f"in {time.time() - start:.1f}s")
+    return 1 if result["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,93 @@
+"""
+Execution pools for blocking work done on behalf of FastAPI / MCP handlers.
+Each class of work gets its own bounded pool, so a slow OCR run or a large
+ingestion never occupies the workers that latency-sensitive searches use,
+and none of it runs on the event loop.
+"""
+
+import os
+import asyncio
+import logging
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger("executors")
+
+# Query encoding + FAISS search (latency-sensitive)
+SEARCH_WORKERS = int(os.getenv("SEARCH_WORKERS", "8"))
+# Streaming ingestion pipelines (extract -> chunk -> embed -> index) running at once;
+# their index writes serialize on the KnowledgeBase write lock
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+# Tesseract / document parsing processes
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+# Of those, how many one PDF's scanned pages may be spread over
+PDF_OCR_WORKERS = int(os.getenv("PDF_OCR_WORKERS", str(OCR_WORKERS)))
+# Direct OCR requests (/api/ocr) fanning a PDF's pages out at once; their threads only
+# wait on the OCR pool, so they get their own pool rather than holding ingest workers
+OCR_REQUEST_WORKERS = int(os.getenv("OCR_REQUEST_WORKERS", "4"))
+# Index maintenance (clearing the store): brief, and already serialized by the KnowledgeBase
+# write lock, so it must not queue behind the upload jobs waiting for ingest workers
+MAINTENANCE_WORKERS = 2
+
+search_executor = ThreadPoolExecutor(max_workers=SEARCH_WORKERS, thread_name_prefix="search")
+ingest_executor = ThreadPoolExecutor(max_workers=INGEST_WORKERS, thread_name_prefix="ingest")
+ocr_request_executor = ThreadPoolExecutor(max_workers=OCR_REQUEST_WORKERS, thread_name_prefix="ocr-request")
+maintenance_executor = ThreadPoolExecutor(max_workers=MAINTENANCE_WORKERS, thread_name_prefix="maintenance")
+
+_ocr_executor = None
+_ocr_lock = threading.Lock()
+
+
+def get_ocr_executor() -> ProcessPoolExecutor:
+    """Process pool for OCR, created on first use so idle servers don't hold worker processes."""
+    global _ocr_executor
+    if _ocr_executor is None:
+        with _ocr_lock:
+            if _ocr_executor is None:
+                _ocr_executor = ProcessPoolExecutor(max_workers=OCR_WORKERS)
+                logger.info(f"OCR process pool started ({OCR_WORKERS} workers)")
+    return _ocr_executor
+
+
+async def _run(executor, fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(fn, *args, **kwargs))
+
+
+async def run_search(fn, *args, **kwargs):
+    """Run a blocking search-path call (encoding, FAISS) on the search pool."""
+    return await _run(search_executor, fn, *args, **kwargs)
+
+
+async def run_ingest(fn, *args, **kwargs):
+    """Run a blocking ingestion call (pipeline, embedding, FAISS add/remove) on the ingest pool."""
+    return await _run(ingest_executor, fn, *args, **kwargs)
+
+
+async def run_maintenance(fn, *args, **kwargs):
+    """Run a blocking index maintenance call (clear) outside the ingest job queue."""
+    return await _run(maintenance_executor, fn, *args, **kwargs)
+
+
+async def run_ocr(fn, *args, **kwargs):
+    """Run a picklable CPU-bound OCR call in the OCR process pool."""
+    return await _run(get_ocr_executor(), fn, *args, **kwargs)
+
+
+async def run_ocr_pages(fn, *args, **kwargs):
+    """Run an extraction call that fans PDF pages out to the OCR pool itself (it waits on an ocr-request thread)."""
+    return await _run(ocr_request_executor, fn, *args, executor=get_ocr_executor(), parallelism=PDF_OCR_WORKERS,
+                      **kwargs)
+
+
+def shutdown():
+    search_executor.shutdown(wait=False, cancel_futures=True)
+    ingest_executor.shutdown(wait=False, cancel_futures=True)
+    ocr_request_executor.shutdown(wait=False, cancel_futures=True)
+    maintenance_executor.shutdown(wait=False, cancel_futures=True)
+    if _ocr_executor is not None:
+        _ocr_executor.shutdown(wait=False, cancel_futures=True)
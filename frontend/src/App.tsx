@@ -133,14 +133,9 @@ const App: React.FC = () => {
         body: formData
       });
       const data = await res.json();
-      if (data.status === "success") {
-        let info = `Loaded: ${file.name}`;
-        if (data.ocr) {
-          info += ` (${data.chars_extracted} chars`;
-          if (data.ocr.tables_found > 0) info += `, ${data.ocr.tables_found} tables`;
-          info += ')';
-        }
-        setFileName(info);
+      if (data.status === "queued") {
+        setFileName(`Queued: ${file.name}`);
+        await followJob(data.job_id, file.name);
       } else {
         setFileName(`Error: ${data.message || 'Upload failed'}`);
       }
@@ -152,6 +147,41 @@ const App: React.FC = () => {
     }
   };
 
+  // Streams ingestion progress for an upload job until it succeeds or fails
+  const followJob = (jobId: string, name: string) => new Promise<void>((resolve) => {
+    const events = new EventSource(`/api/jobs/${jobId}/events`);
+    events.onmessage = (e) => {
+      const job = JSON.parse(e.data);
+      const p = job.progress || {};
+      if (job.status === "succeeded") {
+        const r = job.result || {};
+        let info = `Loaded: ${name}`;
+        if (r.ocr) {
+          info += ` (${r.chars_extracted} chars`;
+          if (r.ocr.tables_found > 0) info += `, ${r.ocr.tables_found} tables`;
+          info += ')';
+        }
+        setFileName(info);
+      } else if (job.status === "failed") {
+        setFileName(`Error: ${job.error || 'Indexing failed'}`);
+      } else if (job.status === "retrying") {
+        setFileName(`Retrying: ${name} (attempt ${job.attempts + 1})`);
+      } else if (job.status === "running") {
+        const pages = p.pages_extracted ? `page ${p.pages_extracted}${p.pages_total ? `/${p.pages_total}` : ''}, ` : '';
+        setFileName(`Indexing: ${name} (${pages}${p.vectors_indexed || 0} chunks)`);
+      }
+      if (job.status === "succeeded" || job.status === "failed") {
+        events.close();
+        resolve();
+      }
+    };
+    events.onerror = () => {
+      events.close();
+      setFileName(`Indexing in background: ${name}`);
+      resolve();
+    };
+  });
+
   const sendMessage = async () => {
     const message = chatInput.trim();
     if (!message || isSending) return;
@@ -0,0 +1,218 @@
+"""
+Background job queue for document ingestion.
+/upload enqueues a job and returns its id at once; the job runs on the
+bounded ingest pool, reports per-stage progress, and is retried on failure.
+"""
+
+import os
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Executor
+from typing import Any, Callable, Dict, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger("jobs")
+
+# Jobs waiting or running at once; further submissions are rejected until some finish
+JOB_QUEUE_MAX = int(os.getenv("JOB_QUEUE_MAX", "100"))
+# Attempts per job before it is marked failed (1 = no automatic retry)
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# Seconds before the first automatic retry; doubles on each further attempt
+JOB_RETRY_DELAY = float(os.getenv("JOB_RETRY_DELAY", "2"))
+# Finished jobs kept for status queries
+JOB_HISTORY = int(os.getenv("JOB_HISTORY", "500"))
+# Seconds a failed job's input (e.g. the uploaded file) is kept for a manual retry
+JOB_RETRY_WINDOW = float(os.getenv("JOB_RETRY_WINDOW", "900"))
+
+QUEUED = "queued"
+RUNNING = "running"
+RETRYING = "retrying"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+TERMINAL = {SUCCEEDED, FAILED}
+
+
+class QueueFull(Exception):
+    """Raised when JOB_QUEUE_MAX jobs are already waiting or running."""
+
+
+class JobFailed(Exception):
+    """Raised by a job to fail at once, for errors a retry cannot fix (e.g. an empty document)."""
+
+
+class Job:
+    """One ingestion run, with progress counters updated from worker threads."""
+
+    def __init__(self, run: Callable[["Job"], Any], kind: str, info: Dict[str, Any]):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.info = info
+        self.status = QUEUED
+        self.attempts = 0
+        self.progress: Dict[str, Any] = {}
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        # Bumped on every change so watchers (SSE) can tell when to push an update
+        self.revision = 0
+        self._run = run
+        self._lock = threading.Lock()
+
+    def update(self, **progress):
+        """Merge progress counters, e.g. update(pages_extracted=3)."""
+        with self._lock:
+            self.progress.update(progress)
+            self.revision += 1
+
+    def _set(self, **fields):
+        with self._lock:
+            for name, value in fields.items():
+                setattr(self, name, value)
+            self.revision += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "job_id": self.id,
+                "kind": self.kind,
+                "status": self.status,
+                "attempts": self.attempts,
+                "progress": dict(self.progress),
+                "result": self.result,
+                "error": self.error,
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "retryable": self.status == FAILED and self._run is not None,
+                **self.info,
+            }
+
+
+class JobQueue:
+    """Bounded queue of retryable jobs executed on an existing pool."""
+
+    def __init__(self, executor: Executor, max_pending: int = JOB_QUEUE_MAX,
+                 max_attempts: int = JOB_MAX_ATTEMPTS, retry_delay: float = JOB_RETRY_DELAY,
+                 history: int = JOB_HISTORY, retry_window: float = JOB_RETRY_WINDOW):
+        """
+        Args:
+            executor: Pool the jobs run on (its size bounds concurrency)
+            max_pending: Jobs allowed to be queued or running at once
+            max_attempts: Automatic attempts per job
+            retry_delay: Initial backoff between attempts, in seconds
+            history: Finished jobs kept for lookup
+            retry_window: Seconds a failed job stays retryable before its input is released
+        """
+        self.executor = executor
+        self.max_pending = max_pending
+        self.max_attempts = max(1, max_attempts)
+        self.retry_delay = retry_delay
+        self.history = history
+        self.retry_window = retry_window
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _pending(self) -> int:
+        return sum(1 for job in self._jobs.values() if job.status not in TERMINAL)
+
+    def submit(self, run: Callable[[Job], Any], kind: str = "ingest", **info) -> Job:
+        """
+        Enqueue run(job); run may call job.update(...) to report progress.
+
+        Raises:
+            QueueFull: if max_pending jobs are already waiting or running
+        """
+        job = Job(run, kind, info)
+        with self._lock:
+            if self._pending() >= self.max_pending:
+                raise QueueFull(f"{self.max_pending} jobs already queued")
+            self._jobs[job.id] = job
+            self._trim()
+        self._schedule(job)
+        logger.info(f"Job {job.id} queued ({kind}: {info})")
+        return job
+
+    def retry(self, job_id: str) -> Optional[Job]:
+        """
+        Re-run a failed job from scratch; returns None if it is unknown, not failed, or
+        no longer retryable (failed with JobFailed, or its retry window has passed).
+        """
+        job = self.get(job_id)
+        if job is None:
+            return None
+        with self._lock:
+            if job.status != FAILED or job._run is None:
+                return None
+            if self._pending() >= self.max_pending:
+                raise QueueFull(f"{self.max_pending} jobs already queued")
+            job._set(status=QUEUED, attempts=0, error=None, result=None, finished_at=None, progress={})
+        self._schedule(job)
+        logger.info(f"Job {job.id} re-queued")
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self, limit: int = 50):
+        with self._lock:
+            jobs = list(self._jobs.values())[-limit:]
+        return [job.to_dict() for job in reversed(jobs)]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            counts: Dict[str, int] = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            return counts
+
+    def _schedule(self, job: Job, delay: float = 0):
+        if delay > 0:
+            timer = threading.Timer(delay, self._schedule, args=(job,))
+            timer.daemon = True
+            timer.start()
+            return
+        self.executor.submit(self._execute, job)
+
+    def _execute(self, job: Job):
+        job._set(status=RUNNING, attempts=job.attempts + 1, started_at=job.started_at or time.time())
+        try:
+            result = job._run(job)
+        except Exception as e:
+            if job.attempts < self.max_attempts and not isinstance(e, JobFailed):
+                delay = self.retry_delay * (2 ** (job.attempts - 1))
+                logger.warning(f"Job {job.id} attempt {job.attempts} failed: {e} - retrying in {delay:.1f}s")
+                job._set(status=RETRYING, error=str(e))
+                self._schedule(job, delay)
+            else:
+                logger.error(f"Job {job.id} failed after {job.attempts} attempts: {e}")
+                job._set(status=FAILED, error=str(e), finished_at=time.time())
+                if isinstance(e, JobFailed) or self.retry_window <= 0:
+                    job._run = None  # a retry can't succeed: release the input now
+                else:
+                    timer = threading.Timer(self.retry_window, self._expire, args=(job, job.finished_at))
+                    timer.daemon = True
+                    timer.start()
+            return
+        job._set(status=SUCCEEDED, result=result, error=None, finished_at=time.time())
+        job._run = None  # release the job's input (e.g. uploaded file bytes)
+        logger.info(f"Job {job.id} succeeded in {job.finished_at - job.started_at:.1f}s")
+
+    def _expire(self, job: Job, finished_at: float):
+        """Release a failed job's input once its retry window has passed (unless it was retried since)."""
+        with self._lock:
+            if job.status == FAILED and job.finished_at == finished_at:
+                job._run = None
+
+    def _trim(self):
+        """Forget the oldest finished jobs beyond the history limit."""
+        finished = [job_id for job_id, job in self._jobs.items() if job.status in TERMINAL]
+        for job_id in finished[:max(0, len(finished) - self.history)]:
+            del self._jobs[job_id]
@@ -1,14 +1,26 @@
 """
-OCR Module - Pytesseract-based OCR with structured extraction
+OCR Module - Tesseract OCR (tesserocr or pytesseract) with structured extraction
 Supports: PDF, DOCX, MD, Images (PNG, JPG, JPEG, TIFF, BMP)
 """
 
 from .extractor import OCRExtractor
 from .table_extractor import TableExtractor
-from .file_handlers import process_file
+from .result import OCRResult, OCRWord
+from .engine import OCREngine, get_engine
+from .cache import OCRCache, get_ocr_cache
+from .file_handlers import process_file, iter_pages, extract_pages, UPLOAD_EXTENSIONS
 
 __all__ = [
     'OCRExtractor',
     'TableExtractor',
+    'OCRResult',
+    'OCRWord',
+    'OCREngine',
+    'get_engine',
+    'OCRCache',
+    'get_ocr_cache',
     'process_file',
+    'iter_pages',
+    'extract_pages',
+    'UPLOAD_EXTENSIONS',
 ]
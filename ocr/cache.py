@@ -0,0 +1,161 @@
+"""
+Disk-backed cache of OCR results for page images.
+Entries are keyed by a hash of the image's pixels plus the OCR language, engine
+and preprocessing settings, so re-uploaded scans and pages shared between
+documents (cover pages, letterheads, standard annexes) cost a hash lookup
+instead of a Tesseract run. Each entry holds the recognized words (text and
+boxes) and the tables; the least recently used entries are evicted once the
+cache grows past its size limit.
+"""
+
+import os
+import json
+import time
+import zlib
+import hashlib
+import logging
+import sqlite3
+import threading
+from typing import List, Optional, Tuple
+
+from PIL import Image
+
+from .result import OCRResult
+
+logger = logging.getLogger("ocr.cache")
+
+# SQLite file shared by all OCR processes; empty disables the cache
+OCR_CACHE_PATH = os.getenv("OCR_CACHE_PATH", os.path.join("data", "ocr_cache.sqlite"))
+# Evict least recently used pages beyond this much stored (compressed) data
+OCR_CACHE_MAX_MB = float(os.getenv("OCR_CACHE_MAX_MB", "256"))
+# A hit only rewrites an entry's last_used once it is this many seconds old (LRU granularity)
+TOUCH_INTERVAL = 600
+# Re-read the total size from the table after this fraction of the limit was written by this
+# process, since other processes write to the same file
+SYNC_FRACTION = 1 / 16
+
+
+class OCRCache:
+    """Page OCR results in SQLite, evicted LRU by total payload size. Safe to share between processes."""
+
+    def __init__(self, path: str, max_bytes: int):
+        """
+        Args:
+            path: SQLite file (created if missing)
+            max_bytes: Total compressed payload kept before the oldest entries are evicted
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # OCR pool processes write concurrently: WAL lets readers proceed, writers wait their turn
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS ocr_pages ("
+            "key TEXT PRIMARY KEY, payload BLOB NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS ocr_pages_last_used ON ocr_pages (last_used)")
+        self._db.commit()
+        # Running total of stored payload, so puts don't sum the table
+        self._total = self._sum_sizes()
+        self._unsynced = 0  # bytes written here since _total was last read from the table
+
+    @staticmethod
+    def key(image: Image.Image, settings: str) -> str:
+        """Exact hash of the image's pixels and the settings that produced its OCR output."""
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(f"{settings}\0{image.mode}\0{image.width}x{image.height}\0".encode("utf-8"))
+        digest.update(image.tobytes())
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[Tuple[OCRResult, List[List[str]]]]:
+        """(OCRResult, tables) stored under key, or None."""
+        with self._lock:
+            try:
+                row = self._db.execute("SELECT payload, last_used FROM ocr_pages WHERE key = ?", (key,)).fetchone()
+                # Keep hits read-only unless the recorded use is stale enough to matter for eviction
+                now = time.time()
+                if row is not None and now - row[1] > TOUCH_INTERVAL:
+                    self._db.execute("UPDATE ocr_pages SET last_used = ? WHERE key = ?", (now, key))
+                    self._db.commit()
+            except sqlite3.Error as e:
+                # A cache problem must never fail the OCR itself
+                logger.warning(f"OCR cache read failed: {e}")
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        entry = json.loads(zlib.decompress(row[0]))
+        result = OCRResult.from_data(entry["data"])
+        result.blank = entry["blank"]
+        return result, entry["tables"]
+
+    def put(self, key: str, result: OCRResult, tables: List[List[str]]):
+        payload = zlib.compress(json.dumps(
+            {"data": result.to_data(), "blank": result.blank, "tables": tables}, ensure_ascii=False
+        ).encode("utf-8"))
+        with self._lock:
+            try:
+                old = self._db.execute("SELECT size FROM ocr_pages WHERE key = ?", (key,)).fetchone()
+                self._db.execute(
+                    "INSERT OR REPLACE INTO ocr_pages (key, payload, size, last_used) VALUES (?, ?, ?, ?)",
+                    (key, payload, len(payload), time.time()),
+                )
+                self._total += len(payload) - (old[0] if old else 0)
+                self._unsynced += len(payload)
+                if self._total > self.max_bytes or self._unsynced > self.max_bytes * SYNC_FRACTION:
+                    self._total, self._unsynced = self._sum_sizes(), 0
+                    self._evict()
+                self._db.commit()
+            except sqlite3.Error as e:
+                self._db.rollback()
+                self._unsynced = self.max_bytes  # re-read the total on the next put
+                logger.warning(f"OCR cache write failed: {e}")
+
+    def _sum_sizes(self) -> int:
+        return self._db.execute("SELECT COALESCE(SUM(size), 0) FROM ocr_pages").fetchone()[0]
+
+    def _evict(self):
+        total = self._total
+        if total <= self.max_bytes:
+            return
+        excess, keys = total - self.max_bytes, []
+        for key, size in self._db.execute("SELECT key, size FROM ocr_pages ORDER BY last_used"):
+            keys.append(key)
+            excess -= size
+            self._total -= size
+            if excess <= 0:
+                break
+        self._db.executemany("DELETE FROM ocr_pages WHERE key = ?", [(key,) for key in keys])
+        logger.info(f"OCR cache: evicted {len(keys)} pages ({total} bytes > {self.max_bytes})")
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM ocr_pages").fetchone()
+            return {"entries": entries, "bytes": size, "hits": self.hits, "misses": self.misses}
+
+
+_cache = None
+_cache_pid = None
+_cache_lock = threading.Lock()
+
+
+def get_ocr_cache() -> Optional[OCRCache]:
+    """This process's OCRCache (SQLite connections must not cross a fork), or None if disabled."""
+    global _cache, _cache_pid
+    if not OCR_CACHE_PATH:
+        return None
+    if _cache_pid != os.getpid():
+        with _cache_lock:
+            if _cache_pid != os.getpid():
+                try:
+                    _cache = OCRCache(OCR_CACHE_PATH, int(OCR_CACHE_MAX_MB * 1024 * 1024))
+                except (sqlite3.Error, OSError) as e:
+                    logger.warning(f"OCR cache unavailable at {OCR_CACHE_PATH}: {e}")
+                    _cache = None
+                _cache_pid = os.getpid()
+    return _cache
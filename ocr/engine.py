@@ -0,0 +1,138 @@
+"""
+OCR engines: what actually runs Tesseract over an image.
+"tesserocr" keeps one libtesseract instance alive per worker thread (language
+data loaded once, images handed over in memory); "pytesseract" starts the
+tesseract binary for every call and is the fallback when tesserocr is missing.
+"""
+
+import os
+import logging
+import threading
+from typing import Dict
+
+from PIL import Image
+import pytesseract
+
+from .result import OCRResult, OCRWord
+
+logger = logging.getLogger("ocr.engine")
+
+# "auto" uses tesserocr when it is installed and pytesseract otherwise
+OCR_ENGINE = os.getenv("OCR_ENGINE", "auto").lower()
+# Tesseract page segmentation mode (3 = fully automatic, Tesseract's default)
+OCR_PSM = int(os.getenv("OCR_PSM", "3"))
+
+
+class OCREngine:
+    """Base engine: recognize() runs one OCR pass over a PIL image."""
+
+    name = "base"
+
+    def __init__(self, lang: str = "eng", psm: int = OCR_PSM):
+        self.lang = lang
+        self.psm = psm
+
+    def recognize(self, image: Image.Image) -> OCRResult:
+        raise NotImplementedError
+
+    def settings(self) -> str:
+        """Everything that changes this engine's output for a given image."""
+        return f"{self.name}:{self.lang}:psm{self.psm}"
+
+
+class PytesseractEngine(OCREngine):
+    """Runs the tesseract binary per call (temp files, process start-up and model load every time)."""
+
+    name = "pytesseract"
+
+    def recognize(self, image: Image.Image) -> OCRResult:
+        data = pytesseract.image_to_data(image, lang=self.lang, config=f"--psm {self.psm}",
+                                         output_type=pytesseract.Output.DICT)
+        return OCRResult.from_data(data)
+
+
+class TesserocrEngine(OCREngine):
+    """Persistent libtesseract instance; not thread-safe, so use one per thread (see get_engine)."""
+
+    name = "tesserocr"
+
+    def __init__(self, lang: str = "eng", psm: int = OCR_PSM):
+        super().__init__(lang, psm)
+        import tesserocr
+
+        self._tesserocr = tesserocr
+        self._api = tesserocr.PyTessBaseAPI(lang=lang, psm=psm)
+
+    def recognize(self, image: Image.Image) -> OCRResult:
+        tesserocr = self._tesserocr
+        RIL = tesserocr.RIL
+        api = self._api
+        api.SetImage(image)
+        api.Recognize()
+        iterator = api.GetIterator()
+        words = []
+        block = par = line = 0
+        # Number blocks / paragraphs / lines the way image_to_data does (par and line restart per parent)
+        for word in tesserocr.iterate_level(iterator, RIL.WORD) if iterator is not None else ():
+            if word.IsAtBeginningOf(RIL.BLOCK):
+                block, par, line = block + 1, 0, 0
+            if word.IsAtBeginningOf(RIL.PARA):
+                par, line = par + 1, 0
+            if word.IsAtBeginningOf(RIL.TEXTLINE):
+                line += 1
+            text = (word.GetUTF8Text(RIL.WORD) or "").strip()
+            box = word.BoundingBox(RIL.WORD)
+            if not text or box is None:
+                continue
+            x1, y1, x2, y2 = box
+            words.append(OCRWord(text, x1, y1, x2 - x1, y2 - y1, max(float(word.Confidence(RIL.WORD)), 0.0),
+                                 block, par, line))
+        api.Clear()
+        return OCRResult(words)
+
+    def close(self):
+        self._api.End()
+
+
+# engine name -> class
+BACKENDS = {
+    "tesserocr": TesserocrEngine,
+    "pytesseract": PytesseractEngine,
+}
+
+_local = threading.local()
+
+
+def get_engine(lang: str = "eng", backend: str = OCR_ENGINE) -> OCREngine:
+    """
+    This thread's engine for a language, created on first use and kept for the life
+    of the worker (so a pool process loads each language's model once).
+
+    Args:
+        lang: Tesseract language code (e.g. 'eng', 'eng+tam')
+        backend: "auto", "tesserocr" or "pytesseract"
+    """
+    engines: Dict[tuple, OCREngine] = getattr(_local, "engines", None)
+    if engines is None:
+        engines = _local.engines = {}
+    key = (backend, lang)
+    engine = engines.get(key)
+    if engine is None:
+        engine = engines[key] = _create_engine(lang, backend)
+    return engine
+
+
+def _create_engine(lang: str, backend: str) -> OCREngine:
+    if backend not in BACKENDS and backend != "auto":
+        raise ValueError(f"Unknown OCR_ENGINE '{backend}' (expected auto or one of {', '.join(BACKENDS)})")
+    if backend in ("auto", "tesserocr"):
+        try:
+            engine = TesserocrEngine(lang)
+            logger.info(f"OCR engine: tesserocr ({lang}) in pid {os.getpid()}")
+            return engine
+        except ImportError:
+            if backend == "tesserocr":
+                logger.warning("OCR_ENGINE=tesserocr but tesserocr is not installed; falling back to pytesseract")
+        except Exception as e:
+            logger.warning(f"Could not start tesserocr for '{lang}' ({e}); falling back to pytesseract")
+    return PytesseractEngine(lang)
@@ -1,79 +1,120 @@
 """
-Core OCR extraction using pytesseract.
-Handles image-to-text conversion with preprocessing.
+Core OCR extraction using Tesseract (a persistent tesserocr engine, or pytesseract).
+Handles image-to-text conversion with preprocessing. Each image is recognized
+once into an OCRResult that both text and tables are read from.
 """
 
+import time
 import logging
-from PIL import Image, ImageFilter, ImageEnhance
+from PIL import Image
 import pytesseract
 
+from .result import OCRResult
+from .engine import OCREngine, get_engine
+from .preprocess import prepare, preprocess_settings
+
 logger = logging.getLogger("ocr")
 
 
 class OCRExtractor:
-    """Pytesseract-based OCR extractor with image preprocessing."""
+    """Tesseract OCR extractor with image preprocessing."""
 
-    def __init__(self, lang: str = "eng", tesseract_cmd: str = None):
+    def __init__(self, lang: str = "eng", tesseract_cmd: str = None, engine: OCREngine = None):
         """
         Args:
             lang: Tesseract language code (e.g., 'eng', 'tam', 'tel', 'eng+tam')
-            tesseract_cmd: Path to tesseract executable (auto-detected if None)
+            tesseract_cmd: Path to tesseract executable for the pytesseract engine (auto-detected if None)
+            engine: OCR engine to run (this thread's shared engine for lang if None)
         """
         self.lang = lang
+        self._engine = engine
         if tesseract_cmd:
             pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
 
+    @property
+    def engine(self) -> OCREngine:
+        if self._engine is None:
+            self._engine = get_engine(self.lang)
+        return self._engine
+
+    def settings(self) -> str:
+        """Engine, language and preprocessing settings: everything besides the pixels that shapes the output."""
+        return f"{self.engine.settings()}|{preprocess_settings()}"
+
     def preprocess_image(self, image: Image.Image) -> Image.Image:
-        """Preprocess image for better OCR accuracy."""
-        # Convert to grayscale
-        img = image.convert("L")
-        # Increase contrast
-        enhancer = ImageEnhance.Contrast(img)
-        img = enhancer.enhance(2.0)
-        # Sharpen
-        img = img.filter(ImageFilter.SHARPEN)
-        # Binarize (threshold)
-        img = img.point(lambda x: 0 if x < 140 else 255, "1")
-        return img
+        """Preprocess image for better OCR accuracy (grayscale + adaptive binarization, see ocr.preprocess)."""
+        prepared = prepare(image)
+        return prepared.image if not prepared.blank else image.convert("L")
 
-    def extract_text(self, image: Image.Image, preprocess: bool = True) -> str:
+    def recognize(self, image: Image.Image, preprocess: bool = True) -> OCRResult:
         """
-        Extract text from a PIL Image.
+        Run Tesseract once over an image.
 
         Args:
             image: PIL Image object
-            preprocess: Whether to preprocess the image first
+            preprocess: Whether to preprocess the image first (blank images then skip OCR)
 
         Returns:
-            Extracted text string
+            OCRResult with the text, word boxes (in the input image's coordinates), lines, confidence
+            and per-stage timings (empty on failure or for blank images)
         """
+        timings = {}
+        scale, angle, scaled_size = 1.0, 0.0, None
         if preprocess:
-            image = self.preprocess_image(image)
+            prepared = prepare(image)
+            timings = prepared.timings
+            if prepared.blank:
+                result = OCRResult(blank=True)
+                result.timings = timings
+                logger.debug(f"Blank image {image.size}, OCR skipped ({_format_timings(timings)})")
+                return result
+            image, scale = prepared.image, prepared.scale
+            angle, scaled_size = prepared.angle, prepared.scaled_size
 
+        start = time.perf_counter()
         try:
-            text = pytesseract.image_to_string(image, lang=self.lang)
-            return text.strip()
+            result = self.engine.recognize(image)
         except Exception as e:
             logger.error(f"OCR extraction failed: {e}")
-            return ""
+            return OCRResult(error=str(e))
+        timings["ocr"] = (time.perf_counter() - start) * 1000
+        # Map boxes back to the input image: undo the deskew rotation, then the scaling
+        if angle:
+            result = result.unrotated(angle, scaled_size, image.size)
+        if scale != 1.0:
+            result = result.scaled(1 / scale)
+        result.timings = timings
+        logger.debug(f"OCR {image.size}: {len(result.words)} words ({_format_timings(timings)})")
+        return result
+
+    def extract_text(self, image: Image.Image, preprocess: bool = True) -> str:
+        """
+        Extract text from a PIL Image.
+
+        Args:
+            image: PIL Image object
+            preprocess: Whether to preprocess the image first
+
+        Returns:
+            Extracted text string
+        """
+        return self.recognize(image, preprocess).text.strip()
 
     def extract_with_details(self, image: Image.Image) -> dict:
         """
         Extract text with bounding box and confidence data.
 
         Returns:
-            Dict with 'text', 'data' (TSV parsed), and 'hocr' keys
+            Dict with 'text', 'data' (image_to_data-style columns), 'confidence' and 'timings' keys
         """
-        if image.mode != "L":
-            image = self.preprocess_image(image)
+        result = self.recognize(image, preprocess=image.mode != "L")
+        return {
+            "text": result.text.strip(),
+            "data": result.to_data(),
+            "confidence": result.confidence,
+            "timings": result.timings,
+        }
 
-        try:
-            text = pytesseract.image_to_string(image, lang=self.lang)
-            data = pytesseract.image_to_data(image, lang=self.lang, output_type=pytesseract.Output.DICT)
-            return {
-                "text": text.strip(),
-                "data": data,
-            }
-        except Exception as e:
-            logger.error(f"OCR detailed extraction failed: {e}")
-            return {"text": "", "data": {}}
+
+def _format_timings(timings: dict) -> str:
+    return ", ".join(f"{stage} {ms:.1f}ms" for stage, ms in timings.items())
@@ -6,20 +6,30 @@ Supports: PDF, DOCX, MD, Images (PNG, JPG, JPEG, TIFF, BMP, WEBP)
 import os
 import io
 import logging
-from typing import Dict, Any, List
+from concurrent.futures import Executor
+from typing import Dict, Any, Iterator, List, Tuple
 from PIL import Image
 
 from .extractor import OCRExtractor
 from .table_extractor import TableExtractor
+from .result import OCRResult
+from .cache import get_ocr_cache
 
 logger = logging.getLogger("ocr.handlers")
 
 # Supported file extensions
 IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".tiff", ".tif", ".bmp", ".webp"}
 DOCUMENT_EXTENSIONS = {".pdf", ".docx", ".doc", ".md", ".txt"}
+# Source code / data files indexed as plain text
+TEXT_EXTENSIONS = {".py", ".json"}
+# Everything the upload endpoints and build_index.py accept
+UPLOAD_EXTENSIONS = IMAGE_EXTENSIONS | DOCUMENT_EXTENSIONS | TEXT_EXTENSIONS
+# Page ranges per worker when a PDF's scanned pages are spread over a process pool
+PDF_RANGES_PER_WORKER = 2
 
 
-def process_file(file_bytes: bytes, filename: str, lang: str = "eng") -> Dict[str, Any]:
+def process_file(file_bytes: bytes, filename: str, lang: str = "eng", executor: Executor = None,
+                 parallelism: int = 1) -> Dict[str, Any]:
     """
     Process any supported file and extract text + structured data.
 
@@ -27,6 +37,8 @@ def process_file(file_bytes: bytes, filename: str, lang: str = "eng") -> Dict[st
         file_bytes: Raw file bytes
         filename: Original filename (used to detect type)
         lang: Tesseract language code
+        executor: Process pool to OCR a PDF's scanned pages on (in-process if None)
+        parallelism: Worker processes one PDF may use at once
 
     Returns:
         Dict with keys: text, tables, key_value_pairs, file_type, pages
@@ -36,7 +48,7 @@ def process_file(file_bytes: bytes, filename: str, lang: str = "eng") -> Dict[st
     if ext in IMAGE_EXTENSIONS:
         return _process_image(file_bytes, lang)
     elif ext == ".pdf":
-        return _process_pdf(file_bytes, lang)
+        return _process_pdf(file_bytes, lang, executor, parallelism)
     elif ext in (".docx", ".doc"):
         return _process_docx(file_bytes, lang)
     elif ext in (".md", ".txt"):
@@ -53,6 +65,80 @@ def process_file(file_bytes: bytes, filename: str, lang: str = "eng") -> Dict[st
         }
 
 
+def iter_pages(file_bytes: bytes, filename: str, lang: str = "eng", executor: Executor = None,
+               parallelism: int = 1) -> Iterator[Dict[str, Any]]:
+    """
+    Extract a file incrementally, one page at a time, for streaming ingestion.
+
+    PDFs are yielded page by page as they are read / OCR'd (plus a trailing
+    segment with the extracted tables); other formats are a single segment,
+    with unrecognised extensions decoded as UTF-8 text.
+    Joining the segment texts with blank lines gives process_file()'s text.
+
+    Args:
+        file_bytes: Raw file bytes
+        filename: Original filename (used to detect type)
+        lang: Tesseract language code
+        executor: Process pool to OCR a PDF's scanned pages on (in-process if None)
+        parallelism: Worker processes one PDF may use at once
+
+    Yields:
+        Dicts with keys: page, pages, text, tables, key_value_pairs, file_type, ocr
+    """
+    ext = os.path.splitext(filename)[1].lower()
+    if ext == ".pdf":
+        yield from _iter_pdf_pages(file_bytes, lang, executor, parallelism)
+        return
+    if ext not in IMAGE_EXTENSIONS and ext not in DOCUMENT_EXTENSIONS:
+        # Source code, JSON and other plain-text formats are indexed as-is
+        yield {"page": 1, "pages": 1, "text": file_bytes.decode("utf-8", errors="ignore"),
+               "tables": [], "key_value_pairs": {}, "file_type": "text", "ocr": False}
+        return
+
+    result = process_file(file_bytes, filename, lang)
+    yield {
+        "page": 1,
+        "pages": result.get("pages", 0),
+        "text": result.get("text", ""),
+        "tables": result.get("tables", []),
+        "key_value_pairs": result.get("key_value_pairs", {}),
+        "file_type": result.get("file_type", ext),
+        "ocr": result.get("file_type") == "image",
+    }
+
+
+def extract_pages(source, filename: str, lang: str = "eng") -> List[Dict[str, Any]]:
+    """
+    All of iter_pages() for one file, as a list - for process pools, which can't stream.
+
+    Args:
+        source: Raw file bytes, or a path the worker reads itself (avoids pickling large files)
+        filename: Original filename (used to detect type)
+        lang: Tesseract language code
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            source = f.read()
+    return list(iter_pages(source, filename, lang))
+
+
+def _ocr_image(image: Image.Image, ocr: OCRExtractor,
+               table_ext: TableExtractor) -> Tuple[OCRResult, List[List[str]]]:
+    """OCR result and tables of one image, from the OCR cache when these exact pixels were seen before."""
+    cache = get_ocr_cache()
+    key = cache.key(image, ocr.settings()) if cache is not None else None
+    if key is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+    result = ocr.recognize(image)
+    tables = table_ext.tables_from_result(result)
+    if key is not None and result.error is None:
+        cache.put(key, result, tables)
+    return result, tables
+
+
 def _process_image(file_bytes: bytes, lang: str) -> Dict[str, Any]:
     """Process a single image file."""
     ocr = OCRExtractor(lang=lang)
@@ -60,11 +146,9 @@ def _process_image(file_bytes: bytes, lang: str) -> Dict[str, Any]:
 
     image = Image.open(io.BytesIO(file_bytes))
 
-    # Extract text
-    text = ocr.extract_text(image)
-
-    # Extract structured data
-    tables = table_ext.extract_tables(image)
+    # One OCR pass (or cache hit) for text and structured data
+    result, tables = _ocr_image(image, ocr, table_ext)
+    text = result.text.strip()
     kv_pairs = table_ext.extract_key_value_pairs(text)
 
     # Format tables as text and append to main text
@@ -82,58 +166,149 @@ def _process_image(file_bytes: bytes, lang: str) -> Dict[str, Any]:
     }
 
 
-def _process_pdf(file_bytes: bytes, lang: str) -> Dict[str, Any]:
+def _process_pdf(file_bytes: bytes, lang: str, executor: Executor = None, parallelism: int = 1) -> Dict[str, Any]:
     """Process PDF - use pymupdf for text extraction, fallback to OCR for scanned pages."""
+    all_text = []
+    all_tables = []
+    all_kv = {}
+    ocr_pages = 0
+    num_pages = 0
+
+    for page in _iter_pdf_pages(file_bytes, lang, executor, parallelism):
+        num_pages = page["pages"]
+        ocr_pages += int(page["ocr"])
+        all_tables.extend(page["tables"])
+        all_kv.update(page["key_value_pairs"])
+        if page["text"]:
+            all_text.append(page["text"])
+
+    return {
+        "text": "\n\n".join(all_text),
+        "tables": all_tables,
+        "key_value_pairs": all_kv,
+        "file_type": "pdf",
+        "pages": num_pages,
+        "ocr_pages": ocr_pages,
+    }
+
+
+def _iter_pdf_pages(file_bytes: bytes, lang: str, executor: Executor = None,
+                    parallelism: int = 1) -> Iterator[Dict[str, Any]]:
+    """
+    Yield each PDF page as it is extracted, then a final segment with the formatted tables.
+
+    With an executor (a process pool) and parallelism > 1, scanned pages are OCR'd in
+    page ranges across up to `parallelism` processes, while pages with a text layer are
+    read here; pages are still yielded in page order.
+    """
     import fitz  # pymupdf
 
     ocr = OCRExtractor(lang=lang)
     table_ext = TableExtractor(lang=lang)
 
     doc = fitz.open(stream=file_bytes, filetype="pdf")
-    all_text = []
     all_tables = []
-    all_kv = {}
-    ocr_pages = 0
     num_pages = len(doc)
 
-    for page_num in range(num_pages):
-        page = doc[page_num]
-        page_text = page.get_text("text") or ""
+    try:
+        if executor is not None and parallelism > 1:
+            pages = _fan_out_pdf_pages(doc, file_bytes, lang, executor, parallelism, ocr, table_ext)
+        else:
+            pages = (_extract_pdf_page(doc[page_num], num_pages, ocr, table_ext) for page_num in range(num_pages))
+        for page in pages:
+            all_tables.extend(page["tables"])
+            yield page
+    finally:
+        doc.close()
 
-        if len(page_text.strip()) < 50:
-            # Page likely scanned/image-based - render as image and OCR
-            ocr_pages += 1
-            pix = page.get_pixmap(dpi=200)
-            img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+    if all_tables:
+        yield {
+            "page": None,
+            "pages": num_pages,
+            "text": "--- Extracted Tables ---\n" + table_ext.format_table_as_text(all_tables),
+            "tables": [],
+            "key_value_pairs": {},
+            "file_type": "pdf",
+            "ocr": False,
+        }
 
-            ocr_text = ocr.extract_text(img)
-            if ocr_text:
-                page_text += "\n" + ocr_text
 
-            tables = table_ext.extract_tables(img)
-            if tables:
-                all_tables.extend(tables)
+def _fan_out_pdf_pages(doc, file_bytes: bytes, lang: str, executor: Executor, parallelism: int,
+                       ocr: OCRExtractor, table_ext: TableExtractor) -> Iterator[Dict[str, Any]]:
+    """Yield pages in order, OCR'ing the scanned ones in page ranges on the executor."""
+    num_pages = len(doc)
+    texts = [doc[page_num].get_text("text") or "" for page_num in range(num_pages)]
+    scanned = [page_num for page_num, text in enumerate(texts) if _is_scanned(text)]
+    # A few ranges per worker, so the first pages come back (and stream on) early
+    n_ranges = min(len(scanned), parallelism * PDF_RANGES_PER_WORKER)
+    ranges = [scanned[i * len(scanned) // n_ranges:(i + 1) * len(scanned) // n_ranges] for i in range(n_ranges)]
+    owner = {page_num: (r, i) for r, pages in enumerate(ranges) for i, page_num in enumerate(pages)}
+    futures = {}
 
-        kv = table_ext.extract_key_value_pairs(page_text)
-        all_kv.update(kv)
+    try:
+        for page_num in range(num_pages):
+            if page_num not in owner:
+                yield _extract_pdf_page(doc[page_num], num_pages, ocr, table_ext, texts[page_num])
+                continue
+            r, i = owner[page_num]
+            # Keep at most `parallelism` ranges of this document in flight
+            for ahead in range(r, min(r + parallelism, n_ranges)):
+                if ahead not in futures:
+                    futures[ahead] = executor.submit(_extract_pdf_range, file_bytes, lang, ranges[ahead])
+            page = futures[r].result()[i]
+            if i == len(ranges[r]) - 1:
+                del futures[r]
+            yield page
+    finally:
+        for future in futures.values():
+            future.cancel()
+
+
+def _extract_pdf_range(file_bytes: bytes, lang: str, page_nums: List[int]) -> List[Dict[str, Any]]:
+    """Worker task: open the PDF from its bytes and extract the given pages, in order."""
+    import fitz  # pymupdf
 
-        if page_text.strip():
-            all_text.append(f"--- Page {page_num + 1} ---\n{page_text.strip()}")
+    ocr = OCRExtractor(lang=lang)
+    table_ext = TableExtractor(lang=lang)
+    doc = fitz.open(stream=file_bytes, filetype="pdf")
+    try:
+        return [_extract_pdf_page(doc[page_num], len(doc), ocr, table_ext) for page_num in page_nums]
+    finally:
+        doc.close()
 
-    doc.close()
 
-    combined = "\n\n".join(all_text)
-    if all_tables:
-        table_text = table_ext.format_table_as_text(all_tables)
-        combined += "\n\n--- Extracted Tables ---\n" + table_text
+def _is_scanned(page_text: str) -> bool:
+    """Page likely scanned/image-based (little or no text layer)."""
+    return len(page_text.strip()) < 50
+
+
+def _extract_pdf_page(page, num_pages: int, ocr: OCRExtractor, table_ext: TableExtractor,
+                      page_text: str = None) -> Dict[str, Any]:
+    """One page's segment: its text layer, or OCR text and tables from a render if it is scanned."""
+    if page_text is None:
+        page_text = page.get_text("text") or ""
+    tables = []
+    scanned = _is_scanned(page_text)
 
+    if scanned:
+        # Render as image and OCR
+        pix = page.get_pixmap(dpi=200)
+        img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+
+        result, tables = _ocr_image(img, ocr, table_ext)
+        ocr_text = result.text.strip() if result else ""
+        if ocr_text:
+            page_text += "\n" + ocr_text
+
+    page_num = page.number
     return {
-        "text": combined,
-        "tables": all_tables,
-        "key_value_pairs": all_kv,
-        "file_type": "pdf",
+        "page": page_num + 1,
         "pages": num_pages,
-        "ocr_pages": ocr_pages,
+        "text": f"--- Page {page_num + 1} ---\n{page_text.strip()}" if page_text.strip() else "",
+        "tables": tables,
+        "key_value_pairs": table_ext.extract_key_value_pairs(page_text),
+        "file_type": "pdf",
+        "ocr": scanned,
     }
 
 
@@ -191,11 +366,10 @@ def _process_docx(file_bytes: bytes, lang: str) -> Dict[str, Any]:
                 img_data = rel.target_part.blob
                 img = Image.open(io.BytesIO(img_data))
                 if img.width > 100 and img.height > 100:
-                    ocr_text = ocr.extract_text(img)
+                    result, img_tables = _ocr_image(img, ocr, table_ext)
+                    ocr_text = result.text.strip() if result else ""
                     if ocr_text:
                         ocr_texts.append(ocr_text)
-                    # Try table extraction on images
-                    img_tables = table_ext.extract_tables(img)
                     if img_tables:
                         all_tables.extend(img_tables)
             except Exception as e:
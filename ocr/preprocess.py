@@ -0,0 +1,233 @@
+"""
+Image preprocessing for OCR on NumPy arrays.
+Pages are converted to 8-bit grayscale once and every stage works on that
+array: a blank-page check (so Tesseract is skipped entirely), optional
+downscaling to a target x-height, optional deskew, and Otsu or Sauvola
+binarization. Sauvola thresholds each pixel against its neighbourhood, so
+faint or unevenly lit scans keep their strokes where a fixed cut-off loses them.
+"""
+
+import os
+import time
+import logging
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger("ocr.preprocess")
+
+# Binarization: "sauvola" (local, for faint / uneven scans), "otsu" (global) or "none"
+OCR_BINARIZE = os.getenv("OCR_BINARIZE", "sauvola").lower()
+# Sauvola window (pixels, odd) and sensitivity
+SAUVOLA_WINDOW = int(os.getenv("SAUVOLA_WINDOW", "31"))
+SAUVOLA_K = float(os.getenv("SAUVOLA_K", "0.2"))
+# Straighten pages rotated by up to DESKEW_MAX_ANGLE degrees
+OCR_DESKEW = os.getenv("OCR_DESKEW", "false").lower() == "true"
+DESKEW_MAX_ANGLE = 5.0
+# Downscale pages whose estimated x-height (pixels) is well above this; 0 disables
+OCR_TARGET_XHEIGHT = int(os.getenv("OCR_TARGET_XHEIGHT", "0"))
+# A page is blank below this grayscale spread, or below this fraction of ink pixels
+BLANK_MAX_STD = 4.0
+BLANK_MAX_INK = 0.001
+
+# Stages that inspect the whole page (blank check, deskew, x-height) run on every Nth pixel
+_SAMPLE_STEP = 4
+# Sauvola statistics are computed per block of this many pixels square
+_SAUVOLA_BLOCK = 2
+
+
+class Preprocessed:
+    """Outcome of prepare(): the image for Tesseract, or blank=True when there is nothing to read."""
+
+    def __init__(self, image: Optional[Image.Image], blank: bool, scale: float, angle: float,
+                 timings: Dict[str, float], scaled_size: Tuple[int, int] = None):
+        self.image = image
+        self.blank = blank
+        self.scale = scale  # scaled size / input size
+        self.angle = angle  # degrees the scaled page was then rotated by (canvas expanded), 0 if not
+        self.scaled_size = scaled_size  # (width, height) after scaling, before rotation
+        self.timings = timings  # stage -> milliseconds
+
+
+def prepare(image: Image.Image, binarize: str = OCR_BINARIZE, deskew: bool = OCR_DESKEW,
+            target_xheight: int = OCR_TARGET_XHEIGHT) -> Preprocessed:
+    """
+    Prepare an image for Tesseract.
+
+    Args:
+        image: PIL image, any mode
+        binarize: "sauvola", "otsu" or "none"
+        deskew: Whether to detect and undo small rotations
+        target_xheight: Downscale so the estimated x-height is about this many pixels (0 = keep size)
+
+    Returns:
+        Preprocessed with the grayscale / binary image and per-stage timings
+    """
+    timings = {}
+    clock = time.perf_counter()
+
+    def lap(stage: str):
+        nonlocal clock
+        now = time.perf_counter()
+        timings[stage] = (now - clock) * 1000
+        clock = now
+
+    gray = to_gray(image)
+    lap("gray")
+
+    sample = gray[::_SAMPLE_STEP, ::_SAMPLE_STEP]
+    threshold = otsu_threshold(sample)
+    ink = sample < threshold
+    blank = is_blank(sample, ink)
+    lap("blank")
+    if blank:
+        return Preprocessed(None, True, 1.0, 0.0, timings)
+
+    scale = 1.0
+    if target_xheight > 0:
+        xheight = estimate_xheight(ink) * _SAMPLE_STEP
+        if xheight > target_xheight * 1.5:
+            scale = target_xheight / xheight
+            size = (max(1, round(gray.shape[1] * scale)), max(1, round(gray.shape[0] * scale)))
+            gray = np.asarray(Image.fromarray(gray).resize(size, Image.BILINEAR))
+        lap("scale")
+
+    scaled_size = (gray.shape[1], gray.shape[0])
+    angle = 0.0
+    if deskew:
+        angle = skew_angle(ink)
+        if abs(angle) >= 0.2:
+            gray = np.asarray(Image.fromarray(gray).rotate(angle, resample=Image.BILINEAR, expand=True,
+                                                           fillcolor=255))
+        else:
+            angle = 0.0
+        lap("deskew")
+
+    if binarize == "sauvola":
+        gray = sauvola_binarize(gray)
+    elif binarize == "otsu":
+        gray = np.where(gray < otsu_threshold(gray), 0, 255).astype("uint8")
+    elif binarize != "none":
+        raise ValueError(f"Unknown OCR_BINARIZE '{binarize}' (expected sauvola, otsu or none)")
+    lap("binarize")
+
+    return Preprocessed(Image.fromarray(gray), False, scale, angle, timings, scaled_size)
+
+
+def preprocess_settings() -> str:
+    """Everything in the configured preprocessing that changes OCR output."""
+    settings = f"{OCR_BINARIZE}"
+    if OCR_BINARIZE == "sauvola":
+        settings += f"(w={SAUVOLA_WINDOW},k={SAUVOLA_K})"
+    return f"{settings}:deskew={int(OCR_DESKEW)}:xh={OCR_TARGET_XHEIGHT}"
+
+
+def to_gray(image: Image.Image) -> np.ndarray:
+    """8-bit grayscale array (a view of the image's buffer when it is already mode L)."""
+    if image.mode != "L":
+        image = image.convert("L")
+    return np.asarray(image)
+
+
+def otsu_threshold(gray: np.ndarray) -> int:
+    """Global threshold maximizing the between-class variance of the histogram."""
+    hist = np.bincount(gray.ravel(), minlength=256).astype("float64")
+    levels = np.arange(256, dtype="float64")
+    weight_dark = np.cumsum(hist)
+    weight_light = weight_dark[-1] - weight_dark
+    sum_dark = np.cumsum(hist * levels)
+    mean_dark = sum_dark / np.maximum(weight_dark, 1)
+    mean_light = (sum_dark[-1] - sum_dark) / np.maximum(weight_light, 1)
+    variance = weight_dark * weight_light * (mean_dark - mean_light) ** 2
+    # Pixels <= t are dark, so the cut-off for `gray < threshold` is t + 1
+    return int(np.argmax(variance)) + 1
+
+
+def is_blank(gray: np.ndarray, ink: np.ndarray) -> bool:
+    """No text: (almost) uniform, or (almost) no pixels darker than the Otsu threshold."""
+    return float(gray.std()) < BLANK_MAX_STD or float(ink.mean()) < BLANK_MAX_INK
+
+
+def sauvola_binarize(gray: np.ndarray, window: int = SAUVOLA_WINDOW, k: float = SAUVOLA_K) -> np.ndarray:
+    """
+    Sauvola local thresholding: T = mean * (1 + k * (std / 128 - 1)) over a window x window neighbourhood.
+    Window statistics are exact sums over blocks of _SAUVOLA_BLOCK x _SAUVOLA_BLOCK pixels, taken from
+    integral images, so one threshold serves each block and the cost does not depend on the window size.
+    """
+    step = _SAUVOLA_BLOCK
+    h, w = gray.shape
+    hb, wb = -(-h // step), -(-w // step)
+    values = np.pad(gray, ((0, hb * step - h), (0, wb * step - w)), mode="edge")
+    # Block sums by adding strided views (int32 is exact: at most 255^2 per pixel)
+    sums = np.zeros((hb, wb), dtype="int32")
+    squares = np.zeros((hb, wb), dtype="int32")
+    for dy in range(step):
+        for dx in range(step):
+            part = values[dy::step, dx::step].astype("int32")
+            sums += part
+            part *= part
+            squares += part
+
+    r = max(1, window // (2 * step))  # window radius, in blocks
+    size = 2 * r + 1
+    n = float((size * step) ** 2)
+
+    def window_sums(blocks: np.ndarray) -> np.ndarray:
+        # Integral image with a zero first row / column, then four-corner differences
+        padded = np.pad(blocks, r, mode="edge")
+        integral = np.zeros((padded.shape[0] + 1, padded.shape[1] + 1), dtype="int64")
+        np.cumsum(padded, axis=0, out=integral[1:, 1:])
+        np.cumsum(integral[1:, 1:], axis=1, out=integral[1:, 1:])
+        return (integral[size:size + hb, size:size + wb] - integral[:hb, size:size + wb]
+                - integral[size:size + hb, :wb] + integral[:hb, :wb])
+
+    mean = window_sums(sums) / n
+    std = np.sqrt(np.maximum(window_sums(squares) / n - mean * mean, 0))
+    threshold = mean * (1 + k * (std / 128.0 - 1))
+    # Compare each pixel with its block's threshold, one block offset at a time (no upsampled copy)
+    binary = np.empty((hb * step, wb * step), dtype="uint8")
+    for dy in range(step):
+        for dx in range(step):
+            np.greater(values[dy::step, dx::step], threshold, out=binary[dy::step, dx::step], casting="unsafe")
+    binary *= 255
+    return binary[:h, :w]
+
+
+def estimate_xheight(ink: np.ndarray) -> float:
+    """
+    Rough x-height (pixels of `ink`) from the horizontal projection profile: text lines are
+    runs of inked rows, and within a line the x-height band is the rows holding at least
+    half of the line's peak ink (ascenders and descenders add only a little).
+    """
+    density = ink.mean(axis=1)
+    rows = density > 0.01
+    edges = np.flatnonzero(np.diff(np.concatenate([[False], rows, [False]]).astype("int8")))
+    bands = [int(np.count_nonzero(line >= line.max() * 0.5))
+             for line in (density[start:end] for start, end in zip(edges[::2], edges[1::2]))]
+    if not bands:
+        return 0.0
+    return float(np.median(bands))
+
+
+def skew_angle(ink: np.ndarray, max_angle: float = DESKEW_MAX_ANGLE, step: float = 0.25) -> float:
+    """
+    Rotation (degrees, counter-clockwise) that makes text lines horizontal: the angle whose
+    projected row profile of ink pixels is sharpest.
+    """
+    ys, xs = np.nonzero(ink)
+    if len(ys) < 100:
+        return 0.0
+    if len(ys) > 50000:
+        pick = np.random.default_rng(0).choice(len(ys), 50000, replace=False)
+        ys, xs = ys[pick], xs[pick]
+    ys, xs = ys.astype("float64"), xs.astype("float64")
+    best_angle, best_score = 0.0, -1.0
+    for angle in np.arange(-max_angle, max_angle + step / 2, step):
+        theta = np.deg2rad(angle)
+        rows = np.round(ys * np.cos(theta) - xs * np.sin(theta)).astype("int64")
+        profile = np.bincount(rows - rows.min())
+        score = float(np.dot(profile, profile))
+        if score > best_score:
+            best_angle, best_score = float(angle), score
+    return best_angle
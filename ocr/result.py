@@ -0,0 +1,144 @@
+"""
+Unified result of one Tesseract pass over an image.
+Built from Tesseract's word-level output (image_to_data), it gives the plain
+text, word boxes, line grouping and confidence together, so text and table
+extraction share a single OCR run.
+"""
+
+import math
+from typing import Any, Dict, List, Tuple
+
+
+class OCRWord:
+    """One recognized word and its bounding box."""
+
+    __slots__ = ("text", "left", "top", "width", "height", "conf", "block", "par", "line")
+
+    def __init__(self, text: str, left: int, top: int, width: int, height: int, conf: float,
+                 block: int, par: int, line: int):
+        self.text = text
+        self.left = left
+        self.top = top
+        self.width = width
+        self.height = height
+        self.conf = conf  # 0-100
+        self.block = block
+        self.par = par
+        self.line = line
+
+    @property
+    def right(self) -> int:
+        return self.left + self.width
+
+    def __repr__(self) -> str:
+        return f"OCRWord({self.text!r}, box=({self.left}, {self.top}, {self.width}, {self.height}), conf={self.conf})"
+
+
+class OCRResult:
+    """Words recognized in one image, in Tesseract's reading order."""
+
+    def __init__(self, words: List[OCRWord] = None, blank: bool = False, error: str = None):
+        self.words = words or []
+        self.blank = blank  # preprocessing found nothing to read, so OCR was skipped
+        self.error = error  # set when OCR failed (the result is empty, not a real "no text")
+        self.timings: Dict[str, float] = {}  # stage -> milliseconds (preprocessing stages + "ocr")
+        self._text = None
+
+    @classmethod
+    def from_data(cls, data: Dict[str, List[Any]]) -> "OCRResult":
+        """
+        Build from image_to_data output.
+
+        Args:
+            data: Column dict as returned with output_type=Output.DICT
+                (text, conf, left, top, width, height, block_num, par_num, line_num)
+        """
+        words = []
+        for i, text in enumerate(data.get("text", ())):
+            text = str(text).strip()
+            if not text:
+                continue
+            conf = float(data["conf"][i])
+            words.append(OCRWord(
+                text, int(data["left"][i]), int(data["top"][i]), int(data["width"][i]), int(data["height"][i]),
+                max(conf, 0.0), int(data["block_num"][i]), int(data["par_num"][i]), int(data["line_num"][i]),
+            ))
+        return cls(words)
+
+    def __bool__(self) -> bool:
+        return bool(self.words)
+
+    def lines(self) -> List[List[OCRWord]]:
+        """Words grouped into text lines, in reading order."""
+        lines, key = [], None
+        for word in self.words:
+            word_key = (word.block, word.par, word.line)
+            if word_key != key:
+                lines.append([])
+                key = word_key
+            lines[-1].append(word)
+        return lines
+
+    @property
+    def text(self) -> str:
+        """Plain text laid out like image_to_string: one line per text line, blank lines between paragraphs."""
+        if self._text is None:
+            paragraphs, par = [], None
+            for line in self.lines():
+                if (line[0].block, line[0].par) != par:
+                    paragraphs.append([])
+                    par = (line[0].block, line[0].par)
+                paragraphs[-1].append(" ".join(word.text for word in line))
+            self._text = "\n\n".join("\n".join(lines) for lines in paragraphs)
+        return self._text
+
+    @property
+    def confidence(self) -> float:
+        """Mean word confidence (0-100), 0 if nothing was recognized."""
+        if not self.words:
+            return 0.0
+        return sum(word.conf for word in self.words) / len(self.words)
+
+    def scaled(self, factor: float) -> "OCRResult":
+        """Same words with boxes scaled by factor (to map boxes from a resized image back)."""
+        words = [OCRWord(w.text, round(w.left * factor), round(w.top * factor), round(w.width * factor),
+                         round(w.height * factor), w.conf, w.block, w.par, w.line) for w in self.words]
+        result = OCRResult(words, self.blank)
+        result.timings = self.timings
+        return result
+
+    def unrotated(self, angle: float, size: Tuple[int, int], rotated_size: Tuple[int, int]) -> "OCRResult":
+        """
+        Same words with boxes mapped from an image rotated by angle degrees (counter-clockwise, about
+        its centre, canvas expanded, as PIL's rotate(expand=True)) back to the unrotated image.
+        Each box becomes the upright bounding box of its rotated-back corners, clipped to the image.
+
+        Args:
+            angle: Degrees the image was rotated by
+            size: (width, height) of the image before rotation
+            rotated_size: (width, height) of the rotated image the boxes refer to
+        """
+        theta = math.radians(angle)
+        cos, sin = math.cos(theta), math.sin(theta)
+        cx, cy = size[0] / 2, size[1] / 2
+        rcx, rcy = rotated_size[0] / 2, rotated_size[1] / 2
+        words = []
+        for w in self.words:
+            xs, ys = [], []
+            for x, y in ((w.left, w.top), (w.right, w.top), (w.left, w.top + w.height), (w.right, w.top + w.height)):
+                dx, dy = x - rcx, y - rcy
+                xs.append(cx + dx * cos - dy * sin)
+                ys.append(cy + dx * sin + dy * cos)
+            left, top = max(0, round(min(xs))), max(0, round(min(ys)))
+            right, bottom = min(size[0], round(max(xs))), min(size[1], round(max(ys)))
+            words.append(OCRWord(w.text, left, top, max(0, right - left), max(0, bottom - top), w.conf,
+                                 w.block, w.par, w.line))
+        result = OCRResult(words, self.blank)
+        result.timings = self.timings
+        return result
+
+    def to_data(self) -> Dict[str, List[Any]]:
+        """Words as image_to_data-style columns."""
+        columns = {"text": "text", "conf": "conf", "left": "left", "top": "top", "width": "width",
+                   "height": "height", "block_num": "block", "par_num": "par", "line_num": "line"}
+        return {name: [getattr(word, attr) for word in self.words] for name, attr in columns.items()}
@@ -7,20 +7,23 @@ import re
 import logging
 from typing import List, Dict, Any
 from PIL import Image
-import pytesseract
+
+from .result import OCRResult, OCRWord
+from .engine import get_engine
 
 logger = logging.getLogger("ocr.table")
 
 
 class TableExtractor:
-    """Extracts structured data (tables, key-value pairs) from images using pytesseract."""
+    """Extracts structured data (tables, key-value pairs) from images using Tesseract."""
 
     def __init__(self, lang: str = "eng"):
         self.lang = lang
 
     def extract_tables(self, image: Image.Image) -> List[List[str]]:
         """
-        Extract tabular data from an image using pytesseract's TSV output.
+        Extract tabular data from an image using Tesseract's word boxes.
+        Runs its own OCR pass; use tables_from_result() when the image is already recognized.
 
         Args:
             image: PIL Image
@@ -29,33 +32,26 @@ class TableExtractor:
             List of rows, where each row is a list of cell strings
         """
         try:
-            data = pytesseract.image_to_data(
-                image, lang=self.lang, output_type=pytesseract.Output.DICT
-            )
+            result = get_engine(self.lang).recognize(image)
         except Exception as e:
             logger.error(f"Table extraction failed: {e}")
             return []
+        return self.tables_from_result(result)
+
+    def tables_from_result(self, result: OCRResult) -> List[List[str]]:
+        """
+        Extract tabular data from words already recognized by OCRExtractor.recognize().
+
+        Args:
+            result: OCRResult of the image
 
+        Returns:
+            List of rows, where each row is a list of cell strings
+        """
         # Group words by block and line
-        blocks: Dict[int, Dict[int, List[dict]]] = {}
-        n = len(data["text"])
-        for i in range(n):
-            text = data["text"][i].strip()
-            if not text:
-                continue
-            block_num = data["block_num"][i]
-            line_num = data["line_num"][i]
-            if block_num not in blocks:
-                blocks[block_num] = {}
-            if line_num not in blocks[block_num]:
-                blocks[block_num][line_num] = []
-            blocks[block_num][line_num].append({
-                "text": text,
-                "left": data["left"][i],
-                "top": data["top"][i],
-                "width": data["width"][i],
-                "conf": int(data["conf"][i]) if data["conf"][i] != "-1" else 0,
-            })
+        blocks: Dict[int, Dict[int, List[OCRWord]]] = {}
+        for word in result.words:
+            blocks.setdefault(word.block, {}).setdefault(word.line, []).append(word)
 
         # Find blocks that look like tables (multiple lines with aligned columns)
         tables = []
@@ -66,7 +62,7 @@ class TableExtractor:
             rows = []
             for line_num, words in sorted(lines.items()):
                 # Sort words by horizontal position
-                words.sort(key=lambda w: w["left"])
+                words.sort(key=lambda w: w.left)
                 row = self._cluster_words_into_columns(words)
                 rows.append(row)
 
@@ -76,23 +72,23 @@ class TableExtractor:
 
         return tables
 
-    def _cluster_words_into_columns(self, words: List[dict], gap_threshold: int = 30) -> List[str]:
+    def _cluster_words_into_columns(self, words: List[OCRWord], gap_threshold: int = 30) -> List[str]:
         """Group words into columns based on horizontal gaps."""
         if not words:
             return []
 
         columns = []
-        current_cell = [words[0]["text"]]
-        prev_right = words[0]["left"] + words[0]["width"]
+        current_cell = [words[0].text]
+        prev_right = words[0].right
 
         for w in words[1:]:
-            gap = w["left"] - prev_right
+            gap = w.left - prev_right
             if gap > gap_threshold:
                 columns.append(" ".join(current_cell))
-                current_cell = [w["text"]]
+                current_cell = [w.text]
             else:
-                current_cell.append(w["text"])
-            prev_right = w["left"] + w["width"]
+                current_cell.append(w.text)
+            prev_right = w.right
 
         columns.append(" ".join(current_cell))
         return columns
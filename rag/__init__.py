@@ -0,0 +1,16 @@
+"""
+RAG Module - FAISS + BGE-M3 hybrid knowledge base
+Dense + sparse retrieval with on-disk persistence
+"""
+
+from .knowledge_base import KnowledgeBase
+from .storage import KnowledgeBaseStore
+from .embedding_cache import EmbeddingCache
+from .upsert import DocumentUpsert
+
+__all__ = [
+    'KnowledgeBase',
+    'KnowledgeBaseStore',
+    'EmbeddingCache',
+    'DocumentUpsert',
+]
@@ -0,0 +1,251 @@
+"""
+Columnar in-memory chunk table for the KnowledgeBase.
+All chunk texts live in one UTF-8 blob addressed by (start, length) columns,
+and source / doc_id strings are interned to integer codes, so a chunk costs a
+few integers plus its text bytes instead of a dict and several str objects.
+Columns are indexed directly by chunk id (ids are dense and only grow).
+
+ChunkTable is the writer; view() hands out read-only ChunkViews that stay
+consistent while the table keeps changing: new chunks are appended past the
+view's size, and deletes copy the columns a view may still be reading.
+"""
+
+import logging
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from .constants import COMPACT_DEAD_RATIO
+
+logger = logging.getLogger("rag.chunk_table")
+
+# No live chunk at this id (deleted, or never assigned)
+_EMPTY = -1
+# Deleted text bytes tolerated before the blob is rewritten (together with COMPACT_DEAD_RATIO)
+_COMPACT_MIN_BYTES = 1 << 20
+
+
+class ChunkView:
+    """Read-only chunk id -> text, source and doc_id lookups over one version of a ChunkTable."""
+
+    def __init__(self, table: "ChunkView" = None):
+        if table is None:
+            # (blob, starts) are swapped together on compaction so offsets always match their blob
+            self._text = (bytearray(), np.zeros(0, dtype="int64"))
+            self._length = np.zeros(0, dtype="int32")
+            self._source = np.zeros(0, dtype="int32")  # source code, _EMPTY if no live chunk
+            self._doc = np.zeros(0, dtype="int32")  # doc code
+            self._size = 0  # ids below this were assigned when the view was taken
+            # Append-only, so views can share them
+            self._source_names: List[str] = []
+            self._source_codes: Dict[str, int] = {}
+            self._doc_names: List[str] = []
+            self._doc_codes: Dict[str, int] = {}
+            # source code -> live chunks; replaced (never mutated) on every change
+            self._source_counts: Dict[int, int] = {}
+            self._live = 0
+            return
+        for name in ("_text", "_length", "_source", "_doc", "_size", "_source_names", "_source_codes",
+                     "_doc_names", "_doc_codes", "_source_counts", "_live"):
+            setattr(self, name, getattr(table, name))
+
+    def __len__(self) -> int:
+        return self._live
+
+    def __contains__(self, chunk_id) -> bool:
+        chunk_id = int(chunk_id)
+        return 0 <= chunk_id < self._size and self._source[chunk_id] != _EMPTY
+
+    def live(self, ids) -> np.ndarray:
+        """The ids (as an int64 array, duplicates dropped) that currently hold a chunk."""
+        ids = np.unique(np.asarray(ids, dtype="int64").ravel())
+        ids = ids[(ids >= 0) & (ids < self._size)]
+        return ids[self._source[ids] != _EMPTY]
+
+    def ids(self) -> np.ndarray:
+        """All live chunk ids, ascending."""
+        return np.flatnonzero(self._source[:self._size] != _EMPTY).astype("int64")
+
+    def text(self, chunk_id) -> str:
+        blob, starts = self._text
+        start = int(starts[chunk_id])
+        return blob[start:start + int(self._length[chunk_id])].decode("utf-8")
+
+    def source(self, chunk_id) -> str:
+        return self._source_names[self._source[chunk_id]]
+
+    def doc_id(self, chunk_id) -> str:
+        return self._doc_names[self._doc[chunk_id]]
+
+    def get(self, chunk_id) -> Optional[Dict[str, str]]:
+        """{text, source, doc_id} for a live chunk, else None."""
+        if chunk_id not in self:
+            return None
+        return {"text": self.text(chunk_id), "source": self.source(chunk_id), "doc_id": self.doc_id(chunk_id)}
+
+    def source_code(self, source_name: str) -> int:
+        """Integer code of a source (_EMPTY if it was never seen)."""
+        return self._source_codes.get(source_name, _EMPTY)
+
+    def source_codes(self, ids) -> np.ndarray:
+        """Source code per id (_EMPTY for ids without a live chunk)."""
+        ids = np.asarray(ids, dtype="int64")
+        codes = np.full(len(ids), _EMPTY, dtype="int32")
+        known = (ids >= 0) & (ids < self._size)
+        codes[known] = self._source[ids[known]]
+        return codes
+
+    def in_source(self, ids, source_name: str) -> np.ndarray:
+        """Boolean mask: which ids are live chunks of source_name."""
+        code = self.source_code(source_name)
+        if code == _EMPTY:
+            return np.zeros(len(ids), dtype=bool)
+        return self.source_codes(ids) == code
+
+    def ids_for_source(self, source_name: str) -> np.ndarray:
+        code = self.source_code(source_name)
+        if code == _EMPTY or not self._source_counts.get(code):
+            return np.empty(0, dtype="int64")
+        return np.flatnonzero(self._source[:self._size] == code).astype("int64")
+
+    def ids_for_doc(self, doc_id: str) -> np.ndarray:
+        code = self._doc_codes.get(doc_id, _EMPTY)
+        if code == _EMPTY:
+            return np.empty(0, dtype="int64")
+        return np.flatnonzero(self._doc[:self._size] == code).astype("int64")
+
+    def source_count(self, source_name: str) -> int:
+        return self._source_counts.get(self.source_code(source_name), 0)
+
+    def source_counts(self) -> Dict[str, int]:
+        """Live chunks per source, from the incrementally maintained counters."""
+        return {self._source_names[code]: n for code, n in self._source_counts.items()}
+
+    def nbytes(self) -> int:
+        """Approximate memory held by the table."""
+        blob, starts = self._text
+        return len(blob) + starts.nbytes + self._length.nbytes + self._source.nbytes + self._doc.nbytes
+
+
+class ChunkTable(ChunkView):
+    """Writable chunk table; writes must be serialized (KnowledgeBase.write_lock)."""
+
+    def __init__(self):
+        super().__init__()
+        self._dead_bytes = 0
+        self._shared = False  # a view may be reading the current columns
+
+    def view(self) -> ChunkView:
+        """Read-only view of the current contents, unaffected by later writes."""
+        self._shared = True
+        return ChunkView(self)
+
+    def add(self, ids, texts: Sequence[str], sources: Sequence[str], doc_ids: Sequence[str]):
+        """
+        Add chunks (replacing any live chunk with the same id).
+
+        Args:
+            ids: Chunk ids
+            texts: Chunk text per id
+            sources: Source name per id
+            doc_ids: Document id per id
+        """
+        ids = np.asarray(ids, dtype="int64")
+        if not ids.size:
+            return
+        self.remove(ids)
+        if int(ids.min()) < self._size:
+            self._unshare()
+        self._grow(int(ids.max()) + 1)
+        encoded = [text.encode("utf-8") for text in texts]
+        lengths = np.fromiter(map(len, encoded), dtype="int64", count=len(encoded))
+        source_codes = np.fromiter((self._intern(s, self._source_names, self._source_codes) for s in sources),
+                                   dtype="int32", count=len(ids))
+        doc_codes = np.fromiter((self._intern(d, self._doc_names, self._doc_codes) for d in doc_ids),
+                                dtype="int32", count=len(ids))
+
+        blob, starts = self._text
+        starts[ids] = len(blob) + np.cumsum(lengths) - lengths
+        self._length[ids] = lengths
+        blob += b"".join(encoded)
+        self._doc[ids] = doc_codes
+        self._source[ids] = source_codes
+        counts = dict(self._source_counts)
+        for code, n in zip(*np.unique(source_codes, return_counts=True)):
+            counts[int(code)] = counts.get(int(code), 0) + int(n)
+        self._source_counts = counts
+        self._live += len(ids)
+        self._size = max(self._size, int(ids.max()) + 1)
+
+    def remove(self, ids) -> np.ndarray:
+        """Drop chunks; returns the ids that were live."""
+        ids = self.live(ids)
+        if not ids.size:
+            return ids
+        self._unshare()
+        counts = dict(self._source_counts)
+        for code, n in zip(*np.unique(self._source[ids], return_counts=True)):
+            remaining = counts[int(code)] - int(n)
+            if remaining:
+                counts[int(code)] = remaining
+            else:
+                del counts[int(code)]
+        self._source_counts = counts
+        self._source[ids] = _EMPTY
+        self._doc[ids] = _EMPTY
+        self._live -= len(ids)
+        self._dead_bytes += int(self._length[ids].sum())
+        if self._dead_bytes >= max(_COMPACT_MIN_BYTES, len(self._text[0]) * COMPACT_DEAD_RATIO):
+            self._compact()
+        return ids
+
+    def clear(self):
+        self.__init__()
+
+    def _unshare(self):
+        """Copy the columns before changing ids that a view can see."""
+        if not self._shared:
+            return
+        self._source = self._source.copy()
+        self._doc = self._doc.copy()
+        self._length = self._length.copy()
+        blob, starts = self._text
+        self._text = (blob, starts.copy())
+        self._shared = False
+
+    def _grow(self, size: int):
+        if size <= len(self._source):
+            return
+        capacity = max(size, 2 * len(self._source), 1024)
+        blob, starts = self._text
+        self._text = (blob, _resized(starts, capacity, 0))
+        self._length = _resized(self._length, capacity, 0)
+        self._doc = _resized(self._doc, capacity, _EMPTY)
+        self._source = _resized(self._source, capacity, _EMPTY)
+
+    def _compact(self):
+        """Rewrite the blob with live texts only (views keep the old one)."""
+        blob, starts = self._text
+        ids = self.ids()
+        lengths = self._length[ids].astype("int64")
+        new_blob = bytearray(b"".join(bytes(blob[s:s + n]) for s, n in zip(starts[ids].tolist(), lengths.tolist())))
+        new_starts = np.zeros(len(starts), dtype="int64")
+        new_starts[ids] = np.cumsum(lengths) - lengths
+        logger.info(f"Compacted chunk texts: {len(blob)} -> {len(new_blob)} bytes")
+        self._text = (new_blob, new_starts)
+        self._dead_bytes = 0
+
+    @staticmethod
+    def _intern(name: str, names: List[str], codes: Dict[str, int]) -> int:
+        code = codes.get(name)
+        if code is None:
+            code = len(names)
+            names.append(name)
+            codes[name] = code
+        return code
+
+
+def _resized(column: np.ndarray, size: int, fill) -> np.ndarray:
+    grown = np.full(size, fill, dtype=column.dtype)
+    grown[:len(column)] = column
+    return grown
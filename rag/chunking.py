@@ -0,0 +1,239 @@
+"""
+Token-aware chunking and length-bucketed batching for BGE-M3.
+Chunk boundaries come from the model's own tokenizer, so a Telugu chunk and
+an English chunk cost the encoder about the same; encoder batches group
+texts of similar token length to keep padding small.
+"""
+
+import logging
+from typing import Callable, List, Tuple
+
+import numpy as np
+
+from .constants import (
+    CHUNK_SIZE, CHUNK_OVERLAP, CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS, CHUNK_STREAM_WINDOW,
+    ENCODER_BATCH_SIZE, ENCODER_BATCH_TOKENS,
+)
+
+logger = logging.getLogger("rag.chunking")
+
+# Fragments shorter than this (in characters) are dropped, as with the character chunker
+MIN_CHUNK_CHARS = 30
+
+
+class Chunker:
+    """
+    Base chunker. Subclasses return (start, core, end) character spans: text[core:end]
+    is the chunk's own content and text[start:core] the overlap carried over from the
+    previous chunk. The text before `context` only serves as overlap for the first span.
+    """
+
+    def spans(self, text: str, context: int = 0) -> List[Tuple[int, int, int]]:
+        raise NotImplementedError
+
+    def chunk(self, text: str) -> List[str]:
+        return self.texts(text, self.spans(text))
+
+    @staticmethod
+    def texts(text: str, spans: List[Tuple[int, int, int]]) -> List[str]:
+        chunks = []
+        for start, _, end in spans:
+            chunk = text[start:end].strip()
+            if len(chunk) > MIN_CHUNK_CHARS:
+                chunks.append(chunk)
+        return chunks
+
+
+class CharChunker(Chunker):
+    """Fixed character windows cut at spaces; the fallback when no tokenizer is available."""
+
+    def __init__(self, size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP):
+        self.size = size
+        self.overlap = overlap
+
+    def spans(self, text: str, context: int = 0) -> List[Tuple[int, int, int]]:
+        spans = []
+        text_len = len(text)
+        core = context
+        start = max(context - self.overlap, 0)
+        while core < text_len:
+            end = min(start + self.size, text_len)
+            if end < text_len:
+                last_space = text.rfind(' ', start, end)
+                if last_space != -1 and last_space > start + (self.size // 2):
+                    end = last_space
+            spans.append((start, core, end))
+            if end >= text_len:
+                break
+            core = end
+            start = max(end - self.overlap, 0)
+        return spans
+
+
+class TokenChunker(Chunker):
+    """
+    Content-defined chunks of at most max_tokens tokenizer tokens.
+
+    A boundary falls before a word whose preceding tokens hash to a fixed residue,
+    so boundaries depend only on nearby content: an edit moves the chunks around
+    it, and every chunk before and after comes out byte-identical.
+    """
+
+    # Tokens hashed to decide whether a boundary falls before the next token
+    HASH_WINDOW = 8
+
+    def __init__(self, tokenizer, max_tokens: int = CHUNK_MAX_TOKENS, overlap_tokens: int = CHUNK_OVERLAP_TOKENS):
+        """
+        Args:
+            tokenizer: Hugging Face fast tokenizer (needs offset mappings)
+            max_tokens: Token budget per chunk including overlap, excluding special tokens
+            overlap_tokens: Tokens repeated from the end of the previous chunk
+        """
+        if not getattr(tokenizer, "is_fast", False):
+            raise ValueError("TokenChunker needs a fast tokenizer with offset mappings")
+        self.tokenizer = tokenizer
+        self.max_tokens = max_tokens
+        self.overlap_tokens = min(overlap_tokens, max_tokens // 2)
+        # Own-content length bounds; boundaries are expected every ~divisor tokens past the minimum
+        self.max_core = max_tokens - self.overlap_tokens
+        self.min_core = self.max_core // 2
+        self.divisor = max(1, self.max_core // 8)
+
+    def encode(self, text: str):
+        """Token ids and character span of every token in text."""
+        encoding = self.tokenizer(text, add_special_tokens=False, return_offsets_mapping=True,
+                                  truncation=False, verbose=False)
+        return encoding["input_ids"], encoding["offset_mapping"]
+
+    def _cut_candidates(self, text: str, ids, offsets) -> Tuple[np.ndarray, np.ndarray]:
+        """(word_start, candidate) masks: may a chunk start at token i, and does content choose to."""
+        n = len(ids)
+        word_start = np.fromiter(
+            (o[0] > 0 and text[o[0] - 1].isspace() for o in offsets), dtype=bool, count=n)
+        # Rolling polynomial hash of the HASH_WINDOW tokens before each position (uint64 wraps)
+        tokens = np.asarray(ids, dtype=np.uint64)
+        h = np.zeros(n, dtype=np.uint64)
+        for k in range(1, self.HASH_WINDOW + 1):
+            shifted = np.zeros(n, dtype=np.uint64)
+            shifted[k:] = tokens[:n - k]
+            h = h * np.uint64(1000003) + shifted
+        h ^= h >> np.uint64(31)
+        h *= np.uint64(0x9E3779B97F4A7C15)
+        h ^= h >> np.uint64(29)
+        candidate = word_start & (h % np.uint64(self.divisor) == 0)
+        return word_start, candidate
+
+    def spans(self, text: str, context: int = 0) -> List[Tuple[int, int, int]]:
+        ids, offsets = self.encode(text)
+        n = len(offsets)
+        if not n:
+            return []
+        word_start, candidate = self._cut_candidates(text, ids, offsets)
+        starts = np.fromiter((o[0] for o in offsets), dtype="int64", count=n)
+        core = int(np.searchsorted(starts, context))
+        spans = []
+        while core < n:
+            if n - core <= self.max_core:
+                end = n
+            else:
+                lo, hi = core + self.min_core, core + self.max_core
+                hits = np.flatnonzero(candidate[lo:hi + 1])
+                if hits.size:
+                    end = lo + int(hits[0])
+                else:
+                    # No content-defined cut in range: fall back to the last word start
+                    words = np.flatnonzero(word_start[lo:hi + 1])
+                    end = lo + int(words[-1]) if words.size else hi
+            start = self._overlap_start(word_start, core)
+            spans.append((int(starts[start]), int(starts[core]), int(offsets[end - 1][1])))
+            core = end
+        return spans
+
+    def _overlap_start(self, word_start: np.ndarray, core: int) -> int:
+        """First word start within overlap_tokens before core (core itself if none)."""
+        floor = max(core - self.overlap_tokens, 0)
+        if floor == 0:
+            return 0
+        words = np.flatnonzero(word_start[floor:core])
+        return floor + int(words[0]) if words.size else core
+
+
+class StreamingChunker:
+    """
+    Chunks text that arrives in pieces (e.g. page by page) without holding the whole document.
+    Produces the same chunks as chunking the concatenated text, up to tokenization at buffer seams.
+    """
+
+    def __init__(self, chunker: Chunker, clean: Callable[[str], str], window_chars: int = CHUNK_STREAM_WINDOW):
+        """
+        Args:
+            chunker: Chunker that defines the boundaries
+            clean: Normalisation applied to each piece before it is buffered
+            window_chars: Buffered characters that trigger chunking
+        """
+        self.chunker = chunker
+        self.clean = clean
+        self.window_chars = window_chars
+        self._buffer = ""
+        self._context = 0  # leading buffer characters that are only overlap for the next chunk
+
+    def feed(self, text: str) -> List[str]:
+        """Add a piece of text; returns the chunks that can no longer change."""
+        text = self.clean(text)
+        if not text:
+            return []
+        self._buffer = f"{self._buffer} {text}" if self._buffer else text
+        if len(self._buffer) < self.window_chars:
+            return []
+        spans = self.chunker.spans(self._buffer, self._context)
+        if len(spans) < 2:
+            return []
+        # The last window may still grow; re-chunk from its start once more text arrives,
+        # keeping its overlap as context so the boundaries match a single pass
+        chunks = self.chunker.texts(self._buffer, spans[:-1])
+        start, core, _ = spans[-1]
+        self._buffer = self._buffer[start:]
+        self._context = core - start
+        return chunks
+
+    def flush(self) -> List[str]:
+        """Chunk whatever is still buffered at the end of the document."""
+        spans = self.chunker.spans(self._buffer, self._context) if self._buffer else []
+        chunks = self.chunker.texts(self._buffer, spans)
+        self._buffer = ""
+        self._context = 0
+        return chunks
+
+
+def token_lengths(tokenizer, texts: List[str]) -> np.ndarray:
+    """Token count per text (including special tokens), or character count without a tokenizer."""
+    if tokenizer is None:
+        return np.fromiter((len(t) for t in texts), dtype="int64", count=len(texts))
+    ids = tokenizer(texts, add_special_tokens=True, truncation=False, verbose=False)["input_ids"]
+    return np.fromiter((len(i) for i in ids), dtype="int64", count=len(texts))
+
+
+def length_buckets(lengths: np.ndarray, max_batch: int = ENCODER_BATCH_SIZE,
+                   max_tokens: int = ENCODER_BATCH_TOKENS) -> List[np.ndarray]:
+    """
+    Group text positions into batches of similar length.
+
+    Args:
+        lengths: Token length per text
+        max_batch: Most texts per batch
+        max_tokens: Most padded tokens (batch size x longest length) per batch
+
+    Returns:
+        list of index arrays into lengths, shortest texts first
+    """
+    order = np.argsort(lengths, kind="stable")
+    batches, current = [], []
+    for i in order.tolist():
+        # Sorted ascending, so the newcomer is the longest text in the batch
+        if current and (len(current) >= max_batch or (len(current) + 1) * int(lengths[i]) > max_tokens):
+            batches.append(np.array(current, dtype="int64"))
+            current = []
+        current.append(i)
+    if current:
+        batches.append(np.array(current, dtype="int64"))
+    return batches
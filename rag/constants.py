@@ -0,0 +1,106 @@
+import os
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# BGE-M3 Embedding Configuration
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL", "BAAI/bge-m3")
+EMBEDDING_DIMENSIONS = 1024
+
+# Chunking Configuration
+# Character window, used only when no tokenizer is available (model still loading)
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+# Token budget per chunk (BGE-M3 tokenizer), so every script gets comparable encoder cost
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "256"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "50"))
+# Characters buffered by the streaming chunker before it cuts chunks from incoming pages
+CHUNK_STREAM_WINDOW = 8000
+
+# Streaming Ingestion
+# Chunks embedded + indexed per batch, and pages / batches in flight between pipeline stages
+INGEST_BATCH_CHUNKS = int(os.getenv("INGEST_BATCH_CHUNKS", "32"))
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "4"))
+
+# Hybrid Scoring Weights
+DENSE_WEIGHT = 0.6
+SPARSE_WEIGHT = 0.4
+
+# Persistence
+# Directory holding the on-disk vectors + chunk log; empty string disables persistence
+RAG_DATA_DIR = os.getenv("RAG_DATA_DIR", "data/rag")
+# Rewrite the log once this fraction of stored rows are deleted (and at least COMPACT_MIN_DEAD rows)
+COMPACT_DEAD_RATIO = 0.5
+COMPACT_MIN_DEAD = 1000
+
+# Chunk Embedding Cache
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "20000"))
+# SQLite file backing the cache; defaults to living next to the persisted index
+EMBEDDING_CACHE_PATH = os.getenv(
+    "EMBEDDING_CACHE_PATH", os.path.join(RAG_DATA_DIR, "embedding_cache.sqlite") if RAG_DATA_DIR else ""
+)
+
+# Dense Index Backend
+# "flat" keeps exact search forever; "hnsw" / "ivf" is promoted to once the corpus reaches ANN_THRESHOLD chunks
+DENSE_INDEX_BACKEND = os.getenv("DENSE_INDEX_BACKEND", "ivf")
+ANN_THRESHOLD = int(os.getenv("ANN_THRESHOLD", "100000"))
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "128"))
+IVF_NLIST = int(os.getenv("IVF_NLIST", "0"))  # 0 = 4 * sqrt(n), capped so every list gets ~39 training points
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", "32"))
+# Source filters this selective or smaller are answered exactly instead of through the ANN graph/lists
+EXACT_SUBSET_MAX = 20000
+# HNSW cannot delete in place; rebuild once this fraction of its vectors are tombstones
+HNSW_TOMBSTONE_RATIO = 0.2
+
+# Index Snapshots
+# Vectors added since the FAISS index was last rebuilt are searched exactly from an append-only
+# buffer; it is folded into a fresh copy of the index once it holds SNAPSHOT_DELTA_RATIO of the
+# index (at least SNAPSHOT_DELTA_MIN, at most SNAPSHOT_DELTA_MAX vectors). The copy briefly holds
+# the index twice in memory, so raise these to merge less often on large indexes
+SNAPSHOT_DELTA_MIN = int(os.getenv("SNAPSHOT_DELTA_MIN", "4096"))
+SNAPSHOT_DELTA_MAX = int(os.getenv("SNAPSHOT_DELTA_MAX", "50000"))
+SNAPSHOT_DELTA_RATIO = float(os.getenv("SNAPSHOT_DELTA_RATIO", "0.125"))
+
+# Dense Vector Compression
+# "none" stores float32; "fp16" / "sq8" / "pq" compress the in-memory index once CODEC_TRAIN_MIN chunks exist
+DENSE_CODEC = os.getenv("DENSE_CODEC", "none")
+# Optional reduction before quantization: "" (none), "pca<dims>" (e.g. pca256) or "opq"
+DENSE_REDUCTION = os.getenv("DENSE_REDUCTION", "")
+PQ_M = int(os.getenv("PQ_M", "64"))  # PQ sub-quantizers = bytes per vector
+CODEC_TRAIN_MIN = 10000
+TRAIN_SAMPLE_MAX = 100000
+# Compressed searches fetch this many times more candidates and re-rank them with full-precision vectors
+RERANK_FACTOR = 4
+
+# Query Encoding Micro-Batching
+# Concurrent search queries are collected for up to MAX_WAIT_MS and encoded in one BGE-M3 call
+QUERY_BATCH_MAX_SIZE = int(os.getenv("QUERY_BATCH_MAX_SIZE", "32"))
+QUERY_BATCH_MAX_WAIT_MS = float(os.getenv("QUERY_BATCH_MAX_WAIT_MS", "5"))
+
+# Query Caches
+# Level 1: query text -> (dense, sparse) encoding; level 2: (query, source, k, index version) -> result
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "2048"))
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "3600"))
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "1024"))
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "300"))
+
+# Model Loading
+# Texts encoded once after loading so the first real query doesn't pay first-inference warmup (0 disables)
+MODEL_WARMUP_BATCH = int(os.getenv("MODEL_WARMUP_BATCH", "8"))
+
+# Encoder Backend
+# "torch" runs FlagEmbedding; "onnx" runs an exported BGE-M3 under ONNX Runtime (CPU)
+ENCODER_BACKEND = os.getenv("ENCODER_BACKEND", "torch").lower()
+# Output of `python -m rag.onnx_encoder export`
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", "models/bge-m3-onnx")
+# "int8" loads the dynamically quantized graph, anything else the fp32 one
+ONNX_QUANTIZATION = os.getenv("ONNX_QUANTIZATION", "int8").lower()
+# Intra-op threads for the encoder (0 = runtime default: all physical cores)
+ENCODER_THREADS = int(os.getenv("ENCODER_THREADS", "0"))
+ENCODER_BATCH_SIZE = int(os.getenv("ENCODER_BATCH_SIZE", "12"))
+# Padded tokens (batch size x longest text) allowed per encoder call when bucketing by length
+ENCODER_BATCH_TOKENS = int(os.getenv("ENCODER_BATCH_TOKENS", "16384"))
+ENCODER_MAX_LENGTH = int(os.getenv("ENCODER_MAX_LENGTH", "8192"))
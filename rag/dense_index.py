@@ -0,0 +1,360 @@
+"""
+Dense vector index for the KnowledgeBase.
+Starts as an exact FAISS flat index and promotes itself to an approximate
+(HNSW or IVF) index once the corpus crosses a size threshold. Vectors can
+optionally be held compressed (fp16 / SQ8 / PQ, with PCA or OPQ in front),
+in which case candidates are re-ranked from full-precision vectors on disk.
+"""
+
+import math
+import time
+import logging
+from typing import Callable, Optional, Tuple
+
+import faiss
+import numpy as np
+
+from .constants import (
+    EMBEDDING_DIMENSIONS, DENSE_INDEX_BACKEND, ANN_THRESHOLD,
+    HNSW_M, HNSW_EF_CONSTRUCTION, HNSW_EF_SEARCH, IVF_NLIST, IVF_NPROBE,
+    EXACT_SUBSET_MAX, HNSW_TOMBSTONE_RATIO,
+    DENSE_CODEC, DENSE_REDUCTION, PQ_M, CODEC_TRAIN_MIN, TRAIN_SAMPLE_MAX, RERANK_FACTOR,
+)
+
+logger = logging.getLogger("rag.dense")
+
+BACKENDS = ("flat", "hnsw", "ivf")
+CODECS = ("none", "fp16", "sq8", "pq")
+
+
+class IdSubset:
+    """A fixed set of chunk ids that can be used as a FAISS search filter."""
+
+    def __init__(self, ids):
+        self.ids = np.asarray(ids, dtype="int64")
+        self._selector = None
+        self._not_selector = None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def selector(self):
+        if self._selector is None:
+            self._selector = faiss.IDSelectorBatch(self.ids)
+        return self._selector
+
+    @property
+    def not_selector(self):
+        """Selector matching every id outside the subset."""
+        if self._not_selector is None:
+            self._not_selector = faiss.IDSelectorNot(self.selector)
+        return self._not_selector
+
+
+class DenseIndex:
+    """FAISS inner-product index keyed by chunk id, with automatic ANN switchover."""
+
+    def __init__(self, dim: int = EMBEDDING_DIMENSIONS, backend: str = DENSE_INDEX_BACKEND,
+                 ann_threshold: int = ANN_THRESHOLD, codec: str = DENSE_CODEC,
+                 reduction: str = DENSE_REDUCTION,
+                 exact_vectors: Optional[Callable[[np.ndarray], np.ndarray]] = None):
+        """
+        Args:
+            dim: Vector dimensionality
+            backend: Target backend - 'flat' (always exact), 'hnsw' or 'ivf'
+            ann_threshold: Live vector count at which a flat index is promoted to the backend
+            codec: In-memory vector encoding - 'none', 'fp16', 'sq8' or 'pq'
+            reduction: '' or 'pca<dims>' / 'opq' transform applied before the codec
+            exact_vectors: Callable returning full-precision vectors for ids, used for
+                re-ranking and rebuilds (falls back to the index's own lossy copy if None)
+        """
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown dense index backend '{backend}', expected one of {BACKENDS}")
+        if codec not in CODECS:
+            raise ValueError(f"Unknown dense codec '{codec}', expected one of {CODECS}")
+        self.dim = dim
+        self.backend = backend
+        self.ann_threshold = ann_threshold
+        self.codec = codec
+        self.reduction = reduction.lower()
+        self.exact_vectors = exact_vectors
+        self.hnsw_ef_search = HNSW_EF_SEARCH
+        self.ivf_nprobe = IVF_NPROBE
+        if codec != "none" and exact_vectors is None:
+            logger.warning(f"Dense codec '{codec}' without a full-precision store: results will not be re-ranked")
+        self.reset()
+
+    def copy(self, empty: bool = False) -> "DenseIndex":
+        """Independent copy (same configuration, cloned FAISS index) to modify while this one is searched."""
+        clone = DenseIndex.__new__(DenseIndex)
+        clone.__dict__.update(self.__dict__)
+        if empty:
+            clone.reset()
+            return clone
+        clone._set_index(faiss.clone_index(self._index))
+        clone._deleted = set(self._deleted)
+        clone._deleted_selector = None
+        return clone
+
+    def reset(self):
+        self.kind = "flat"
+        self.compressed = False
+        self._set_index(self._build("flat", False, None))
+        self._deleted = set()  # HNSW tombstones
+        self._deleted_selector = None
+
+    def _set_index(self, index):
+        self._index = index
+        # Locate the IVF / HNSW layer (possibly behind IndexIDMap2 / IndexPreTransform) for search params
+        self._ivf = faiss.try_extract_index_ivf(index)
+        inner = index
+        while isinstance(inner, (faiss.IndexIDMap2, faiss.IndexIDMap, faiss.IndexPreTransform)):
+            inner = faiss.downcast_index(inner.index)
+        self._hnsw = inner if isinstance(inner, faiss.IndexHNSW) else None
+
+    @property
+    def ntotal(self) -> int:
+        return self._index.ntotal - len(self._deleted)
+
+    # --- Mutation ---
+
+    def add(self, ids: np.ndarray, vectors: np.ndarray):
+        self._index.add_with_ids(np.ascontiguousarray(vectors, dtype="float32"), np.asarray(ids, dtype="int64"))
+        kind = self.backend if self.ntotal >= self.ann_threshold else self.kind
+        compressed = self.compressed or (self.codec != "none" and self.ntotal >= CODEC_TRAIN_MIN)
+        if (kind, compressed) != (self.kind, self.compressed):
+            self._rebuild(kind, compressed)
+
+    def remove(self, ids):
+        ids = np.asarray(ids, dtype="int64")
+        if len(ids) == 0:
+            return
+        if self.kind == "hnsw":
+            # HNSW graphs cannot drop nodes; hide them and rebuild once enough pile up
+            self._deleted.update(ids.tolist())
+            self._deleted_selector = None
+            if len(self._deleted) > self._index.ntotal * HNSW_TOMBSTONE_RATIO:
+                self._rebuild(self.kind, self.compressed)
+        else:
+            self._index.remove_ids(faiss.IDSelectorArray(ids))
+
+    # --- Access ---
+
+    def ids(self) -> np.ndarray:
+        """All live chunk ids."""
+        if self._ivf is not None:
+            invlists = self._ivf.invlists
+            parts = [faiss.rev_swig_ptr(invlists.get_ids(l), invlists.list_size(l)).copy()
+                     for l in range(invlists.nlist) if invlists.list_size(l)]
+            ids = np.concatenate(parts) if parts else np.empty(0, dtype="int64")
+        else:
+            ids = faiss.vector_to_array(self._index.id_map)
+        if self._deleted:
+            ids = ids[~np.isin(ids, np.fromiter(self._deleted, dtype="int64"))]
+        return ids
+
+    def reconstruct(self, ids) -> np.ndarray:
+        """Vectors for ids - full precision when an exact store is attached."""
+        ids = np.asarray(ids, dtype="int64")
+        if len(ids) == 0:
+            return np.empty((0, self.dim), dtype="float32")
+        if self.exact_vectors is None:
+            return self._index.reconstruct_batch(ids)
+        try:
+            return self.exact_vectors(ids)
+        except KeyError:
+            pass
+        # Some ids were deleted from the store after this (snapshot) index was taken: only those
+        # come from the index's own (possibly compressed) copy, the rest stay full precision
+        vectors = np.empty((len(ids), self.dim), dtype="float32")
+        missing = []
+        for i, chunk_id in enumerate(ids.tolist()):
+            try:
+                vectors[i] = self.exact_vectors([chunk_id])[0]
+            except KeyError:
+                missing.append(i)
+        if missing:
+            vectors[missing] = self._index.reconstruct_batch(ids[missing])
+        return vectors
+
+    def search(self, queries: np.ndarray, n: int, subset: IdSubset = None,
+               exclude: IdSubset = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-n chunk ids by inner product, optionally restricted to a subset.
+
+        Args:
+            queries: (nq, dim) normalized query vectors
+            n: Results per query
+            subset: Only return these ids
+            exclude: Never return these ids (e.g. chunks deleted since a snapshot of this index)
+
+        Returns:
+            (scores, ids) arrays of shape (len(queries), n); missing slots are -1
+        """
+        queries = np.ascontiguousarray(queries, dtype="float32")
+        approximate = self.kind != "flat" or self.compressed
+        if subset is not None and approximate and len(subset) <= EXACT_SUBSET_MAX:
+            return self._exact_subset_search(queries, n, subset, exclude)
+        params = self._search_params(subset, exclude)
+        if not (self.compressed and self.exact_vectors is not None):
+            return self._index.search(queries, n, params=params)
+        _, I = self._index.search(queries, n * RERANK_FACTOR, params=params)
+        return self._rerank(queries, I, n)
+
+    def _rerank(self, queries: np.ndarray, candidates: np.ndarray, n: int):
+        """Exact inner products for compressed-index candidates, from the full-precision store."""
+        D = np.full((len(queries), n), -np.inf, dtype="float32")
+        I = np.full((len(queries), n), -1, dtype="int64")
+        for row, (query, ids) in enumerate(zip(queries, candidates)):
+            ids = ids[ids >= 0]
+            if len(ids) == 0:
+                continue
+            scores = self.reconstruct(ids) @ query
+            top = np.argsort(-scores)[:n]
+            D[row, :len(top)] = scores[top]
+            I[row, :len(top)] = ids[top]
+        return D, I
+
+    def _search_params(self, subset: IdSubset = None, exclude: IdSubset = None):
+        sel = subset.selector if subset is not None else None
+        excluded = []
+        if self._deleted:
+            if self._deleted_selector is None:
+                self._deleted_selector = faiss.IDSelectorNot(
+                    faiss.IDSelectorBatch(np.fromiter(self._deleted, dtype="int64")))
+            excluded.append(self._deleted_selector)
+        if exclude is not None and len(exclude):
+            excluded.append(exclude.not_selector)
+        chain = []  # intermediate selectors, referenced only from C++
+        for not_sel in excluded:
+            sel = faiss.IDSelectorAnd(sel, not_sel) if sel is not None else not_sel
+            chain.append(sel)
+
+        # A selective filter leaves fewer eligible vectors per list / graph hop, so widen the search
+        boost = max(1.0, self.ntotal / max(len(subset), 1)) if subset is not None else 1.0
+        if self._hnsw is not None:
+            params = faiss.SearchParametersHNSW(efSearch=int(min(self.hnsw_ef_search * boost, 4096)))
+        elif self._ivf is not None:
+            params = faiss.SearchParametersIVF(nprobe=int(min(self.ivf_nprobe * boost, self._ivf.nlist)))
+        elif sel is not None:
+            params = faiss.SearchParameters()
+        else:
+            return None
+        if sel is not None:
+            params.sel = sel
+            # FAISS parameter objects don't own their selectors; pin them for the duration of the search
+            params._refs = (sel, chain, subset, exclude, self._deleted_selector)
+        return params
+
+    def _exact_subset_search(self, queries: np.ndarray, n: int, subset: IdSubset, exclude: IdSubset = None):
+        ids = subset.ids
+        if self._deleted:
+            ids = ids[~np.isin(ids, np.fromiter(self._deleted, dtype="int64"))]
+        if exclude is not None and len(exclude):
+            ids = ids[~np.isin(ids, exclude.ids)]
+        scores = queries @ self.reconstruct(ids).T
+        D = np.full((len(queries), n), -np.inf, dtype="float32")
+        I = np.full((len(queries), n), -1, dtype="int64")
+        m = min(n, len(ids))
+        if m:
+            top = np.argsort(-scores, axis=1)[:, :m]
+            D[:, :m] = np.take_along_axis(scores, top, axis=1)
+            I[:, :m] = ids[top]
+        return D, I
+
+    # --- Backend management ---
+
+    def _spec(self, kind: str, compressed: bool, n: int) -> str:
+        """index_factory string for a backend / codec combination."""
+        codec = self.codec if compressed else "none"
+        prefix = ""
+        if codec != "none" and self.reduction == "opq":
+            prefix = f"OPQ{PQ_M}," if codec == "pq" else ""
+        elif codec != "none" and self.reduction.startswith("pca"):
+            prefix = f"PCA{int(self.reduction[3:])},"
+        # "np": skip polysemous training - search never uses it, and it costs ~20s per (re)build
+        encoding = {"none": "Flat", "fp16": "SQfp16", "sq8": "SQ8", "pq": f"PQ{PQ_M}np"}[codec]
+        if kind == "ivf":
+            nlist = IVF_NLIST or int(4 * math.sqrt(n))
+            nlist = max(1, min(nlist, n // 39))
+            return f"{prefix}IVF{nlist},{encoding}"
+        if kind == "hnsw":
+            return f"{prefix}HNSW{HNSW_M}" + ("" if codec == "none" else f"_{encoding}")
+        # IndexPQ can't take search parameters (id filters), a single-list IVF-PQ can
+        if codec == "pq":
+            return f"{prefix}IVF1,{encoding}"
+        return f"{prefix}{encoding}"
+
+    def _build(self, kind: str, compressed: bool, train_vectors: np.ndarray = None):
+        if kind == "flat" and not compressed:
+            return faiss.IndexIDMap2(faiss.IndexFlatIP(self.dim))
+        spec = self._spec(kind, compressed, len(train_vectors))
+        index = faiss.index_factory(self.dim, spec, faiss.METRIC_INNER_PRODUCT)
+        if not index.is_trained:
+            if len(train_vectors) > TRAIN_SAMPLE_MAX:
+                sample = np.random.default_rng(0).choice(len(train_vectors), TRAIN_SAMPLE_MAX, replace=False)
+                train_vectors = train_vectors[np.sort(sample)]
+            index.train(np.ascontiguousarray(train_vectors, dtype="float32"))
+        ivf = faiss.try_extract_index_ivf(index)
+        if ivf is not None:
+            # IVF keeps ids natively; a hashtable direct map lets us reconstruct and remove by id
+            ivf.set_direct_map_type(faiss.DirectMap.Hashtable)
+            return index
+        hnsw = index
+        if isinstance(hnsw, faiss.IndexPreTransform):
+            hnsw = faiss.downcast_index(hnsw.index)
+        if isinstance(hnsw, faiss.IndexHNSW):
+            hnsw.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        return faiss.IndexIDMap2(index)
+
+    def _rebuild(self, kind: str, compressed: bool):
+        start = time.time()
+        ids = self.ids()
+        vectors = self.reconstruct(ids)
+        index = self._build(kind, compressed, vectors)
+        index.add_with_ids(vectors, ids)
+        previous = self.describe()
+        self._set_index(index)
+        self.kind = kind
+        self.compressed = compressed
+        self._deleted = set()
+        self._deleted_selector = None
+        logger.info(f"Dense index {previous} -> {self.describe()}: {len(ids)} vectors "
+                    f"in {(time.time()-start)*1000:.0f}ms, {self.bytes_per_vector()} bytes/vector")
+        if kind != "flat" or compressed:
+            logger.info(f"Dense index recall@10 vs exact: {self._recall(ids, vectors):.3f}")
+
+    def describe(self) -> str:
+        return self.kind + (f"+{self.reduction + '+' if self.reduction else ''}{self.codec}" if self.compressed else "")
+
+    def bytes_per_vector(self) -> int:
+        """Resident code size per vector (excluding graph links / id maps)."""
+        inner = self._index
+        while isinstance(inner, (faiss.IndexIDMap2, faiss.IndexIDMap, faiss.IndexPreTransform)):
+            inner = faiss.downcast_index(inner.index)
+        if isinstance(inner, faiss.IndexHNSW):
+            inner = faiss.downcast_index(inner.storage)
+        try:
+            return int(inner.sa_code_size())
+        except RuntimeError:
+            return self.dim * 4
+
+    def recall_check(self, n_queries: int = 100, k: int = 10) -> float:
+        """Recall@k of the current index against exact search, using stored vectors as queries."""
+        if (self.kind == "flat" and not self.compressed) or self.ntotal == 0:
+            return 1.0
+        ids = self.ids()
+        return self._recall(ids, self.reconstruct(ids), n_queries, k)
+
+    def _recall(self, ids: np.ndarray, vectors: np.ndarray, n_queries: int = 100, k: int = 10) -> float:
+        rng = np.random.default_rng(0)
+        sample = rng.choice(len(ids), size=min(n_queries, len(ids)), replace=False)
+        queries = np.ascontiguousarray(vectors[sample])
+        exact = faiss.IndexFlatIP(self.dim)
+        exact.add(vectors)
+        _, exact_pos = exact.search(queries, k)
+        _, approx_ids = self.search(queries, k)
+        hits = sum(len(set(ids[row[row >= 0]]) & set(approx_row[approx_row >= 0]))
+                   for row, approx_row in zip(exact_pos, approx_ids))
+        return hits / (len(queries) * min(k, len(ids)))
@@ -0,0 +1,140 @@
+"""
+Content-addressed cache of BGE-M3 chunk embeddings.
+Entries are keyed by a hash of the model name and the normalized chunk text,
+so re-uploads and shared boilerplate are embedded only once.
+"""
+
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger("rag.cache")
+
+# A disk hit only rewrites an entry's last_used once it is this many seconds old (LRU granularity)
+TOUCH_INTERVAL = 600
+
+
+class EmbeddingCache:
+    """Bounded LRU of (dense vector, lexical weights) with optional SQLite backing."""
+
+    def __init__(self, model_name: str, max_entries: int = 20000, path: str = None):
+        """
+        Args:
+            model_name: Encoder name, part of every key so a model change never hits stale vectors
+            max_entries: Maximum entries held in memory and on disk
+            path: SQLite file for persistence (memory only if None)
+        """
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[np.ndarray, Dict[str, float]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._db = None
+        self._disk_count = 0
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, dense BLOB NOT NULL, sparse TEXT NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+            self._db.commit()
+            self._disk_count = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            logger.info(f"Embedding cache opened at {path} ({self._disk_count} entries)")
+
+    def key(self, text: str) -> str:
+        normalized = re.sub(r'\s+', ' ', unicodedata.normalize("NFC", text)).strip()
+        return hashlib.sha256(f"{self.model_name}\0{normalized}".encode("utf-8")).hexdigest()
+
+    def get_many(self, texts: List[str]) -> List[Optional[Tuple[np.ndarray, Dict[str, float]]]]:
+        """Look up each text; returns (dense, lexical_weights) or None per text."""
+        keys = [self.key(t) for t in texts]
+        results = []
+        touched = 0
+        now = time.time()
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                elif self._db is not None:
+                    entry, stale = self._load(key, now)
+                    if entry is not None:
+                        self._remember(key, entry)
+                        touched += stale
+                results.append(entry)
+            hits = sum(1 for r in results if r is not None)
+            self.hits += hits
+            self.misses += len(results) - hits
+            if touched:
+                self._db.commit()
+        return results
+
+    def put_many(self, texts: List[str], dense_vecs: np.ndarray, lexical_weights: List[Dict[str, float]]):
+        """Insert freshly encoded chunks."""
+        now = time.time()
+        with self._lock:
+            for text, dense, weights in zip(texts, dense_vecs, lexical_weights):
+                key = self.key(text)
+                entry = (np.asarray(dense, dtype="float32").copy(), {str(k): float(v) for k, v in weights.items()})
+                self._remember(key, entry)
+                if self._db is not None:
+                    cur = self._db.execute(
+                        "INSERT OR REPLACE INTO embeddings (key, dense, sparse, last_used) VALUES (?, ?, ?, ?)",
+                        (key, entry[0].tobytes(), json.dumps(entry[1]), now),
+                    )
+                    self._disk_count += cur.rowcount
+            if self._db is not None:
+                self._evict_disk()
+                self._db.commit()
+
+    def _remember(self, key: str, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _load(self, key: str, now: float):
+        """Read an entry from disk; returns (entry or None, whether its last_used was rewritten)."""
+        row = self._db.execute("SELECT dense, sparse, last_used FROM embeddings WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None, False
+        # Keep hits read-only unless the recorded use is stale enough to matter for eviction
+        stale = now - row[2] > TOUCH_INTERVAL
+        if stale:
+            self._db.execute("UPDATE embeddings SET last_used = ? WHERE key = ?", (now, key))
+        return (np.frombuffer(row[0], dtype="float32").copy(), json.loads(row[1])), stale
+
+    def _evict_disk(self):
+        # INSERT OR REPLACE counts replacements too, so resync before trusting the counter
+        if self._disk_count <= self.max_entries:
+            return
+        self._disk_count = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        excess = self._disk_count - self.max_entries
+        if excess > 0:
+            self._db.execute(
+                "DELETE FROM embeddings WHERE key IN "
+                "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)", (excess,)
+            )
+            self._disk_count -= excess
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "disk_entries": self._disk_count,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
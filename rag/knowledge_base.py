@@ -0,0 +1,429 @@
+"""
+FAISS + BGE-M3 hybrid knowledge base used for RAG.
+Dense similarity comes from FAISS, lexical matching from BGE-M3 sparse weights.
+"""
+
+import re
+import time
+import uuid
+import logging
+import threading
+from typing import Dict, Optional
+
+import faiss
+import numpy as np
+
+from .constants import (
+    EMBEDDING_DIMENSIONS, DENSE_WEIGHT, SPARSE_WEIGHT,
+    QUERY_CACHE_SIZE, QUERY_CACHE_TTL, RESULT_CACHE_SIZE, RESULT_CACHE_TTL,
+)
+from .storage import KnowledgeBaseStore
+from .embedding_cache import EmbeddingCache
+from .sparse_index import SparseIndex, top_n
+from .dense_index import DenseIndex
+from .query_batcher import QueryBatcher
+from .query_cache import TTLCache
+from .upsert import DocumentUpsert
+from .chunk_table import ChunkTable
+from .snapshot import LayeredDenseIndex, Snapshot
+from .chunking import Chunker, CharChunker, TokenChunker, token_lengths, length_buckets
+
+logger = logging.getLogger("rag")
+
+
+class KnowledgeBase:
+    """BGE-M3 hybrid (dense+sparse+colbert) vector knowledge base for RAG."""
+
+    def __init__(self, model, data_dir: str = None, embedding_cache: EmbeddingCache = None):
+        """
+        Args:
+            model: BGE-M3 encoder exposing FlagEmbedding's encode() interface; may be
+                None while it loads in the background and attached later, since a
+                warm restart from data_dir needs no encoding
+            data_dir: Directory to persist the index in (in-memory only if None)
+            embedding_cache: Chunk embedding cache consulted before encoding
+        """
+        self.model = model
+        self.embedding_cache = embedding_cache
+        self.query_batcher = QueryBatcher(self._encode)
+        self.query_cache = TTLCache(QUERY_CACHE_SIZE, QUERY_CACHE_TTL)  # query -> (dense, sparse)
+        self.result_cache = TTLCache(RESULT_CACHE_SIZE, RESULT_CACHE_TTL)  # (query, source, k, version) -> text
+        # Bumped on every add/delete so cached results from older contents are never served
+        self.version = 0
+        # Chunks are keyed by a stable integer id that is also the FAISS id,
+        # so deletes never shift positions or require re-embedding.
+        self.chunks = ChunkTable()  # chunk_id -> text, source, doc_id (columnar)
+        self.store = KnowledgeBaseStore(data_dir) if data_dir else None
+        # Compressed dense codecs re-rank against the store's memory-mapped float32 vectors;
+        # new vectors are buffered next to a frozen FAISS base so searches never see a write
+        self.index = LayeredDenseIndex(DenseIndex(exact_vectors=self.store.vectors if self.store else None))
+        # Lexical weights as sparse matrices, for sparse-side retrieval and hybrid scoring
+        self.sparse_index = SparseIndex()
+        self._next_id = 0
+        self._chunker = None  # TokenChunker bound to the model's tokenizer, built on first use
+        # Serializes index writes (adds, deletes, clears) from concurrent ingestions
+        self.write_lock = threading.RLock()
+        # doc_id -> [lock, holders + waiters]: one upsert per document at a time (begin_upsert .. finish)
+        self._doc_locks: Dict[str, list] = {}
+        self._doc_locks_guard = threading.Lock()
+        # What searches read: replaced (never modified) by writers, so reads take no lock
+        self._snapshot = None
+        if self.store:
+            self._load_from_store()
+        self._publish()
+        logger.info(f"KnowledgeBase initialised (BGE-M3 hybrid, backend=faiss/{self.index.describe()}, "
+                    f"persist={data_dir or 'off'}, chunks={self.index.ntotal})")
+
+    def _load_from_store(self):
+        """Warm restart: rebuild FAISS + side tables from disk without encoding."""
+        load_start = time.time()
+        ids, vectors, records = self.store.load()
+        if not records:
+            return
+        self.index.add(ids, vectors)
+        self._register(ids, [rec["text"] for rec in records], [rec["source"] for rec in records],
+                       [rec["doc_id"] for rec in records], [rec["sparse"] for rec in records])
+        self._next_id = int(ids.max()) + 1
+        logger.info(f"Restored {len(records)} chunks from disk in {(time.time()-load_start)*1000:.2f}ms")
+
+    def _register(self, ids, texts, sources, doc_ids, sparse):
+        """Add chunks to the chunk table and sparse side tables (FAISS is updated by the caller)."""
+        self.sparse_index.add_batch(ids, sparse)
+        self.chunks.add(ids, texts, sources, doc_ids)
+
+    def _publish(self):
+        """Make the current contents visible to searches as one new version (caller holds write_lock)."""
+        self.version += 1
+        self._snapshot = Snapshot(self.version, self.chunks.view(), self.sparse_index.view(), self.index.view())
+
+    def snapshot(self) -> Snapshot:
+        """The latest published version; stays valid and unchanged while writes continue."""
+        return self._snapshot
+
+    def _clean_text(self, text: str) -> str:
+        if not text: return ""
+        return re.sub(r'\s+', ' ', text).strip()
+
+    def _tokenizer(self):
+        return getattr(self.model, "tokenizer", None)
+
+    def chunker(self) -> Chunker:
+        """Token-budget chunker for the current model, or character windows if it has no fast tokenizer."""
+        tokenizer = self._tokenizer()
+        if not getattr(tokenizer, "is_fast", False):
+            return CharChunker()
+        if getattr(self._chunker, "tokenizer", None) is not tokenizer:
+            self._chunker = TokenChunker(tokenizer)
+        return self._chunker
+
+    def _get_chunks(self, text: str):
+        return self.chunker().chunk(text)
+
+    def _encode(self, texts):
+        """
+        Encode texts using BGE-M3 (dense + sparse), batching texts of similar token length.
+
+        Returns:
+            dict with 'dense_vecs' and 'lexical_weights' in the order of texts
+        """
+        if len(texts) <= 1:
+            return self._encode_batch(texts)
+        buckets = length_buckets(token_lengths(self._tokenizer(), texts))
+        if len(buckets) == 1:
+            return self._encode_batch(texts)
+        dense_vecs = [None] * len(texts)
+        lexical = [None] * len(texts)
+        for bucket in buckets:
+            output = self._encode_batch([texts[i] for i in bucket.tolist()])
+            for j, i in enumerate(bucket.tolist()):
+                dense_vecs[i] = output['dense_vecs'][j]
+                lexical[i] = output['lexical_weights'][j]
+        return {'dense_vecs': np.stack(dense_vecs), 'lexical_weights': lexical}
+
+    def _encode_batch(self, texts):
+        return self.model.encode(
+            texts,
+            batch_size=max(len(texts), 1),
+            return_dense=True,
+            return_sparse=True,
+            return_colbert_vecs=False,
+        )
+
+    def embed_chunks(self, chunks):
+        """
+        Dense (normalized) + lexical embeddings for chunks, encoding only cache misses.
+
+        Returns:
+            (dense_vecs float32 array, list of lexical weight dicts)
+        """
+        if self.embedding_cache is None:
+            output = self._encode(chunks)
+            dense_vecs = np.array(output['dense_vecs']).astype('float32')
+            faiss.normalize_L2(dense_vecs)
+            return dense_vecs, list(output['lexical_weights'])
+
+        cached = self.embedding_cache.get_many(chunks)
+        dense_vecs = np.empty((len(chunks), EMBEDDING_DIMENSIONS), dtype='float32')
+        lexical = [None] * len(chunks)
+        misses = []
+        for i, entry in enumerate(cached):
+            if entry is None:
+                misses.append(i)
+            else:
+                dense_vecs[i], lexical[i] = entry
+
+        if misses:
+            # Encode each distinct missing text once, even if it repeats within the batch
+            unique_texts = list(dict.fromkeys(chunks[i] for i in misses))
+            output = self._encode(unique_texts)
+            new_dense = np.array(output['dense_vecs']).astype('float32')
+            faiss.normalize_L2(new_dense)
+            self.embedding_cache.put_many(unique_texts, new_dense, output['lexical_weights'])
+            pos = {text: j for j, text in enumerate(unique_texts)}
+            for i in misses:
+                j = pos[chunks[i]]
+                dense_vecs[i] = new_dense[j]
+                lexical[i] = output['lexical_weights'][j]
+        logger.info(f"[BGE-M3] Embedding cache: {len(chunks) - len(misses)} hits, {len(misses)} misses")
+        return dense_vecs, lexical
+
+    @staticmethod
+    def document_id(source_name: str, filename: str) -> str:
+        """Stable doc_id for a named file, so re-uploading it updates rather than duplicates it."""
+        return f"{source_name}/{filename}"
+
+    def build_index(self, text: str, source_name: str, doc_id: str = None) -> str:
+        """Index text as one document, replacing only that document's previous version."""
+        if doc_id is None:
+            doc_id = str(uuid.uuid4())
+        clean_text = self._clean_text(text)
+        chunks = self._get_chunks(clean_text)
+        upsert = self.begin_upsert(doc_id, source_name)
+        try:
+            upsert.add(upsert.new_chunks(chunks))
+            upsert.finish()
+        finally:
+            upsert.release()
+        return doc_id
+
+    def begin_upsert(self, doc_id: str, source_name: str, blocking: bool = True) -> Optional[DocumentUpsert]:
+        """
+        Start re-indexing a document: chunks whose text is unchanged keep their
+        vectors, only new ones are embedded, and finish() drops the rest.
+
+        Upserts of the same doc_id run one at a time: the document stays locked from
+        here until the upsert's finish() or release(), so overlapping re-uploads can't
+        both add their chunks to the same previous version.
+
+        Args:
+            doc_id: Document being (re)indexed
+            source_name: Category the document belongs to
+            blocking: Wait for another upsert of doc_id to finish; if False, return None instead
+        """
+        if not self._lock_doc(doc_id, blocking):
+            return None
+        existing, stale = {}, []
+        with self.write_lock:
+            for chunk_id in self.chunks.ids_for_doc(doc_id).tolist():
+                if self.chunks.source(chunk_id) == source_name:
+                    existing.setdefault(self.chunks.text(chunk_id), []).append(chunk_id)
+                else:
+                    stale.append(chunk_id)
+        return DocumentUpsert(self, doc_id, source_name, existing, stale)
+
+    def _lock_doc(self, doc_id: str, blocking: bool = True) -> bool:
+        with self._doc_locks_guard:
+            entry = self._doc_locks.setdefault(doc_id, [threading.Lock(), 0])
+            entry[1] += 1
+        if entry[0].acquire(blocking):
+            return True
+        self._unlock_doc(doc_id, acquired=False)
+        return False
+
+    def _unlock_doc(self, doc_id: str, acquired: bool = True):
+        with self._doc_locks_guard:
+            entry = self._doc_locks[doc_id]
+            if acquired:
+                entry[0].release()
+            entry[1] -= 1
+            if not entry[1]:
+                del self._doc_locks[doc_id]
+
+    def add_documents(self, chunks, source_name: str, doc_id: str = None, embeddings=None):
+        """
+        Embed chunks and add them to the index. Encoding runs outside the write lock,
+        so concurrent ingestions only serialize on the index update itself.
+
+        Args:
+            chunks: Chunk texts
+            source_name: Category the chunks belong to
+            doc_id: Document id (generated if None)
+            embeddings: Precomputed (dense_vecs, lexical_weights) from embed_chunks()
+
+        Returns:
+            Chunk ids assigned to the chunks
+        """
+        if not chunks:
+            logger.warning(f"No chunks to add for source: {source_name}")
+            return np.empty(0, dtype='int64')
+        if doc_id is None:
+            doc_id = str(uuid.uuid4())
+
+        logger.info(f"[BGE-M3] Adding {len(chunks)} chunks — doc_id={doc_id} source='{source_name}'")
+        add_start = time.time()
+
+        if embeddings is None:
+            dense_vecs, lexical_weights = self.embed_chunks(chunks)
+            logger.info(f"Embeddings generated in {(time.time()-add_start)*1000:.2f}ms")
+        else:
+            dense_vecs, lexical_weights = embeddings
+
+        with self.write_lock:
+            ids = np.arange(self._next_id, self._next_id + len(chunks), dtype='int64')
+            self._next_id += len(chunks)
+            if self.store:
+                self.store.append(ids, dense_vecs, [
+                    {"text": chunk, "source": source_name, "doc_id": doc_id, "sparse": lexical_weights[i]}
+                    for i, chunk in enumerate(chunks)
+                ])
+            self.index.add(ids, dense_vecs)
+            self._register(ids, chunks, [source_name] * len(chunks), [doc_id] * len(chunks), lexical_weights)
+            self._publish()
+        logger.info(f"FAISS index size: {self.index.ntotal} vectors")
+        logger.info(f"add_documents done in {(time.time()-add_start)*1000:.2f}ms")
+        return ids
+
+    def _remove_ids(self, ids) -> int:
+        """Drop chunks by id from FAISS and all side tables. Never re-encodes."""
+        with self.write_lock:
+            ids = self.chunks.live(ids).tolist()
+            if not ids:
+                return 0
+            if self.store:
+                self.store.delete(ids)
+            self.index.remove(ids)
+            self.chunks.remove(ids)
+            self.sparse_index.remove_batch(ids)
+            self._publish()
+            if self.store and self.store.needs_compaction():
+                self._compact_store()
+            return len(ids)
+
+    def _compact_store(self):
+        """Rewrite the on-disk files with only live chunks, using vectors already in FAISS."""
+        ids = self.chunks.ids()
+        vectors = self.index.view().reconstruct(ids)
+        records = [{**self.chunks.get(i), "sparse": self.sparse_index.weights(i)} for i in ids.tolist()]
+        self.store.compact(ids, vectors, records)
+
+    def clear_by_source(self, source_name: str):
+        """Remove all chunks for a given source from the index."""
+        with self.write_lock:
+            removed = self._remove_ids(self.chunks.ids_for_source(source_name))
+        if removed:
+            logger.info(f"Cleared source='{source_name}', {removed} chunks removed")
+
+    def clear(self, doc_id: str = None):
+        if doc_id:
+            with self.write_lock:
+                removed = self._remove_ids(self.chunks.ids_for_doc(doc_id))
+            logger.info(f"FAISS: removed doc_id={doc_id} ({removed} chunks), {len(self.chunks)} chunks remain")
+            return
+        with self.write_lock:
+            self.chunks.clear()
+            self.sparse_index.clear()
+            self.index.reset()
+            self._publish()
+            if self.store:
+                self.store.clear()
+        logger.info("FAISS index cleared")
+
+    def list_documents(self):
+        """Returns list of {source_name, chunk_count} grouped by category."""
+        counts = self._snapshot.chunks.source_counts()
+        return [{"source_name": sn, "chunk_count": n} for sn, n in counts.items()]
+
+    def search_rag(self, query: str, k: int = 5, source_name: str = None) -> str:
+        logger.info(f"[BGE-M3] RAG search: '{query[:100]}' source_name={source_name}")
+        start_time = time.time()
+        # Every read below comes from this one version, whatever writers do meanwhile
+        snap = self._snapshot
+        chunks = snap.chunks
+
+        if snap.dense.ntotal == 0:
+            logger.warning("FAISS index is empty")
+            return "NO_INFORMATION_IN_KNOWLEDGE_BASE"
+
+        query_key = " ".join(query.split())
+        result_key = (query_key, source_name, k, snap.version)
+        cached = self.result_cache.get(result_key)
+        if cached is not None:
+            logger.info(f"[RAG] Result cache hit. Latency: {(time.time() - start_time) * 1000:.2f}ms")
+            return cached
+
+        # Encode query (dense + sparse), batched with any concurrent searches
+        encoded = self.query_cache.get(query_key)
+        if encoded is None:
+            encoded = self.query_batcher.encode(query_key)
+            self.query_cache.put(query_key, encoded)
+        dense, q_sparse = encoded
+        q_dense = np.array([dense]).astype('float32')
+        faiss.normalize_L2(q_dense)
+
+        # When scoped to a source, the filter runs inside FAISS so the top-N are
+        # the true nearest neighbours within that source, not survivors of a global top-N
+        if source_name:
+            n_candidates = min(k * 2, chunks.source_count(source_name))
+            if n_candidates == 0:
+                logger.warning(f"No chunks indexed for source_name={source_name}")
+                return "No specific information found."
+        else:
+            n_candidates = min(k * 2, snap.dense.ntotal)
+
+        # Dense top-N via FAISS
+        D, I = snap.dense_search(q_dense, n_candidates, source_name)
+        found = np.isin(I[0], chunks.live(I[0]))
+        dense_scores = dict(zip(I[0][found].tolist(), D[0][found].tolist()))
+
+        # Sparse top-N over every chunk sharing a token with the query (CSC columns = posting lists)
+        sparse_ids, sparse_vals = snap.sparse.score_all(q_sparse)
+        if source_name:
+            keep = chunks.in_source(sparse_ids, source_name)
+            sparse_ids, sparse_vals = sparse_ids[keep], sparse_vals[keep]
+        sparse_top = top_n(sparse_ids, sparse_vals, n_candidates)
+
+        # Fuse: union of both top-N lists, each scored on both sides
+        candidate_ids = list(dict.fromkeys(list(dense_scores) + [idx for idx, _ in sparse_top]))
+        if source_name:
+            in_source = chunks.in_source(candidate_ids, source_name)
+            candidate_ids = [idx for idx, keep in zip(candidate_ids, in_source.tolist()) if keep]
+        missing_dense = [idx for idx in candidate_ids if idx not in dense_scores]
+        if missing_dense:
+            vecs = snap.dense.reconstruct(missing_dense)
+            for idx, score in zip(missing_dense, (vecs @ q_dense[0]).tolist()):
+                dense_scores[idx] = score
+
+        # Hybrid scoring: dense (0.6) + sparse/lexical (0.4); the sparse side is one CSR mat-vec
+        sparse_scores = snap.sparse.score(candidate_ids, q_sparse)
+        hybrid = (DENSE_WEIGHT * np.array([dense_scores[idx] for idx in candidate_ids], dtype='float32')
+                  + SPARSE_WEIGHT * sparse_scores)
+        candidates = list(zip(hybrid.tolist(), candidate_ids))
+
+        # Sort by hybrid score, take top 3
+        candidates.sort(key=lambda x: x[0], reverse=True)
+        logger.info(f"[RAG] All candidates ({len(candidates)}):")
+        for rank, (score, idx) in enumerate(candidates[:5]):
+            logger.info(f"  #{rank+1} score={score:.4f} src={chunks.source(idx)} "
+                        f"text={chunks.text(idx)[:200]}")
+
+        llm_results = []
+        for score, idx in candidates[:3]:
+            llm_results.append(f"[{chunks.source(idx)}]: {chunks.text(idx)}")
+
+        total_time = (time.time() - start_time) * 1000
+        result_text = "\n\n---\n\n".join(llm_results) if llm_results else "No specific information found."
+        logger.info(f"[RAG] DONE. Latency: {total_time:.2f}ms | Sent to LLM: {len(llm_results)}")
+        if llm_results:
+            logger.info(f"[RAG] Context sent to LLM:\n{result_text[:500]}")
+        self.result_cache.put(result_key, result_text)
+        return result_text
@@ -0,0 +1,75 @@
+"""
+Deferred loading and warmup of the BGE-M3 embedding model.
+The encoder backend (FlagEmbedding/torch or ONNX Runtime) is only imported
+when the model is actually loaded, so importing the server stays cheap.
+"""
+
+import time
+import logging
+
+from .constants import (
+    EMBEDDING_MODEL_NAME, CHUNK_MAX_TOKENS, MODEL_WARMUP_BATCH, ENCODER_BACKEND, ENCODER_THREADS,
+    ONNX_MODEL_DIR, ONNX_QUANTIZATION,
+)
+
+logger = logging.getLogger("rag.model")
+
+# Mixed-length, mixed-script samples so warmup exercises short-query and full-chunk shapes
+_WARMUP_TEXTS = [
+    "What are the opening hours?",
+    "अपॉइंटमेंट कैसे बुक करें?",
+    "అపాయింట్‌మెంట్ ఎలా బుక్ చేయాలి?",
+    "warmup " * (CHUNK_MAX_TOKENS // 2),
+]
+
+
+def _load_torch(model_name: str):
+    import torch
+    from FlagEmbedding import BGEM3FlagModel
+
+    if ENCODER_THREADS > 0:
+        torch.set_num_threads(ENCODER_THREADS)
+    # fp16 only pays off on GPU; on CPU it is emulated and usually slower than fp32
+    return BGEM3FlagModel(model_name, use_fp16=torch.cuda.is_available())
+
+
+def _load_onnx(model_name: str):
+    from .onnx_encoder import OnnxEncoder
+    return OnnxEncoder(ONNX_MODEL_DIR, quantization=ONNX_QUANTIZATION)
+
+
+# backend name -> loader returning an object with FlagEmbedding's encode() interface
+BACKENDS = {
+    "torch": _load_torch,
+    "onnx": _load_onnx,
+}
+
+
+def encoder_name(model_name: str = EMBEDDING_MODEL_NAME, backend: str = ENCODER_BACKEND) -> str:
+    """Identity of the encoder's outputs, used to key the embedding cache."""
+    if backend == "onnx" and ONNX_QUANTIZATION == "int8":
+        # Quantized outputs differ slightly, so they must not mix with full-precision cache entries
+        return f"{model_name}:int8"
+    return model_name
+
+
+def load_embedding_model(model_name: str = EMBEDDING_MODEL_NAME, backend: str = ENCODER_BACKEND,
+                         warmup_batch: int = MODEL_WARMUP_BATCH):
+    """Load BGE-M3 on the configured encoder backend and run a warmup batch."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown ENCODER_BACKEND '{backend}' (expected one of {', '.join(BACKENDS)})")
+    start = time.time()
+    model = BACKENDS[backend](model_name)
+    logger.info(f"Loaded {model_name} ({backend}) in {time.time() - start:.1f}s")
+    warmup(model, warmup_batch)
+    return model
+
+
+def warmup(model, batch_size: int = MODEL_WARMUP_BATCH):
+    """Encode a throwaway batch so kernels, allocators and caches are primed."""
+    if batch_size <= 0:
+        return
+    start = time.time()
+    texts = [_WARMUP_TEXTS[i % len(_WARMUP_TEXTS)] for i in range(batch_size)]
+    model.encode(texts, return_dense=True, return_sparse=True, return_colbert_vecs=False)
+    logger.info(f"Model warmup ({batch_size} texts) in {(time.time() - start) * 1000:.0f}ms")
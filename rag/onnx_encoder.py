@@ -0,0 +1,283 @@
+"""
+BGE-M3 dense + lexical encoder on ONNX Runtime for CPU-only hosts.
+The exported graph folds the CLS pooling and the sparse (lexical weight) head
+into the model, so it returns exactly what FlagEmbedding's encode() derives
+from the transformer output, optionally with dynamic int8 weights.
+
+    python -m rag.onnx_encoder export            # one-off, needs torch + transformers
+    python -m rag.onnx_encoder parity            # compare against FlagEmbedding
+"""
+
+import os
+import sys
+import time
+import logging
+import argparse
+from typing import Dict, List
+
+import numpy as np
+
+from .constants import (
+    EMBEDDING_MODEL_NAME, ONNX_MODEL_DIR, ONNX_QUANTIZATION, ENCODER_THREADS,
+    ENCODER_BATCH_SIZE, ENCODER_MAX_LENGTH,
+)
+
+logger = logging.getLogger("rag.onnx")
+
+FP32_FILE = "model.onnx"
+INT8_FILE = "model_int8.onnx"
+
+# Minimum agreement with the reference encoder, per graph precision
+PARITY_TOLERANCES = {
+    "fp32": {"dense_cosine": 0.9999, "lexical_overlap": 0.99},
+    "int8": {"dense_cosine": 0.98, "lexical_overlap": 0.85},
+}
+
+_PARITY_TEXTS = [
+    "What are the opening hours on Saturday?",
+    "Appointments are two hours long with a one-hour break between them.",
+    "अपॉइंटमेंट कैसे बुक करें?",
+    "అపాయింట్‌మెంట్ ఎలా బుక్ చేయాలి?",
+    "Invoice No: 4471 | Total: 1,250.00 INR | Due: 2024-03-31",
+    "The knowledge base stores dense vectors in FAISS and lexical weights in an inverted index. " * 12,
+]
+
+
+class OnnxEncoder:
+    """Drop-in replacement for BGEM3FlagModel.encode() (dense + sparse) on ONNX Runtime."""
+
+    def __init__(self, model_dir: str = ONNX_MODEL_DIR, quantization: str = ONNX_QUANTIZATION,
+                 threads: int = ENCODER_THREADS, batch_size: int = ENCODER_BATCH_SIZE,
+                 max_length: int = ENCODER_MAX_LENGTH):
+        """
+        Args:
+            model_dir: Directory written by export()
+            quantization: "int8" for the quantized graph, otherwise fp32
+            threads: Intra-op threads (0 = ONNX Runtime default)
+            batch_size: Texts per inference call
+            max_length: Token truncation length
+        """
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        self.quantization = "int8" if quantization == "int8" else "fp32"
+        path = os.path.join(model_dir, INT8_FILE if self.quantization == "int8" else FP32_FILE)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"{path} not found - run `python -m rag.onnx_encoder export` first")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        # One graph, one request at a time: parallelism belongs inside the matmuls
+        options.inter_op_num_threads = 1
+        if threads > 0:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self._unused_tokens = {
+            self.tokenizer.cls_token_id, self.tokenizer.eos_token_id,
+            self.tokenizer.pad_token_id, self.tokenizer.unk_token_id,
+        }
+        logger.info(f"ONNX encoder loaded: {path} (threads={threads or 'default'})")
+
+    def encode(self, sentences, batch_size: int = None, max_length: int = None,
+               return_dense: bool = True, return_sparse: bool = False,
+               return_colbert_vecs: bool = False) -> Dict:
+        """Same arguments and output dict as BGEM3FlagModel.encode(); ColBERT vectors are not exported."""
+        if return_colbert_vecs:
+            raise NotImplementedError("ColBERT vectors are not available from the ONNX encoder")
+        single = isinstance(sentences, str)
+        if single:
+            sentences = [sentences]
+        batch_size = batch_size or self.batch_size
+        max_length = max_length or self.max_length
+
+        dense_parts, lexical = [], []
+        for start in range(0, len(sentences), batch_size):
+            tokens = self.tokenizer(
+                sentences[start:start + batch_size], padding=True, truncation=True,
+                max_length=max_length, return_tensors="np",
+            )
+            input_ids = tokens["input_ids"].astype("int64")
+            attention_mask = tokens["attention_mask"].astype("int64")
+            dense, token_weights = self.session.run(
+                None, {"input_ids": input_ids, "attention_mask": attention_mask})
+            dense_parts.append(dense)
+            if return_sparse:
+                for ids, weights in zip(input_ids, token_weights):
+                    lexical.append(self._lexical_weights(ids, weights))
+
+        dense_vecs = np.concatenate(dense_parts).astype("float32")
+        dense_vecs /= np.linalg.norm(dense_vecs, axis=1, keepdims=True).clip(min=1e-12)
+        output = {
+            "dense_vecs": (dense_vecs[0] if single else dense_vecs) if return_dense else None,
+            "lexical_weights": (lexical[0] if single else lexical) if return_sparse else None,
+            "colbert_vecs": None,
+        }
+        return output
+
+    def _lexical_weights(self, input_ids: np.ndarray, weights: np.ndarray) -> Dict[str, float]:
+        """Max weight per token id, skipping special tokens - mirrors FlagEmbedding."""
+        result = {}
+        for idx, w in zip(input_ids.tolist(), weights.tolist()):
+            if w <= 0 or idx in self._unused_tokens:
+                continue
+            key = str(idx)
+            if w > result.get(key, 0):
+                result[key] = w
+        return result
+
+
+def export(model_name: str = EMBEDDING_MODEL_NAME, out_dir: str = ONNX_MODEL_DIR,
+           quantize: bool = True, opset: int = 17):
+    """
+    Export BGE-M3 (backbone + CLS pooling + sparse head) to ONNX, and optionally an int8 copy.
+
+    Args:
+        model_name: Hugging Face id or local directory of the BGE-M3 checkpoint
+        out_dir: Where model.onnx, model_int8.onnx and the tokenizer are written
+        quantize: Also write a dynamically int8-quantized graph
+        opset: ONNX opset version
+    """
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    if os.path.isdir(model_name):
+        local_dir = model_name
+    else:
+        from huggingface_hub import snapshot_download
+        local_dir = snapshot_download(model_name, ignore_patterns=["onnx/*", "*.DS_Store", "imgs/*"])
+
+    class _Bgem3Head(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.backbone = AutoModel.from_pretrained(local_dir)
+            self.sparse_linear = torch.nn.Linear(self.backbone.config.hidden_size, 1)
+            self.sparse_linear.load_state_dict(
+                torch.load(os.path.join(local_dir, "sparse_linear.pt"), map_location="cpu"))
+
+        def forward(self, input_ids, attention_mask):
+            hidden = self.backbone(input_ids=input_ids, attention_mask=attention_mask).last_hidden_state
+            dense = hidden[:, 0]
+            token_weights = torch.relu(self.sparse_linear(hidden)).squeeze(-1)
+            return dense, token_weights
+
+    os.makedirs(out_dir, exist_ok=True)
+    start = time.time()
+    tokenizer = AutoTokenizer.from_pretrained(local_dir)
+    tokenizer.save_pretrained(out_dir)
+    model = _Bgem3Head().eval()
+    sample = tokenizer(["export sample", "a second, longer export sample"], padding=True, return_tensors="pt")
+    fp32_path = os.path.join(out_dir, FP32_FILE)
+    with torch.no_grad():
+        torch.onnx.export(
+            model, (sample["input_ids"], sample["attention_mask"]), fp32_path,
+            input_names=["input_ids", "attention_mask"],
+            output_names=["dense", "token_weights"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "attention_mask": {0: "batch", 1: "sequence"},
+                "dense": {0: "batch"},
+                "token_weights": {0: "batch", 1: "sequence"},
+            },
+            opset_version=opset,
+        )
+    logger.info(f"Exported {model_name} to {fp32_path} in {time.time() - start:.1f}s")
+
+    if quantize:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        int8_path = os.path.join(out_dir, INT8_FILE)
+        quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8, use_external_data_format=True)
+        logger.info(f"Wrote int8 graph {int8_path}")
+
+
+def _weighted_overlap(a: Dict[str, float], b: Dict[str, float]) -> float:
+    """Weighted Jaccard of two lexical weight dicts (1.0 = identical)."""
+    keys = set(a) | set(b)
+    if not keys:
+        return 1.0
+    lo = sum(min(float(a.get(k, 0)), float(b.get(k, 0))) for k in keys)
+    hi = sum(max(float(a.get(k, 0)), float(b.get(k, 0))) for k in keys)
+    return lo / hi if hi else 1.0
+
+
+def check_parity(reference, candidate, texts: List[str] = None, quantization: str = "fp32") -> Dict:
+    """
+    Compare a candidate encoder's dense + lexical outputs with the reference encoder.
+
+    Args:
+        reference: Encoder treated as ground truth (FlagEmbedding, fp32)
+        candidate: Encoder under test
+        texts: Inputs to compare on (defaults to a short multilingual set)
+        quantization: Picks the tolerance set from PARITY_TOLERANCES
+
+    Returns:
+        dict with min dense cosine, min lexical overlap, tolerances and "passed"
+    """
+    texts = texts or _PARITY_TEXTS
+    kwargs = dict(return_dense=True, return_sparse=True, return_colbert_vecs=False)
+    ref = reference.encode(texts, **kwargs)
+    out = candidate.encode(texts, **kwargs)
+
+    ref_dense = np.asarray(ref["dense_vecs"], dtype="float32")
+    out_dense = np.asarray(out["dense_vecs"], dtype="float32")
+    ref_dense /= np.linalg.norm(ref_dense, axis=1, keepdims=True)
+    out_dense /= np.linalg.norm(out_dense, axis=1, keepdims=True)
+    cosines = (ref_dense * out_dense).sum(axis=1)
+    overlaps = [_weighted_overlap(a, b) for a, b in zip(ref["lexical_weights"], out["lexical_weights"])]
+
+    tolerances = PARITY_TOLERANCES[quantization]
+    report = {
+        "texts": len(texts),
+        "dense_cosine": float(cosines.min()),
+        "lexical_overlap": float(min(overlaps)),
+        "tolerances": tolerances,
+    }
+    report["passed"] = (report["dense_cosine"] >= tolerances["dense_cosine"]
+                        and report["lexical_overlap"] >= tolerances["lexical_overlap"])
+    return report
+
+
+def _main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m rag.onnx_encoder", description=__doc__.split("\n\n")[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    exp = sub.add_parser("export", help="Export BGE-M3 to ONNX (+ int8)")
+    exp.add_argument("--model", default=EMBEDDING_MODEL_NAME)
+    exp.add_argument("--out", default=ONNX_MODEL_DIR)
+    exp.add_argument("--no-quantize", action="store_true")
+
+    par = sub.add_parser("parity", help="Check ONNX outputs against FlagEmbedding")
+    par.add_argument("--model", default=EMBEDDING_MODEL_NAME)
+    par.add_argument("--dir", default=ONNX_MODEL_DIR)
+    par.add_argument("--quantization", default=ONNX_QUANTIZATION, choices=["fp32", "int8"])
+    par.add_argument("--texts", help="File with one input text per line")
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
+
+    if args.command == "export":
+        export(args.model, args.out, quantize=not args.no_quantize)
+        return 0
+
+    from FlagEmbedding import BGEM3FlagModel
+    texts = None
+    if args.texts:
+        with open(args.texts, encoding="utf-8") as f:
+            texts = [line.strip() for line in f if line.strip()]
+    reference = BGEM3FlagModel(args.model, use_fp16=False)
+    candidate = OnnxEncoder(args.dir, quantization=args.quantization)
+    report = check_parity(reference, candidate, texts, quantization=candidate.quantization)
+
+    for name, encoder in (("reference", reference), ("onnx", candidate)):
+        start = time.time()
+        encoder.encode(texts or _PARITY_TEXTS, return_dense=True, return_sparse=True, return_colbert_vecs=False)
+        report[f"{name}_ms"] = round((time.time() - start) * 1000, 1)
+    print(report)
+    return 0 if report["passed"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(_main())
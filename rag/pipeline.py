@@ -0,0 +1,313 @@
+"""
+Streaming ingestion pipeline: extract -> chunk -> embed -> index.
+Each stage runs on its own thread and hands work to the next through a
+bounded queue, so extraction of later pages overlaps with embedding of
+earlier ones and only a few pages / batches are ever held in memory.
+"""
+
+import time
+import uuid
+import queue
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Executor, FIRST_COMPLETED, wait
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple
+
+from .constants import INGEST_BATCH_CHUNKS, INGEST_QUEUE_SIZE
+from .chunking import StreamingChunker
+
+logger = logging.getLogger("rag.pipeline")
+
+_DONE = object()
+
+
+class _Failure:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+def _threaded(iterable: Iterable, maxsize: int, name: str) -> Iterator:
+    """Run iterable on a background thread, handing items over through a bounded queue."""
+    handoff = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                handoff.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def run():
+        try:
+            for item in iterable:
+                if not put(item):
+                    return
+            put(_DONE)
+        except BaseException as e:
+            put(_Failure(e))
+        finally:
+            close = getattr(iterable, "close", None)
+            if close:
+                close()
+
+    threading.Thread(target=run, name=f"ingest-{name}", daemon=True).start()
+    try:
+        while True:
+            item = handoff.get()
+            if item is _DONE:
+                return
+            if isinstance(item, _Failure):
+                raise item.error
+            yield item
+    finally:
+        # Consumer finished or failed: unblock and retire the producer
+        stop.set()
+
+
+def ingest_pages(kb, pages: Iterable[Dict[str, Any]], source_name: str, doc_id: str = None,
+                 batch_chunks: int = INGEST_BATCH_CHUNKS, queue_size: int = INGEST_QUEUE_SIZE,
+                 progress: Callable[..., None] = None) -> Dict[str, Any]:
+    """
+    Stream a document into the knowledge base, replacing that document's previous version.
+
+    Chunks already indexed for doc_id with the same text are kept as they are; only
+    new or changed chunks are embedded. The previous version's leftover chunks are
+    dropped at the end, so a document that yields no text leaves the index untouched.
+    If extraction or encoding fails partway, the chunks added so far are removed
+    again and the previous version stays as it was.
+
+    Args:
+        kb: KnowledgeBase to index into
+        pages: Iterable of page dicts (as from ocr.iter_pages); only "text" is required
+        source_name: Category to index under
+        doc_id: Document id (generated if None); re-use one (see KnowledgeBase.document_id) to update
+        batch_chunks: Chunks embedded + indexed per batch
+        queue_size: Pages / batches buffered between stages
+        progress: Called with keyword counters (pages_extracted, chunks_created, chunks_reused,
+            chunks_embedded, vectors_indexed) as each stage advances
+
+    Returns:
+        dict with doc_id, chunks, chunks_reused, chunks_added, chunks_removed, chars, pages,
+        tables_found, key_value_pairs, file_type, ocr_pages
+    """
+    doc_id = doc_id or str(uuid.uuid4())
+    stats = {"doc_id": doc_id, "chunks": 0, "chars": 0, "pages": 0, "tables_found": 0,
+             "key_value_pairs": 0, "file_type": "", "ocr_pages": 0}
+    upsert = kb.begin_upsert(doc_id, source_name)
+    start = time.time()
+    report = progress or (lambda **counters: None)
+
+    def page_texts():
+        for page in pages:
+            text = page.get("text") or ""
+            stats["chars"] += len(text)
+            stats["pages"] = max(stats["pages"], page.get("pages") or 0, page.get("page") or 0)
+            stats["tables_found"] += len(page.get("tables") or ())
+            stats["key_value_pairs"] += len(page.get("key_value_pairs") or ())
+            stats["file_type"] = page.get("file_type") or stats["file_type"]
+            stats["ocr_pages"] += int(bool(page.get("ocr")))
+            if page.get("page"):
+                report(pages_extracted=page["page"], pages_total=stats["pages"])
+            yield text
+
+    def chunk_batches(texts):
+        chunker = StreamingChunker(kb.chunker(), kb._clean_text)
+        pending = []
+        for text in texts:
+            chunks = chunker.feed(text)
+            # Unchanged chunks are claimed here and never reach the encoder
+            pending.extend(upsert.new_chunks(chunks))
+            stats["chunks"] += len(chunks)
+            report(chunks_created=stats["chunks"], chunks_reused=upsert.kept)
+            while len(pending) >= batch_chunks:
+                yield pending[:batch_chunks]
+                pending = pending[batch_chunks:]
+        chunks = chunker.flush()
+        pending.extend(upsert.new_chunks(chunks))
+        stats["chunks"] += len(chunks)
+        report(chunks_created=stats["chunks"], chunks_reused=upsert.kept)
+        for i in range(0, len(pending), batch_chunks):
+            yield pending[i:i + batch_chunks]
+
+    try:
+        texts = _threaded(page_texts(), queue_size, "extract")
+        embedded = 0
+        for batch in _threaded(chunk_batches(texts), queue_size, "chunk"):
+            embeddings = kb.embed_chunks(batch)
+            embedded += len(batch)
+            report(chunks_embedded=embedded)
+            upsert.add(batch, embeddings=embeddings)
+            report(vectors_indexed=upsert.added)
+
+        if stats["chunks"]:
+            stats.update(upsert.finish())
+    finally:
+        upsert.release()
+    logger.info(f"Streamed doc_id={doc_id} into source='{source_name}': {stats['pages']} pages, "
+                f"{stats['chunks']} chunks ({upsert.kept} reused) in {(time.time() - start) * 1000:.0f}ms")
+    return stats
+
+
+def ingest_documents(kb, documents: Iterable[Tuple[str, Any, str]],
+                     extract: Callable[[Any, str], List[Dict[str, Any]]], executor: Executor = None,
+                     parallelism: int = 1, batch_chunks: int = INGEST_BATCH_CHUNKS,
+                     queue_size: int = INGEST_QUEUE_SIZE, progress: Callable[..., None] = None) -> Dict[str, Any]:
+    """
+    Index many documents at once: extraction fans out over a pool, chunks from
+    different documents share encoder batches, and the index is written in order.
+
+    Each document is upserted under KnowledgeBase.document_id(source_name, filename),
+    as single uploads are: unchanged chunks keep their vectors and only new ones are
+    embedded. Entries that map to the same doc_id are applied one after another, in
+    order, so the last one wins. A document that fails to extract is recorded in the
+    result and skipped.
+
+    Args:
+        kb: KnowledgeBase to index into
+        documents: Iterable of (filename, payload, source_name); payload is passed to extract
+        extract: extract(payload, filename) -> list of page dicts; must be picklable for process pools
+        executor: Pool extraction runs on (inline on a pipeline thread if None)
+        parallelism: Workers in executor; twice as many documents are kept in flight
+        batch_chunks: Chunks per encoder call, across document boundaries
+        queue_size: Chunked documents buffered ahead of the encoder
+        progress: Called with keyword counters (documents_extracted, documents_failed,
+            chunks_created, chunks_reused, chunks_embedded, vectors_indexed)
+
+    Returns:
+        dict with per-document results ("documents"), total "chunks" (of which "chunks_reused"
+        were already indexed and "chunks_added" embedded) and "failed" count
+    """
+    report = progress or (lambda **counters: None)
+    start = time.time()
+    results: List[Dict[str, Any]] = []
+    counters = {"documents_extracted": 0, "documents_failed": 0, "chunks_created": 0, "chunks_reused": 0}
+    upserts = {}  # id(doc) -> DocumentUpsert (holding the doc_id's lock) until its last new chunk is indexed
+
+    def chunked(filename, source_name, pages):
+        chunker = StreamingChunker(kb.chunker(), kb._clean_text)
+        chunks = []
+        for page in pages:
+            chunks.extend(chunker.feed(page.get("text") or ""))
+        chunks.extend(chunker.flush())
+        doc = {"filename": filename, "source": source_name, "doc_id": kb.document_id(source_name, filename),
+               "chunks": len(chunks), "pages": max([p.get("pages") or 0 for p in pages] or [0])}
+        results.append(doc)
+        counters["documents_extracted"] += 1
+        counters["chunks_created"] += len(chunks)
+        report(**counters)
+        return doc, chunks
+
+    def failed(filename, source_name, error):
+        logger.warning(f"Could not extract '{filename}': {error}")
+        results.append({"filename": filename, "source": source_name, "chunks": 0, "error": str(error)})
+        counters["documents_failed"] += 1
+        report(**counters)
+
+    def extracted_docs():
+        if executor is None:
+            for filename, payload, source_name in documents:
+                try:
+                    pages = extract(payload, filename)
+                except Exception as e:
+                    failed(filename, source_name, e)
+                    continue
+                yield chunked(filename, source_name, pages)
+            return
+
+        # Keep every worker busy; collect whichever document finishes first
+        in_flight = {}
+        todo = iter(documents)
+        max_in_flight = max(1, parallelism) * 2
+        exhausted = False
+        while True:
+            while not exhausted and len(in_flight) < max_in_flight:
+                item = next(todo, None)
+                if item is None:
+                    exhausted = True
+                    break
+                filename, payload, source_name = item
+                in_flight[executor.submit(extract, payload, filename)] = (filename, source_name)
+            if not in_flight:
+                return
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                filename, source_name = in_flight.pop(future)
+                try:
+                    pages = future.result()
+                except Exception as e:
+                    failed(filename, source_name, e)
+                    continue
+                yield chunked(filename, source_name, pages)
+
+    pending = deque()  # (doc, chunk) across documents, waiting for a full encoder batch
+    totals = {"chunks_embedded": 0, "vectors_indexed": 0}
+
+    def finish(doc):
+        doc.pop("remaining", None)
+        doc.update(upserts.pop(id(doc)).finish())
+
+    def flush(n):
+        batch = [pending.popleft() for _ in range(min(n, len(pending)))]
+        if not batch:
+            return
+        dense_vecs, lexical = kb.embed_chunks([chunk for _, chunk in batch])
+        totals["chunks_embedded"] += len(batch)
+        report(chunks_embedded=totals["chunks_embedded"])
+        # Index contiguous runs of the same document together
+        run_start = 0
+        for i in range(1, len(batch) + 1):
+            if i < len(batch) and batch[i][0] is batch[run_start][0]:
+                continue
+            doc = batch[run_start][0]
+            upserts[id(doc)].add([chunk for _, chunk in batch[run_start:i]],
+                                 embeddings=(dense_vecs[run_start:i], lexical[run_start:i]))
+            doc["remaining"] -= i - run_start
+            if not doc["remaining"]:
+                finish(doc)
+            run_start = i
+        totals["vectors_indexed"] += len(batch)
+        report(vectors_indexed=totals["vectors_indexed"])
+
+    def begin(doc, chunks):
+        """Start doc's upsert (on this thread, which also finishes upserts); returns the chunks to embed."""
+        upsert = kb.begin_upsert(doc["doc_id"], doc["source"], blocking=False)
+        if upsert is None:
+            # The same document is being upserted: by an earlier entry of this batch (e.g. two zip
+            # entries with one name) or by another job. Index everything pending first, so this
+            # thread holds no document locks while it waits, then apply this entry after it.
+            while pending:
+                flush(batch_chunks)
+            upsert = kb.begin_upsert(doc["doc_id"], doc["source"])
+        upserts[id(doc)] = upsert
+        new = upsert.new_chunks(chunks)
+        doc["remaining"] = len(new)
+        counters["chunks_reused"] += len(chunks) - len(new)
+        report(**counters)
+        return new
+
+    try:
+        for doc, chunks in _threaded(extracted_docs(), queue_size, "extract"):
+            if not chunks:
+                continue
+            chunks = begin(doc, chunks)
+            if not chunks:
+                finish(doc)  # unchanged re-upload: nothing to embed, only stale chunks to drop
+            pending.extend((doc, chunk) for chunk in chunks)
+            while len(pending) >= batch_chunks:
+                flush(batch_chunks)
+        while pending:
+            flush(batch_chunks)
+    finally:
+        for upsert in upserts.values():
+            upsert.release()
+
+    failed_count = counters["documents_failed"]
+    logger.info(f"Bulk ingested {len(results) - failed_count} documents ({failed_count} failed), "
+                f"{counters['chunks_created']} chunks ({counters['chunks_reused']} reused) "
+                f"in {time.time() - start:.1f}s")
+    return {"documents": results, "chunks": counters["chunks_created"], "chunks_reused": counters["chunks_reused"],
+            "chunks_added": totals["vectors_indexed"], "failed": failed_count}
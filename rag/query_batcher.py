@@ -0,0 +1,95 @@
+"""
+Dynamic micro-batching of query encodings.
+Concurrent searches hand their query text to a single worker thread, which
+waits a few milliseconds for company and encodes everything in one BGE-M3
+call, so per-call model overhead is paid once per batch instead of per query.
+"""
+
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, Tuple
+
+import numpy as np
+
+from .constants import QUERY_BATCH_MAX_SIZE, QUERY_BATCH_MAX_WAIT_MS
+
+logger = logging.getLogger("rag.batcher")
+
+
+class QueryBatcher:
+    """Collects concurrent encode requests and runs them as one model batch."""
+
+    def __init__(self, encode_fn: Callable, max_batch_size: int = QUERY_BATCH_MAX_SIZE,
+                 max_wait_ms: float = QUERY_BATCH_MAX_WAIT_MS):
+        """
+        Args:
+            encode_fn: Callable taking a list of texts and returning BGE-M3 style
+                {'dense_vecs': ..., 'lexical_weights': [...]} output
+            max_batch_size: Upper bound on texts per model call
+            max_wait_ms: How long the first request of a batch waits for others
+        """
+        self.encode_fn = encode_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._queue: "queue.Queue[Tuple[str, Future]]" = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self.batches = 0
+        self.queries = 0
+
+    def encode(self, text: str) -> Tuple[np.ndarray, Dict[str, float]]:
+        """Encode one query, blocking until its batch is done. Returns (dense, lexical_weights)."""
+        self._ensure_started()
+        future: Future = Future()
+        self._queue.put((text, future))
+        return future.result()
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="query-batcher", daemon=True)
+                self._thread.start()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            # Identical queries in one batch (common with retries / repeated voice turns) are encoded once
+            texts = list(dict.fromkeys(text for text, _ in batch))
+            try:
+                output = self.encode_fn(texts)
+            except Exception as e:
+                logger.error(f"Query batch encoding failed ({len(texts)} texts): {e}")
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            position = {text: i for i, text in enumerate(texts)}
+            for text, future in batch:
+                i = position[text]
+                future.set_result((np.asarray(output['dense_vecs'][i]), output['lexical_weights'][i]))
+            self.batches += 1
+            self.queries += len(batch)
+            if len(batch) > 1:
+                logger.debug(f"Encoded {len(batch)} queries ({len(texts)} unique) in one batch")
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "queries": self.queries,
+            "avg_batch_size": round(self.queries / self.batches, 2) if self.batches else 0.0,
+        }
@@ -0,0 +1,205 @@
+"""
+Versioned, immutable views of the KnowledgeBase for lock-free search.
+Writers change the chunk table and the sparse / dense indexes under the
+KnowledgeBase write lock, then publish a new Snapshot with one reference
+assignment. A search takes the current Snapshot once and reads only from it,
+so it never blocks on, or sees half of, an ingestion, delete or rebuild.
+
+FAISS can't be searched while it is written, so the dense side is layered:
+a base index that is never modified once published, an append-only buffer
+of vectors added since (searched exactly), and the ids deleted since. When
+the buffer fills up, the next base is built from a copy, off to the side.
+Until searches on the old base finish, both copies are in memory: a merge
+peaks at twice the FAISS index's size, so SNAPSHOT_DELTA_RATIO / _MAX trade
+that peak's frequency against the cost of searching a larger buffer exactly.
+"""
+
+import time
+import logging
+
+import numpy as np
+
+from .constants import SNAPSHOT_DELTA_MIN, SNAPSHOT_DELTA_MAX, SNAPSHOT_DELTA_RATIO
+from .dense_index import DenseIndex, IdSubset
+from .chunk_table import ChunkView
+from .sparse_index import SparseView
+
+logger = logging.getLogger("rag.snapshot")
+
+
+class DenseView:
+    """One version of the dense index: frozen base, plus buffered vectors, minus hidden ids."""
+
+    def __init__(self, base: DenseIndex, base_upto: int, subsets: dict,
+                 delta_ids: np.ndarray, delta_vecs: np.ndarray, hidden: np.ndarray):
+        """
+        Args:
+            base: FAISS-backed index holding every chunk id below base_upto; never modified
+            base_upto: First chunk id that is not in base
+            subsets: Per-source IdSubset cache shared by all views of the same base
+            delta_ids: Ids added since base was built, ascending
+            delta_vecs: Their normalized vectors
+            hidden: Sorted ids deleted since base was built (in base or in the buffer)
+        """
+        self.base = base
+        self.base_upto = base_upto
+        self.delta_ids = delta_ids
+        self.delta_vecs = delta_vecs
+        self.hidden = hidden
+        self.ntotal = base.ntotal + len(delta_ids) - len(hidden)
+        self._subsets = subsets
+        self._exclude = IdSubset(hidden) if len(hidden) else None
+        self._delta_live = ~np.isin(delta_ids, hidden) if len(hidden) and len(delta_ids) else None
+
+    def describe(self) -> str:
+        return self.base.describe()
+
+    def base_subset(self, source_name: str, chunks: ChunkView) -> IdSubset:
+        """Filter for the base ids of one source (chunks deleted later are hidden separately)."""
+        subset = self._subsets.get(source_name)
+        if subset is None:
+            ids = chunks.ids_for_source(source_name)
+            subset = IdSubset(ids[ids < self.base_upto])
+            self._subsets[source_name] = subset
+        return subset
+
+    def search(self, queries: np.ndarray, n: int, subset: IdSubset = None, delta_keep: np.ndarray = None):
+        """
+        Top-n ids by inner product over the base and the buffer.
+
+        Args:
+            queries: (nq, dim) normalized query vectors
+            n: Results per query
+            subset: Restricts the base search (see base_subset)
+            delta_keep: Boolean mask over delta_ids restricting the buffer search
+
+        Returns:
+            (scores, ids) arrays of shape (len(queries), n); missing slots are -1
+        """
+        D, I = self.base.search(queries, n, subset=subset, exclude=self._exclude)
+        keep = self._delta_live
+        if delta_keep is not None:
+            keep = delta_keep if keep is None else keep & delta_keep
+        ids, vecs = self.delta_ids, self.delta_vecs
+        if keep is not None:
+            ids, vecs = ids[keep], vecs[keep]
+        if not len(ids):
+            return D, I
+        scores = np.ascontiguousarray(queries, dtype="float32") @ vecs.T
+        all_scores = np.concatenate([np.where(I >= 0, D, -np.inf), scores], axis=1)
+        all_ids = np.concatenate([I, np.broadcast_to(ids, scores.shape)], axis=1)
+        top = np.argsort(-all_scores, axis=1)[:, :n]
+        D = np.take_along_axis(all_scores, top, axis=1).astype("float32")
+        I = np.take_along_axis(all_ids, top, axis=1)
+        I[np.isneginf(D)] = -1
+        return D, I
+
+    def reconstruct(self, ids) -> np.ndarray:
+        ids = np.asarray(ids, dtype="int64")
+        vectors = np.empty((len(ids), self.base.dim), dtype="float32")
+        buffered = ids >= self.base_upto
+        if buffered.any():
+            vectors[buffered] = self.delta_vecs[np.searchsorted(self.delta_ids, ids[buffered])]
+        if not buffered.all():
+            vectors[~buffered] = self.base.reconstruct(ids[~buffered])
+        return vectors
+
+
+class LayeredDenseIndex:
+    """Writer side of the dense index; writes must be serialized (KnowledgeBase.write_lock)."""
+
+    def __init__(self, base: DenseIndex):
+        self._base = base
+        self._base_upto = 0
+        self._upto = 0
+        self._subsets = {}
+        self._hidden = np.empty(0, dtype="int64")
+        self._new_buffer()
+
+    @property
+    def ntotal(self) -> int:
+        return self._base.ntotal + self._delta_n - len(self._hidden)
+
+    def describe(self) -> str:
+        return self._base.describe()
+
+    def _new_buffer(self):
+        # Fresh arrays every time: views still reference the previous buffer's rows
+        capacity = int(min(max(SNAPSHOT_DELTA_MIN, self._base.ntotal * SNAPSHOT_DELTA_RATIO), SNAPSHOT_DELTA_MAX))
+        self._delta_ids = np.empty(capacity, dtype="int64")
+        self._delta_vecs = np.empty((capacity, self._base.dim), dtype="float32")
+        self._delta_n = 0
+
+    def view(self) -> DenseView:
+        n = self._delta_n
+        return DenseView(self._base, self._base_upto, self._subsets,
+                         self._delta_ids[:n], self._delta_vecs[:n], self._hidden)
+
+    def add(self, ids, vectors: np.ndarray):
+        """Buffer new vectors (ids must be larger than any added before)."""
+        ids = np.asarray(ids, dtype="int64")
+        if not len(ids):
+            return
+        vectors = np.ascontiguousarray(vectors, dtype="float32")
+        if self._delta_n + len(ids) > len(self._delta_ids):
+            self._rebuild(ids, vectors)
+            return
+        # Rows past every published view's length, so nobody is reading them
+        end = self._delta_n + len(ids)
+        self._delta_ids[self._delta_n:end] = ids
+        self._delta_vecs[self._delta_n:end] = vectors
+        self._delta_n = end
+        self._upto = max(self._upto, int(ids.max()) + 1)
+
+    def remove(self, ids):
+        """Hide live ids; they leave the base at the next rebuild."""
+        self._hidden = np.union1d(self._hidden, np.asarray(ids, dtype="int64"))
+        if len(self._hidden) > len(self._delta_ids):
+            self._rebuild()
+
+    def reset(self):
+        base = self._base.copy(empty=True)
+        self.__init__(base)
+
+    def _rebuild(self, ids: np.ndarray = None, vectors: np.ndarray = None):
+        """
+        Fold the buffer and deletions into a copy of the base; the current base stays searchable.
+        The base can't be modified in place (published views may be searching it), so memory for the
+        FAISS index peaks at about twice its size until the copy is built and the old base released.
+        """
+        start = time.time()
+        n = self._delta_n
+        new_ids, new_vecs = self._delta_ids[:n], self._delta_vecs[:n]
+        if ids is not None:
+            new_ids, new_vecs = np.concatenate([new_ids, ids]), np.concatenate([new_vecs, vectors])
+        keep = ~np.isin(new_ids, self._hidden)
+        base = self._base.copy(empty=self._base.ntotal == 0)
+        base.remove(self._hidden[self._hidden < self._base_upto])
+        if keep.any():
+            base.add(new_ids[keep], new_vecs[keep])
+        if len(new_ids):
+            self._upto = max(self._upto, int(new_ids.max()) + 1)
+        self._base, self._base_upto = base, self._upto
+        self._subsets = {}
+        self._hidden = np.empty(0, dtype="int64")
+        self._new_buffer()
+        logger.info(f"Dense snapshot base rebuilt: {base.ntotal} vectors ({base.describe()}) "
+                    f"in {(time.time() - start) * 1000:.0f}ms; next merge after {len(self._delta_ids)} more")
+
+
+class Snapshot:
+    """Everything a search reads, frozen at one version of the knowledge base."""
+
+    def __init__(self, version: int, chunks: ChunkView, sparse: SparseView, dense: DenseView):
+        self.version = version
+        self.chunks = chunks
+        self.sparse = sparse
+        self.dense = dense
+
+    def dense_search(self, queries: np.ndarray, n: int, source_name: str = None):
+        """Dense top-n, restricted to one source inside the search if given."""
+        if not source_name:
+            return self.dense.search(queries, n)
+        subset = self.dense.base_subset(source_name, self.chunks)
+        keep = self.chunks.in_source(self.dense.delta_ids, source_name)
+        return self.dense.search(queries, n, subset=subset, delta_keep=keep)
@@ -0,0 +1,233 @@
+"""
+Lexical-weight index over BGE-M3 sparse outputs.
+Weights are held as SciPy sparse matrices (one row per chunk, one column per
+vocabulary token) in append-only segments: CSC gives the inverted index for
+corpus-wide retrieval, CSR scores a candidate set with one sparse mat-vec.
+Segments are merged in a binary-counter pattern, so adds stay cheap and a
+query touches O(log n) segments.
+
+Segments are never modified once built (a delete publishes a copy with a new
+alive mask), so a SparseView keeps answering from the segments it was given
+while the index changes.
+"""
+
+import logging
+from typing import Dict, List, Tuple
+
+import numpy as np
+import scipy.sparse as sp
+
+logger = logging.getLogger("rag.sparse")
+
+
+class _Segment:
+    """Immutable block of chunks' weights, rows ordered by chunk id."""
+
+    def __init__(self, ids: np.ndarray, csr: sp.csr_matrix, csc: sp.csc_matrix = None, alive: np.ndarray = None):
+        self.ids = ids  # row -> chunk id, ascending
+        self.csr = csr
+        self.csc = csr.tocsc() if csc is None else csc
+        self.alive = np.ones(len(ids), dtype=bool) if alive is None else alive
+        self.dead = int(len(ids) - self.alive.sum())
+
+    def rows(self, chunk_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """(found mask over chunk_ids, rows of the found ones); deleted rows count as not found."""
+        pos = np.minimum(np.searchsorted(self.ids, chunk_ids), len(self.ids) - 1)
+        found = (self.ids[pos] == chunk_ids) & self.alive[pos]
+        return found, pos[found]
+
+    def without(self, rows: np.ndarray) -> "_Segment":
+        alive = self.alive.copy()
+        alive[rows] = False
+        return _Segment(self.ids, self.csr, self.csc, alive)
+
+    def live_matrix(self) -> Tuple[np.ndarray, sp.csr_matrix]:
+        if not self.dead:
+            return self.ids, self.csr
+        return self.ids[self.alive], self.csr[self.alive]
+
+
+class SparseView:
+    """Read-only lexical scoring over one version of a SparseIndex."""
+
+    def __init__(self, index: "SparseView" = None):
+        if index is None:
+            # Append-only, so views can share them
+            self._vocab: Dict[str, int] = {}  # token id (as str) -> column
+            self._tokens: List[str] = []  # column -> token id
+            self._segments: Tuple[_Segment, ...] = ()  # oldest (largest) first
+            self._count = 0
+            return
+        self._vocab, self._tokens = index._vocab, index._tokens
+        self._segments, self._count = index._segments, index._count
+
+    def __len__(self) -> int:
+        return self._count
+
+    def nbytes(self) -> int:
+        """Memory held by the weight matrices."""
+        return sum(m.data.nbytes + m.indices.nbytes + m.indptr.nbytes
+                   for seg in self._segments for m in (seg.csr, seg.csc))
+
+    def _query(self, query_weights: Dict[str, float]) -> Tuple[np.ndarray, np.ndarray]:
+        """Query as (columns, weights) over the known vocabulary."""
+        cols, vals = [], []
+        for token, weight in query_weights.items():
+            col = self._vocab.get(str(token))
+            if col is not None:
+                cols.append(col)
+                vals.append(float(weight))
+        return np.asarray(cols, dtype="int64"), np.asarray(vals, dtype="float32")
+
+    def weights(self, chunk_id: int) -> Dict[str, float]:
+        """{token_id: weight} of a chunk (empty if it has none)."""
+        ids = np.array([chunk_id], dtype="int64")
+        for seg in self._segments:
+            found, rows = seg.rows(ids)
+            if found[0]:
+                row = seg.csr[int(rows[0])]
+                return {self._tokens[col]: float(val) for col, val in zip(row.indices.tolist(), row.data.tolist())}
+        return {}
+
+    def score(self, chunk_ids, query_weights: Dict[str, float]) -> np.ndarray:
+        """Lexical score of each given chunk against the query (0 for chunks without weights)."""
+        ids = np.asarray(chunk_ids, dtype="int64")
+        scores = np.zeros(len(ids), dtype="float32")
+        cols, q = self._query(query_weights)
+        if not cols.size or not ids.size:
+            return scores
+        for seg in self._segments:
+            found, rows = seg.rows(ids)
+            if not rows.size:
+                continue
+            in_seg = cols < seg.csr.shape[1]
+            scores[found] = seg.csr[rows][:, cols[in_seg]] @ q[in_seg]
+        return scores
+
+    def score_all(self, query_weights: Dict[str, float]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Lexical score of every chunk sharing at least one token with the query.
+
+        Returns:
+            (chunk_ids, scores) arrays; chunks not returned score 0
+        """
+        cols, q = self._query(query_weights)
+        id_parts, score_parts = [], []
+        for seg in self._segments if cols.size else ():
+            in_seg = cols < seg.csc.shape[1]
+            if not in_seg.any():
+                continue
+            # Columns of the query tokens are their posting lists: gather them straight from indptr
+            starts = seg.csc.indptr[cols[in_seg]]
+            lengths = seg.csc.indptr[cols[in_seg] + 1] - starts
+            positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+            rows = seg.csc.indices[positions]
+            contrib = seg.csc.data[positions] * np.repeat(q[in_seg], lengths)
+            if seg.dead:
+                live = seg.alive[rows]
+                rows, contrib = rows[live], contrib[live]
+            id_parts.append(seg.ids[rows])
+            score_parts.append(contrib)
+        if not id_parts:
+            return np.empty(0, dtype="int64"), np.empty(0, dtype="float32")
+        chunk_ids, inverse = np.unique(np.concatenate(id_parts), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(score_parts)).astype("float32")
+        return chunk_ids, scores
+
+    def search(self, query_weights: Dict[str, float], n: int) -> List[Tuple[int, float]]:
+        """Top-n chunks by lexical score, highest first."""
+        chunk_ids, scores = self.score_all(query_weights)
+        return top_n(chunk_ids, scores, n)
+
+
+class SparseIndex(SparseView):
+    """Chunk lexical weights as CSR/CSC matrices; writes must be serialized (KnowledgeBase.write_lock)."""
+
+    def view(self) -> SparseView:
+        """Read-only view of the current contents, unaffected by later writes."""
+        return SparseView(self)
+
+    def add(self, chunk_id: int, weights: Dict[str, float]):
+        self.add_batch([chunk_id], [weights])
+
+    def add_batch(self, chunk_ids, weights_list):
+        """Add one weight dict ({token_id: weight}) per chunk as a new segment."""
+        ids = np.asarray(chunk_ids, dtype="int64")
+        if not ids.size:
+            return
+        self.remove_batch(ids)
+        indptr = np.zeros(len(ids) + 1, dtype="int64")
+        cols, vals = [], []
+        for i, weights in enumerate(weights_list):
+            for token, weight in weights.items():
+                token = str(token)
+                col = self._vocab.get(token)
+                if col is None:
+                    col = len(self._tokens)
+                    self._tokens.append(token)
+                    self._vocab[token] = col
+                cols.append(col)
+                vals.append(float(weight))
+            indptr[i + 1] = len(cols)
+        matrix = sp.csr_matrix((np.asarray(vals, dtype="float32"), np.asarray(cols, dtype="int32"), indptr),
+                               shape=(len(ids), len(self._tokens)))
+        matrix.sum_duplicates()
+        segments = list(self._segments) + [_sorted_segment(ids, matrix)]
+        # Merge while the newest segment is at least as large as the one before it
+        while len(segments) > 1 and len(segments[-1].ids) >= len(segments[-2].ids):
+            newer, older = segments.pop(), segments.pop()
+            segments.append(self._merge(older, newer))
+        self._segments = tuple(segments)
+        self._count += len(ids)
+
+    def remove(self, chunk_id: int):
+        self.remove_batch([chunk_id])
+
+    def remove_batch(self, chunk_ids):
+        ids = np.unique(np.asarray(chunk_ids, dtype="int64"))
+        if not ids.size:
+            return
+        segments, removed = [], 0
+        for seg in self._segments:
+            _, rows = seg.rows(ids)
+            if rows.size:
+                removed += len(rows)
+                seg = seg.without(rows)
+            if seg.dead < len(seg.ids):
+                segments.append(seg)
+        if removed:
+            self._segments = tuple(segments)
+            self._count -= removed
+
+    def clear(self):
+        self.__init__()
+
+    def _merge(self, older: _Segment, newer: _Segment) -> _Segment:
+        """One segment holding both segments' live rows (deleted rows are dropped here)."""
+        parts = [seg.live_matrix() for seg in (older, newer)]
+        width = len(self._tokens)
+        matrix = sp.vstack([m if m.shape[1] == width else _widened(m, width) for _, m in parts], format="csr")
+        return _sorted_segment(np.concatenate([ids for ids, _ in parts]), matrix)
+
+
+def _sorted_segment(ids: np.ndarray, matrix: sp.csr_matrix) -> _Segment:
+    if len(ids) > 1 and np.any(ids[1:] < ids[:-1]):
+        order = np.argsort(ids, kind="stable")
+        ids, matrix = ids[order], matrix[order]
+    return _Segment(ids, matrix)
+
+
+def _widened(matrix: sp.csr_matrix, width: int) -> sp.csr_matrix:
+    """Same rows with extra (empty) vocabulary columns."""
+    return sp.csr_matrix((matrix.data, matrix.indices, matrix.indptr), shape=(matrix.shape[0], width))
+
+
+def top_n(chunk_ids: np.ndarray, scores: np.ndarray, n: int) -> List[Tuple[int, float]]:
+    if len(chunk_ids) == 0 or n <= 0:
+        return []
+    if len(chunk_ids) > n:
+        part = np.argpartition(-scores, n - 1)[:n]
+    else:
+        part = np.arange(len(chunk_ids))
+    order = part[np.argsort(-scores[part])]
+    return [(int(chunk_ids[i]), float(scores[i])) for i in order]
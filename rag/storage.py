@@ -0,0 +1,254 @@
+"""
+On-disk persistence for the KnowledgeBase.
+Dense vectors go to a flat float32 file, chunk metadata + lexical weights
+to an append-only JSONL log. Between compactions both files are only ever
+appended to, so a crash mid-write loses at most the last batch, and startup
+never calls the encoder.
+"""
+
+import os
+import json
+import logging
+import threading
+from typing import Dict, Any, List, Tuple
+
+import numpy as np
+
+from .constants import EMBEDDING_DIMENSIONS, COMPACT_DEAD_RATIO, COMPACT_MIN_DEAD
+
+logger = logging.getLogger("rag.storage")
+
+MANIFEST_FILE = "manifest.json"
+
+
+class KnowledgeBaseStore:
+    """Append-only vector file + chunk log living in a data directory."""
+
+    def __init__(self, data_dir: str, dim: int = EMBEDDING_DIMENSIONS):
+        """
+        Args:
+            data_dir: Directory for the vector file and chunk log (created if missing)
+            dim: Dense vector dimensionality
+        """
+        self.data_dir = data_dir
+        self.dim = dim
+        self._lock = threading.Lock()
+        self._rows = 0  # rows written to the vector file
+        self._dead = 0  # rows whose chunk has since been deleted
+        self._row_of: Dict[int, int] = {}  # live chunk id -> row in the vector file
+        self._mmap = None
+        os.makedirs(data_dir, exist_ok=True)
+        self._generation = self._read_manifest()
+
+    # Compaction writes a new generation of files and then flips the manifest,
+    # so a crash at any point leaves one complete, consistent generation.
+
+    @property
+    def vectors_path(self) -> str:
+        return os.path.join(self.data_dir, f"vectors-{self._generation}.f32")
+
+    @property
+    def log_path(self) -> str:
+        return os.path.join(self.data_dir, f"chunks-{self._generation}.jsonl")
+
+    def _read_manifest(self) -> int:
+        path = os.path.join(self.data_dir, MANIFEST_FILE)
+        if not os.path.exists(path):
+            return 0
+        with open(path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("dim", self.dim) != self.dim:
+            raise ValueError(f"Stored vectors are {manifest['dim']}-d, expected {self.dim}-d")
+        return int(manifest.get("generation", 0))
+
+    def _write_manifest(self, generation: int):
+        path = os.path.join(self.data_dir, MANIFEST_FILE)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"generation": generation, "dim": self.dim}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    # --- Loading ---
+
+    def load(self) -> Tuple[np.ndarray, np.ndarray, List[Dict[str, Any]]]:
+        """
+        Replay the chunk log and memory-map the vector file.
+
+        Returns:
+            (ids, vectors, records) for every live chunk, where vectors[i]
+            belongs to ids[i] and records[i] holds text/source/doc_id/sparse.
+        """
+        live: Dict[int, Dict[str, Any]] = {}
+        if os.path.exists(self.log_path):
+            with open(self.log_path, "r+b") as f:
+                good = 0  # end of the last complete entry
+                for line_no, line in enumerate(f, 1):
+                    try:
+                        entry = json.loads(line) if line.endswith(b"\n") and line.strip() else None
+                    except (json.JSONDecodeError, UnicodeDecodeError):
+                        entry = None
+                    if entry is None:
+                        if not line.strip():
+                            good += len(line)
+                            continue
+                        # A torn final write from a crash; everything before it is intact. Cut it off,
+                        # or the next append would be glued onto it and lost at the following load
+                        logger.warning(f"Dropping unreadable log entry at line {line_no}")
+                        f.truncate(good)
+                        break
+                    good += len(line)
+                    op = entry.get("op")
+                    if op == "add":
+                        live[entry["id"]] = entry
+                    elif op == "delete":
+                        for chunk_id in entry["ids"]:
+                            live.pop(chunk_id, None)
+
+        vectors = self._open_vectors()
+        self._rows = vectors.shape[0]
+        # Drop log entries whose vector row never made it to disk
+        records = [r for r in live.values() if r["row"] < self._rows]
+        records.sort(key=lambda r: r["id"])
+        self._dead = self._rows - len(records)
+
+        if not records:
+            return np.empty(0, dtype="int64"), np.empty((0, self.dim), dtype="float32"), []
+
+        ids = np.array([r["id"] for r in records], dtype="int64")
+        rows = np.array([r["row"] for r in records], dtype="int64")
+        self._row_of = dict(zip(ids.tolist(), rows.tolist()))
+        logger.info(f"Loaded {len(records)} chunks from {self.data_dir} ({self._dead} dead rows)")
+        return ids, vectors[rows], records
+
+    def _open_vectors(self) -> np.ndarray:
+        if not os.path.exists(self.vectors_path):
+            return np.empty((0, self.dim), dtype="float32")
+        size = os.path.getsize(self.vectors_path)
+        row_bytes = self.dim * 4
+        n_rows = size // row_bytes
+        if n_rows == 0:
+            return np.empty((0, self.dim), dtype="float32")
+        return np.memmap(self.vectors_path, dtype="float32", mode="r", shape=(n_rows, self.dim))
+
+    def vectors(self, ids) -> np.ndarray:
+        """Full-precision vectors for live chunk ids, read through a memory map of the vector file."""
+        with self._lock:
+            rows = np.array([self._row_of[int(i)] for i in ids], dtype="int64")
+            if self._mmap is None or self._mmap.shape[0] < self._rows:
+                self._mmap = self._open_vectors()
+            mmap = self._mmap
+        if len(rows) == 0:
+            return np.empty((0, self.dim), dtype="float32")
+        return np.asarray(mmap[rows], dtype="float32")
+
+    # --- Writing ---
+
+    def append(self, ids, vectors: np.ndarray, records: List[Dict[str, Any]]):
+        """
+        Persist a batch of new chunks.
+
+        Args:
+            ids: Chunk ids, one per vector
+            vectors: (n, dim) float32 normalized dense vectors
+            records: Dicts with text, source, doc_id and sparse weights
+        """
+        vectors = np.ascontiguousarray(vectors, dtype="float32")
+        with self._lock:
+            start_row = self._truncate_torn_vectors()
+            with open(self.vectors_path, "ab") as f:
+                f.write(vectors.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            # The log line is the commit point for the batch
+            self._write_log([_add_entry(chunk_id, start_row + i, rec)
+                             for i, (chunk_id, rec) in enumerate(zip(ids, records))])
+            self._rows = start_row + len(records)
+            for i, chunk_id in enumerate(ids):
+                self._row_of[int(chunk_id)] = start_row + i
+
+    def delete(self, ids):
+        """Record a deletion; rows are reclaimed by the next compaction."""
+        ids = [int(i) for i in ids]
+        if not ids:
+            return
+        with self._lock:
+            self._write_log([json.dumps({"op": "delete", "ids": ids})])
+            self._dead += len(ids)
+            for chunk_id in ids:
+                self._row_of.pop(chunk_id, None)
+
+    def clear(self):
+        """Drop everything on disk."""
+        with self._lock:
+            for path in (self.vectors_path, self.log_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            self._rows = 0
+            self._dead = 0
+            self._row_of = {}
+            self._mmap = None
+
+    def needs_compaction(self) -> bool:
+        return self._dead >= COMPACT_MIN_DEAD and self._dead >= self._rows * COMPACT_DEAD_RATIO
+
+    def compact(self, ids, vectors: np.ndarray, records: List[Dict[str, Any]]):
+        """Rewrite the live chunks into a fresh generation and retire the old files."""
+        vectors = np.ascontiguousarray(vectors, dtype="float32")
+        with self._lock:
+            old_paths = (self.vectors_path, self.log_path)
+            before = self._rows
+            self._generation += 1
+            with open(self.vectors_path, "wb") as f:
+                f.write(vectors.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            with open(self.log_path, "w", encoding="utf-8") as f:
+                for row, (chunk_id, rec) in enumerate(zip(ids, records)):
+                    f.write(_add_entry(chunk_id, row, rec) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._write_manifest(self._generation)
+            for path in old_paths:
+                if os.path.exists(path):
+                    os.remove(path)
+            self._rows = len(records)
+            self._dead = 0
+            self._row_of = {int(chunk_id): row for row, chunk_id in enumerate(ids)}
+            self._mmap = None
+        logger.info(f"Compacted {self.data_dir}: {before} -> {self._rows} rows")
+
+    def _write_log(self, lines: List[str]):
+        with open(self.log_path, "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _truncate_torn_vectors(self) -> int:
+        """Cut a partially written trailing row so appends stay row-aligned."""
+        if not os.path.exists(self.vectors_path):
+            return 0
+        row_bytes = self.dim * 4
+        size = os.path.getsize(self.vectors_path)
+        if size % row_bytes:
+            with open(self.vectors_path, "r+b") as f:
+                f.truncate(size - size % row_bytes)
+        return size // row_bytes
+
+
+def _add_entry(chunk_id, row: int, rec: Dict[str, Any]) -> str:
+    return json.dumps({
+        "op": "add",
+        "id": int(chunk_id),
+        "row": row,
+        "text": rec["text"],
+        "source": rec["source"],
+        "doc_id": rec["doc_id"],
+        "sparse": _sparse_to_json(rec.get("sparse", {})),
+    }, ensure_ascii=False)
+
+
+def _sparse_to_json(weights) -> Dict[str, float]:
+    """BGE-M3 lexical weights are {token_id: np.float} - make them JSON-safe."""
+    return {str(k): float(v) for k, v in weights.items()}
@@ -0,0 +1,90 @@
+"""
+Per-document upsert: diff a document's new chunks against the chunks already
+indexed for it, so only new or changed chunks are embedded and unchanged ones
+keep their vectors and ids.
+"""
+
+import logging
+from typing import Dict, List
+
+logger = logging.getLogger("rag.upsert")
+
+
+class DocumentUpsert:
+    """
+    One in-progress re-index of a document; created by KnowledgeBase.begin_upsert(),
+    which locks the document until finish() or release(). Chunks added before a
+    failure are taken out again by release(), leaving the previous version whole.
+    """
+
+    def __init__(self, kb, doc_id: str, source_name: str, existing: Dict[str, List[int]], stale: List[int]):
+        """
+        Args:
+            kb: KnowledgeBase being written
+            doc_id: Document being (re)indexed
+            source_name: Category the document belongs to
+            existing: Chunk text -> ids already indexed for the document
+            stale: Ids of the document that can't be reused (e.g. filed under another category)
+        """
+        self.kb = kb
+        self.doc_id = doc_id
+        self.source_name = source_name
+        self._existing = existing
+        self._stale = stale
+        self.kept = 0
+        self.added = 0
+        self.removed = 0
+        self._added_ids: List[int] = []  # rolled back if the upsert is released unfinished
+        self._locked = True
+
+    def new_chunks(self, chunks: List[str]) -> List[str]:
+        """Claim chunks that are already indexed unchanged; returns the ones that need embedding."""
+        new = []
+        for chunk in chunks:
+            ids = self._existing.get(chunk)
+            if ids:
+                ids.pop()
+                if not ids:
+                    del self._existing[chunk]
+                self.kept += 1
+            else:
+                new.append(chunk)
+        return new
+
+    def add(self, chunks: List[str], embeddings=None):
+        """Index chunks returned by new_chunks(), optionally with precomputed embeddings."""
+        if chunks:
+            ids = self.kb.add_documents(chunks, source_name=self.source_name, doc_id=self.doc_id,
+                                        embeddings=embeddings)
+            self._added_ids.extend(ids.tolist())
+            self.added += len(chunks)
+
+    def finish(self) -> Dict[str, int]:
+        """Remove the previous version's chunks that were not claimed, and unlock the document."""
+        try:
+            unclaimed = [chunk_id for ids in self._existing.values() for chunk_id in ids] + self._stale
+            self._existing, self._stale = {}, []
+            if unclaimed:
+                self.removed += self.kb._remove_ids(unclaimed)
+            self._added_ids = []
+        finally:
+            self.release()
+        logger.info(f"Upserted doc_id={self.doc_id}: {self.kept} chunks kept, {self.added} added, "
+                    f"{self.removed} removed")
+        return {"chunks_reused": self.kept, "chunks_added": self.added, "chunks_removed": self.removed}
+
+    def release(self):
+        """
+        Abandon the upsert if it did not finish: remove the chunks it added, so searches
+        see only the previous version again, and unlock the document. No-op once released.
+        """
+        if not self._locked:
+            return
+        try:
+            if self._added_ids:
+                rolled_back = self.kb._remove_ids(self._added_ids)
+                logger.warning(f"Upsert of doc_id={self.doc_id} abandoned: {rolled_back} added chunks removed")
+                self._added_ids = []
+        finally:
+            self._locked = False
+            self.kb._unlock_doc(self.doc_id)
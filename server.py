@@ -1,25 +1,29 @@
+import io
 import os
 import time
+import asyncio
+import zipfile
 import json
 import uuid
-import faiss
-import numpy as np
 import uvicorn
 from fastapi import FastAPI, UploadFile, File, Form
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
+from typing import List
 from dotenv import load_dotenv
 from mcp.server.fastmcp import FastMCP
-from google import genai
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-from livekit import api
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from agent_personas import list_personas, get_persona, DEFAULT_PERSONA_ID
-from FlagEmbedding import BGEM3FlagModel
-from ocr import process_file as ocr_process_file
+from ocr import process_file as ocr_process_file, iter_pages as ocr_iter_pages, extract_pages as ocr_extract_pages
+from ocr import UPLOAD_EXTENSIONS
 import logging
 from datetime import datetime, timedelta, timezone
-from calendar_integration import get_appointment_manager
+from contextlib import asynccontextmanager
+from startup import Startup
+import executors
+from executors import run_search, run_maintenance, run_ocr, run_ocr_pages
+from jobs import JobQueue, Job, JobFailed, QueueFull, TERMINAL as JOB_TERMINAL
 import warnings
 
 # Suppress the legacy cryptography warning from pypdf/other libs
@@ -28,10 +32,23 @@ warnings.filterwarnings("ignore", message=".*ARC4.*")
 
 # Configure Loggers
 logger = logging.getLogger("server")
-rag_logger = logging.getLogger("rag")
+
+# Heavy components (FAISS index, BGE-M3, Gemini client) load in the background
+# so the server accepts connections immediately; /readyz gates traffic on them.
+startup = Startup()
+startup.register("index")
+startup.register("model")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    startup.start("index", _load_index)
+    startup.start("model", _load_model)
+    startup.start("gemini", _load_gemini)
+    yield
+    executors.shutdown()
 
 # Setup FastAPI + MCP
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 mcp = FastMCP("Vector RAG")
 
 # CORS for local development
@@ -46,222 +63,54 @@ app.add_middleware(
 load_dotenv()
 
 # Configuration
-# BGE-M3 Multilingual Embedding Model (dense + sparse + colbert hybrid)
-embedding_model = BGEM3FlagModel("BAAI/bge-m3", use_fp16=True)
-EMBEDDING_DIMENSIONS = 1024
-CHUNK_SIZE = 1000
-CHUNK_OVERLAP = 200
 GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash-lite")
 CHAT_MODEL = os.getenv("CHAT_MODEL", GEMINI_MODEL)
 
 google_client = None
-if os.getenv("GOOGLE_API_KEY"):
-    google_client = genai.Client(api_key=os.getenv("GOOGLE_API_KEY"))
 
 # OCR supported extensions
 OCR_EXTENSIONS = {".png", ".jpg", ".jpeg", ".tiff", ".tif", ".bmp", ".webp", ".docx", ".doc"}
-ALL_UPLOAD_EXTENSIONS = {".pdf", ".txt", ".md", ".py", ".json"} | OCR_EXTENSIONS
-
-
-class KnowledgeBase:
-    """BGE-M3 hybrid (dense+sparse+colbert) vector knowledge base for RAG."""
-
-    def __init__(self):
-        self.metadata = []  # list of {text, source, doc_id}
-        self.index = faiss.IndexFlatIP(EMBEDDING_DIMENSIONS)
-        # Store raw chunk texts + sparse/colbert outputs for hybrid scoring
-        self.chunk_texts = []
-        self.sparse_outputs = []  # token_weights dicts per chunk
-        rag_logger.info("KnowledgeBase initialised (BGE-M3 hybrid, backend=faiss)")
-
-    def _clean_text(self, text: str) -> str:
-        if not text: return ""
-        import re
-        return re.sub(r'\s+', ' ', text).strip()
-
-    def _get_chunks(self, text: str):
-        chunks = []
-        start = 0
-        text_len = len(text)
-        while start < text_len:
-            end = min(start + CHUNK_SIZE, text_len)
-            if end < text_len:
-                last_space = text.rfind(' ', start, end)
-                if last_space != -1 and last_space > start + (CHUNK_SIZE // 2):
-                    end = last_space
-            chunk = text[start:end].strip()
-            if len(chunk) > 30:
-                chunks.append(chunk)
-            start = end - CHUNK_OVERLAP
-            if start < 0: start = 0
-            if end >= text_len: break
-        return chunks
-
-    def _encode(self, texts):
-        """Encode texts using BGE-M3 with dense + sparse + colbert."""
-        return embedding_model.encode(
-            texts,
-            return_dense=True,
-            return_sparse=True,
-            return_colbert_vecs=False,
-        )
 
-    def build_index(self, text: str, source_name: str, doc_id: str = None) -> str:
-        if doc_id is None:
-            doc_id = str(uuid.uuid4())
-        self.clear_by_source(source_name)
-        clean_text = self._clean_text(text)
-        chunks = self._get_chunks(clean_text)
-        self.add_documents(chunks, source_name=source_name, doc_id=doc_id)
-        return doc_id
-
-    def add_documents(self, chunks, source_name: str, doc_id: str = None):
-        if not chunks:
-            rag_logger.warning(f"No chunks to add for source: {source_name}")
-            return
-        if doc_id is None:
-            doc_id = str(uuid.uuid4())
-
-        rag_logger.info(f"[BGE-M3] Adding {len(chunks)} chunks — doc_id={doc_id} source='{source_name}'")
-        add_start = time.time()
-
-        output = self._encode(chunks)
-        dense_vecs = np.array(output['dense_vecs']).astype('float32')
-        faiss.normalize_L2(dense_vecs)
-        rag_logger.info(f"Embeddings generated in {(time.time()-add_start)*1000:.2f}ms")
-
-        self.index.add(dense_vecs)
-        for i, chunk in enumerate(chunks):
-            self.metadata.append({"text": chunk, "source": source_name, "doc_id": doc_id})
-            self.chunk_texts.append(chunk)
-            self.sparse_outputs.append(output['lexical_weights'][i])
-        rag_logger.info(f"FAISS index size: {self.index.ntotal} vectors")
-        rag_logger.info(f"add_documents done in {(time.time()-add_start)*1000:.2f}ms")
-
-    def clear_by_source(self, source_name: str):
-        """Remove all chunks for a given source and rebuild index."""
-        old_count = len(self.metadata)
-        keep = [(m, t, s) for m, t, s in zip(self.metadata, self.chunk_texts, self.sparse_outputs)
-                if m.get("source") != source_name]
-        if len(keep) == old_count:
-            return
-        if keep:
-            self.metadata, self.chunk_texts, self.sparse_outputs = zip(*keep)
-            self.metadata = list(self.metadata)
-            self.chunk_texts = list(self.chunk_texts)
-            self.sparse_outputs = list(self.sparse_outputs)
-            # Rebuild FAISS index
-            output = self._encode(self.chunk_texts)
-            vecs = np.array(output['dense_vecs']).astype('float32')
-            faiss.normalize_L2(vecs)
-            self.index = faiss.IndexFlatIP(EMBEDDING_DIMENSIONS)
-            self.index.add(vecs)
-        else:
-            self.metadata = []
-            self.chunk_texts = []
-            self.sparse_outputs = []
-            self.index = faiss.IndexFlatIP(EMBEDDING_DIMENSIONS)
-        rag_logger.info(f"Cleared source='{source_name}', {old_count - len(self.metadata)} chunks removed")
-
-    def clear(self, doc_id: str = None):
-        if doc_id:
-            keep = [(m, t, s) for m, t, s in zip(self.metadata, self.chunk_texts, self.sparse_outputs)
-                    if m.get("doc_id") != doc_id]
-            if keep:
-                self.metadata, self.chunk_texts, self.sparse_outputs = zip(*keep)
-                self.metadata = list(self.metadata)
-                self.chunk_texts = list(self.chunk_texts)
-                self.sparse_outputs = list(self.sparse_outputs)
-                output = self._encode(self.chunk_texts)
-                vecs = np.array(output['dense_vecs']).astype('float32')
-                faiss.normalize_L2(vecs)
-                self.index = faiss.IndexFlatIP(EMBEDDING_DIMENSIONS)
-                self.index.add(vecs)
-            else:
-                self.metadata = []
-                self.chunk_texts = []
-                self.sparse_outputs = []
-                self.index = faiss.IndexFlatIP(EMBEDDING_DIMENSIONS)
-            rag_logger.info(f"FAISS: removed doc_id={doc_id}, {len(self.metadata)} chunks remain")
-        else:
-            self.metadata = []
-            self.chunk_texts = []
-            self.sparse_outputs = []
-            self.index = faiss.IndexFlatIP(EMBEDDING_DIMENSIONS)
-            rag_logger.info("FAISS index cleared")
-
-    def list_documents(self):
-        """Returns list of {source_name, chunk_count} grouped by category."""
-        docs = {}
-        for m in self.metadata:
-            sn = m.get("source", "unknown")
-            if sn not in docs:
-                docs[sn] = {"source_name": sn, "chunk_count": 0}
-            docs[sn]["chunk_count"] += 1
-        return list(docs.values())
-
-    def _compute_lexical_score(self, query_weights, doc_weights):
-        """Compute sparse lexical matching score between query and doc."""
-        score = 0.0
-        for token_id, q_weight in query_weights.items():
-            if token_id in doc_weights:
-                score += q_weight * doc_weights[token_id]
-        return score
-
-    def search_rag(self, query: str, k: int = 5, source_name: str = None) -> str:
-        rag_logger.info(f"[BGE-M3] RAG search: '{query[:100]}' source_name={source_name}")
-        start_time = time.time()
-
-        if self.index.ntotal == 0:
-            rag_logger.warning("FAISS index is empty")
-            return "NO_INFORMATION_IN_KNOWLEDGE_BASE"
-
-        # Encode query (dense + sparse)
-        q_output = self._encode([query])
-        q_dense = np.array(q_output['dense_vecs']).astype('float32')
-        faiss.normalize_L2(q_dense)
-        q_sparse = q_output['lexical_weights'][0]
-
-        # Dense search via FAISS
-        D, I = self.index.search(q_dense, min(k * 2, self.index.ntotal))
-
-        # Hybrid scoring: dense (0.6) + sparse/lexical (0.4)
-        DENSE_WEIGHT = 0.6
-        SPARSE_WEIGHT = 0.4
-        candidates = []
-        for i, idx in enumerate(I[0]):
-            if idx == -1 or idx >= len(self.metadata):
-                continue
-            meta = self.metadata[idx]
-            if source_name and meta.get("source") != source_name:
-                continue
-            dense_score = float(D[0][i])
-            sparse_score = self._compute_lexical_score(q_sparse, self.sparse_outputs[idx])
-            hybrid_score = DENSE_WEIGHT * dense_score + SPARSE_WEIGHT * sparse_score
-            candidates.append((hybrid_score, idx))
-
-        # Sort by hybrid score, take top 3
-        candidates.sort(key=lambda x: x[0], reverse=True)
-        rag_logger.info(f"[RAG] All candidates ({len(candidates)}):")
-        for rank, (score, idx) in enumerate(candidates[:5]):
-            meta = self.metadata[idx]
-            rag_logger.info(f"  #{rank+1} score={score:.4f} src={meta['source']} text={meta['text'][:200]}")
-
-        llm_results = []
-        for score, idx in candidates[:3]:
-            meta = self.metadata[idx]
-            llm_results.append(f"[{meta['source']}]: {meta['text']}")
-
-        total_time = (time.time() - start_time) * 1000
-        result_text = "\n\n---\n\n".join(llm_results) if llm_results else "No specific information found."
-        rag_logger.info(f"[RAG] DONE. Latency: {total_time:.2f}ms | Sent to LLM: {len(llm_results)}")
-        if llm_results:
-            rag_logger.info(f"[RAG] Context sent to LLM:\n{result_text[:500]}")
-        return result_text
-
-
-# Initialize global RAG instance
-rag = KnowledgeBase()
+
+# Background ingestion jobs, run on the bounded ingest pool
+ingest_jobs = JobQueue(executors.ingest_executor)
+# Seconds between job state checks on an SSE stream
+JOB_EVENT_INTERVAL = 0.5
+
+# Global RAG instance, set once the index has loaded (see _load_index)
+rag = None
+RAG_NOT_READY = "The knowledge base is still loading. Please try again shortly."
+
+
+def _load_index():
+    """Import FAISS (via the rag package) and restore the persisted index; needs no model."""
+    global rag
+    from rag import KnowledgeBase, EmbeddingCache
+    from rag.constants import RAG_DATA_DIR, EMBEDDING_CACHE_SIZE, EMBEDDING_CACHE_PATH
+    from rag.model_loader import encoder_name
+    embedding_cache = EmbeddingCache(encoder_name(), max_entries=EMBEDDING_CACHE_SIZE,
+                                     path=EMBEDDING_CACHE_PATH or None)
+    rag = KnowledgeBase(None, data_dir=RAG_DATA_DIR or None, embedding_cache=embedding_cache)
+
+
+def _load_model():
+    """Load + warm up BGE-M3 (dense + sparse hybrid) on ENCODER_BACKEND, then attach it to the index."""
+    from rag.model_loader import load_embedding_model
+    model = load_embedding_model()
+    if not startup.wait("index"):
+        raise RuntimeError("index failed to load; model not attached")
+    rag.model = model
+
+
+def _load_gemini():
+    global google_client
+    if os.getenv("GOOGLE_API_KEY"):
+        from google import genai
+        google_client = genai.Client(api_key=os.getenv("GOOGLE_API_KEY"))
+
+
+def rag_ready() -> bool:
+    return startup.is_ready("index", "model")
 
 # Active category for RAG queries (set by UI dropdown)
 active_source_name: str = None
@@ -279,9 +128,22 @@ chat_histories: dict = {}
 async def read_index():
     return FileResponse('frontend/dist/index.html')
 
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the process is up and serving requests."""
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness: the embedding model and the index have both finished loading."""
+    ready = rag_ready()
+    body = {"status": "ready" if ready else "loading", "components": startup.status()}
+    return JSONResponse(body, status_code=200 if ready else 503)
+
 @app.get("/token")
 def get_token(persona: str = None):
     import uuid
+    from livekit import api
     pid = persona or active_persona_id
     p = get_persona(pid)
     room_name = f"room-{uuid.uuid4().hex[:8]}"
@@ -297,62 +159,172 @@ def get_token(persona: str = None):
         "url": os.getenv("LIVEKIT_URL", "ws://localhost:7880"),
     }
 
+def _ingest_upload(job: Job, file_bytes: bytes, filename: str, category: str):
+    """Job body for /upload: stream the file through the ingestion pipeline."""
+    if not (startup.wait("index") and startup.wait("model")):
+        raise JobFailed("Knowledge base failed to load")
+    from rag.pipeline import ingest_pages
+
+    file_extension = os.path.splitext(filename)[1].lower()
+    is_ocr = file_extension in OCR_EXTENSIONS or file_extension == ".pdf"
+
+    logger.info(f"Indexing '{filename}' under category='{category}'...")
+    # Pages are extracted / OCR'd lazily inside the ingestion pipeline, overlapping with embedding;
+    # a PDF's scanned pages are OCR'd in parallel on the OCR process pool
+    pages = ocr_iter_pages(file_bytes, filename, executor=executors.get_ocr_executor(),
+                           parallelism=executors.PDF_OCR_WORKERS)
+    stats = ingest_pages(rag, pages, source_name=category, doc_id=rag.document_id(category, filename),
+                         progress=job.update)
+    if not stats["chunks"]:
+        raise JobFailed("No text could be extracted from the file")
+    logger.info(f"Indexed '{filename}' under category='{category}' - doc_id={stats['doc_id']}, "
+                f"{stats['chars']} chars, {stats['tables_found']} tables, "
+                f"{stats['key_value_pairs']} KV pairs")
+
+    result = {
+        "doc_id": stats["doc_id"],
+        "chars_extracted": stats["chars"],
+        "chunks": stats["chunks"],
+        "chunks_reused": stats["chunks_reused"],
+        "chunks_removed": stats["chunks_removed"],
+    }
+    if is_ocr:
+        result["ocr"] = {
+            "tables_found": stats["tables_found"],
+            "key_value_pairs": stats["key_value_pairs"],
+            "file_type": stats["file_type"],
+            "pages": stats["pages"],
+        }
+    return result
+
+
 @app.post("/upload")
 async def upload_file(file: UploadFile = File(...), category: str = Form("general")):
-    """Receives a file and category, indexes it under that category.
-    Uses OCR (pytesseract) for images and scanned PDFs.
+    """Receives a file and category and queues a job indexing it under that category.
+    Re-uploading a file with the same name and category updates it in place: only
+    changed chunks are re-embedded. Uses OCR (pytesseract) for images and scanned PDFs, streamed page by page
+    through the ingestion pipeline. Track progress via /api/jobs/{job_id}.
     Supports: PDF, DOCX, MD, TXT, PNG, JPG, TIFF, BMP, WEBP
     """
     try:
-        file_extension = os.path.splitext(file.filename)[1].lower()
         file_bytes = await file.read()
-        text_content = ""
-        ocr_metadata = {}
-
-        if file_extension in OCR_EXTENSIONS or file_extension == ".pdf":
-            result = ocr_process_file(file_bytes, file.filename)
-            text_content = result.get("text", "")
-            ocr_metadata = {
-                "tables_found": len(result.get("tables", [])),
-                "key_value_pairs": len(result.get("key_value_pairs", {})),
-                "file_type": result.get("file_type", ""),
-                "pages": result.get("pages", 0),
-            }
-            logger.info(f"OCR processed '{file.filename}': {len(text_content)} chars, "
-                        f"{ocr_metadata['tables_found']} tables, "
-                        f"{ocr_metadata['key_value_pairs']} KV pairs")
-        else:
-            text_content = file_bytes.decode("utf-8", errors="ignore")
+        job = ingest_jobs.submit(
+            lambda job: _ingest_upload(job, file_bytes, file.filename, category),
+            filename=file.filename, category=category,
+        )
+        return {"status": "queued", "job_id": job.id, "filename": file.filename, "category": category}
+    except QueueFull as e:
+        return JSONResponse({"status": "error", "message": f"Too many uploads in progress ({e})"}, status_code=429)
+    except Exception as e:
+        logger.error(f"Error handling upload: {e}")
+        return {"status": "error", "message": str(e)}
 
-        if not text_content.strip():
-            return {"status": "error", "message": "No text could be extracted from the file"}
 
-        logger.info(f"Indexing '{file.filename}' under category='{category}'...")
-        doc_id = rag.build_index(text_content, source_name=category)
-        logger.info(f"Indexed '{file.filename}' under category='{category}' - doc_id={doc_id}")
+def _bulk_documents(uploads, category: str):
+    """(filename, bytes, category) for each uploaded file, expanding zip archives."""
+    for filename, file_bytes in uploads:
+        if os.path.splitext(filename)[1].lower() != ".zip":
+            yield filename, file_bytes, category
+            continue
+        with zipfile.ZipFile(io.BytesIO(file_bytes)) as archive:
+            for entry in archive.infolist():
+                name = entry.filename
+                if entry.is_dir() or name.startswith("__MACOSX/") or os.path.basename(name).startswith("."):
+                    continue
+                if os.path.splitext(name)[1].lower() not in UPLOAD_EXTENSIONS:
+                    continue
+                yield name, archive.read(entry), category
+
+
+def _ingest_bulk(job: Job, uploads, category: str):
+    """Job body for /upload/bulk: index many documents through the shared batched pipeline."""
+    if not (startup.wait("index") and startup.wait("model")):
+        raise JobFailed("Knowledge base failed to load")
+    from rag.pipeline import ingest_documents
+
+    result = ingest_documents(
+        rag, _bulk_documents(uploads, category), extract=ocr_extract_pages,
+        executor=executors.get_ocr_executor(), parallelism=executors.OCR_WORKERS, progress=job.update,
+    )
+    if not result["chunks"]:
+        raise JobFailed("No text could be extracted from any file")
+    return result
 
-        response = {
-            "status": "success",
-            "filename": file.filename,
-            "category": category,
-            "doc_id": doc_id,
-            "chars_extracted": len(text_content),
-        }
-        if ocr_metadata:
-            response["ocr"] = ocr_metadata
-        return response
 
+@app.post("/upload/bulk")
+async def upload_bulk(files: List[UploadFile] = File(...), category: str = Form("general")):
+    """Queues one job indexing many files (and the contents of any .zip archives) under a category.
+    Extraction runs across the OCR process pool and chunks from all files share encoder batches.
+    """
+    try:
+        uploads = [(file.filename, await file.read()) for file in files]
+        job = ingest_jobs.submit(
+            lambda job: _ingest_bulk(job, uploads, category),
+            kind="bulk", filenames=[name for name, _ in uploads], category=category,
+        )
+        return {"status": "queued", "job_id": job.id, "files": len(uploads), "category": category}
+    except QueueFull as e:
+        return JSONResponse({"status": "error", "message": f"Too many uploads in progress ({e})"}, status_code=429)
     except Exception as e:
-        logger.error(f"Error handling upload: {e}")
+        logger.error(f"Error handling bulk upload: {e}")
         return {"status": "error", "message": str(e)}
 
 
+@app.get("/api/jobs")
+async def list_jobs(limit: int = 50):
+    """Recent ingestion jobs, newest first."""
+    return {"jobs": ingest_jobs.list(limit), "counts": ingest_jobs.stats()}
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Status, per-stage progress and result of one ingestion job."""
+    job = ingest_jobs.get(job_id)
+    if job is None:
+        return JSONResponse({"status": "error", "message": "Job not found"}, status_code=404)
+    return job.to_dict()
+
+@app.get("/api/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """Server-Sent Events stream of a job's state, ending once it succeeds or fails."""
+    job = ingest_jobs.get(job_id)
+    if job is None:
+        return JSONResponse({"status": "error", "message": "Job not found"}, status_code=404)
+
+    async def events():
+        revision = -1
+        while True:
+            if job.revision != revision:
+                revision = job.revision
+                state = job.to_dict()
+                yield f"data: {json.dumps(state)}\n\n"
+                if state["status"] in JOB_TERMINAL:
+                    return
+            await asyncio.sleep(JOB_EVENT_INTERVAL)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.post("/api/jobs/{job_id}/retry")
+async def retry_job(job_id: str):
+    """Re-queue a failed ingestion job."""
+    try:
+        job = ingest_jobs.retry(job_id)
+    except QueueFull as e:
+        return JSONResponse({"status": "error", "message": f"Too many uploads in progress ({e})"}, status_code=429)
+    if job is None:
+        return JSONResponse({"status": "error", "message": "Job not found, not failed, or no longer retryable"}, status_code=404)
+    return {"status": "queued", "job_id": job.id}
+
+
 @app.post("/api/ocr")
 async def ocr_extract(file: UploadFile = File(...)):
     """Standalone OCR endpoint - extracts text and structured data without indexing."""
     try:
         file_bytes = await file.read()
-        result = ocr_process_file(file_bytes, file.filename)
+        if file.filename.lower().endswith(".pdf"):
+            result = await run_ocr_pages(ocr_process_file, file_bytes, file.filename)
+        else:
+            result = await run_ocr(ocr_process_file, file_bytes, file.filename)
         return {
             "status": "success",
             "filename": file.filename,
@@ -377,6 +349,8 @@ class ChatMessage(BaseModel):
 async def chat(req: ChatMessage):
     """Chat endpoint using Gemini model with RAG context."""
     if not google_client:
+        if not startup.is_ready("gemini"):
+            return {"status": "error", "message": "Gemini client is still loading"}
         return {"status": "error", "message": "Gemini API key not configured"}
 
     user_message = req.message.strip()
@@ -392,7 +366,9 @@ async def chat(req: ChatMessage):
     rag_context = ""
     effective_source = active_source_name
     try:
-        rag_result = rag.search_rag(user_message, source_name=effective_source)
+        if not rag_ready():
+            raise RuntimeError("knowledge base still loading")
+        rag_result = await run_search(rag.search_rag, user_message, source_name=effective_source)
         if rag_result and rag_result != "NO_INFORMATION_IN_KNOWLEDGE_BASE" and rag_result != "No specific information found.":
             rag_context = rag_result
     except Exception as e:
@@ -424,7 +400,7 @@ async def chat(req: ChatMessage):
     contents.append({"role": "user", "parts": [{"text": user_message}]})
 
     try:
-        response = google_client.models.generate_content(
+        response = await google_client.aio.models.generate_content(
             model=CHAT_MODEL,
             contents=contents,
         )
@@ -459,6 +435,8 @@ async def clear_chat(data: dict = {}):
 @app.get("/api/documents")
 async def list_documents():
     """Returns all indexed categories with chunk counts and active selection."""
+    if rag is None:
+        return {"documents": [], "active_source_name": active_source_name}
     try:
         docs = rag.list_documents()
         return {"documents": docs, "active_source_name": active_source_name}
@@ -499,7 +477,10 @@ async def set_persona(req: SetPersonaRequest):
 @app.post("/api/clear-db")
 async def clear_db():
     """Clears all indexed documents from the vector store."""
-    rag.clear()
+    if rag is None:
+        return {"status": "error", "message": RAG_NOT_READY}
+    # Not on the ingest pool: it would wait behind every queued upload job
+    await run_maintenance(rag.clear)
     global active_source_name
     active_source_name = None
     logger.info("Vector store cleared")
@@ -564,10 +545,12 @@ async def get_transcript(session_id: str):
 # --- MCP Tools (used by voice agent) ---
 
 @mcp.tool()
-def query_knowledge_base(question: str, source_name: str = None) -> str:
+async def query_knowledge_base(question: str, source_name: str = None) -> str:
     """Queries the vector database (RAG) to find an answer."""
+    if not rag_ready():
+        return RAG_NOT_READY
     effective_source = source_name or active_source_name
-    result = rag.search_rag(question, source_name=effective_source)
+    result = await run_search(rag.search_rag, question, source_name=effective_source)
     return f"Relevant Context:\n{result}"
 
 @mcp.tool()
@@ -590,6 +573,7 @@ def get_appointment_info() -> str:
 @mcp.tool()
 def check_and_book_appointment(date_text: str) -> str:
     """Check availability for a given date or day string."""
+    from calendar_integration import get_appointment_manager
     manager = get_appointment_manager()
     dt = manager.parse_date_time(date_text)
     if not dt:
@@ -614,6 +598,7 @@ def check_and_book_appointment(date_text: str) -> str:
 @mcp.tool()
 def schedule_appointment(start_time_iso: str, user_name: str, user_email: str, user_phone: str = None, notes: str = None) -> str:
     """Schedules an appointment at the specified start time."""
+    from calendar_integration import get_appointment_manager
     manager = get_appointment_manager()
     try:
         if 'T' in start_time_iso:
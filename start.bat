@@ -104,9 +104,9 @@ echo   [2/3] FastAPI Server (port 8005)
 start "fastapi-srv" /B cmd /c "python "%DIR%server.py" > "%LOG_DIR%\server.log" 2>&1"
 
 set "ready=0"
-for /l %%i in (1,1,45) do (
+for /l %%i in (1,1,120) do (
     if !ready!==0 (
-        curl -s http://localhost:8005 >nul 2>&1
+        curl -sf http://localhost:8005/readyz >nul 2>&1
         if !errorlevel! equ 0 (
             echo         Ready
             set "ready=1"
@@ -115,7 +115,7 @@ for /l %%i in (1,1,45) do (
         )
     )
 )
-if !ready!==0 echo         Timeout (model may still be loading)
+if !ready!==0 echo         Timeout (model may still be loading, see /readyz)
 
 :: 3. MCP Voice Agent
 echo   [3/3] MCP Voice Agent
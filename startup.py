@@ -0,0 +1,72 @@
+"""
+Background initialisation of heavy server components.
+Each component loads on its own thread so the HTTP server can accept
+connections immediately; /readyz reports ready once all of them are.
+"""
+
+import time
+import logging
+import threading
+from typing import Callable, Dict, Any
+
+logger = logging.getLogger("startup")
+
+PENDING = "pending"
+LOADING = "loading"
+READY = "ready"
+FAILED = "failed"
+
+
+class Startup:
+    """Tracks named background loaders for liveness / readiness probes."""
+
+    def __init__(self):
+        self._components: Dict[str, Dict[str, Any]] = {}
+        self._events: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str):
+        """Declare a component up front so readiness is false until it has loaded."""
+        with self._lock:
+            self._components.setdefault(name, {"state": PENDING})
+            self._events.setdefault(name, threading.Event())
+
+    def start(self, name: str, fn: Callable[[], Any]):
+        """Run fn on a daemon thread and record its outcome under name."""
+        self.register(name)
+        thread = threading.Thread(target=self._run, args=(name, fn), name=f"startup-{name}", daemon=True)
+        thread.start()
+
+    def _run(self, name: str, fn: Callable[[], Any]):
+        self._set(name, state=LOADING)
+        start = time.time()
+        try:
+            fn()
+        except Exception as e:
+            logger.exception(f"Startup component '{name}' failed")
+            self._set(name, state=FAILED, error=str(e), seconds=round(time.time() - start, 2))
+        else:
+            seconds = round(time.time() - start, 2)
+            logger.info(f"Startup component '{name}' ready in {seconds}s")
+            self._set(name, state=READY, seconds=seconds)
+        finally:
+            self._events[name].set()
+
+    def _set(self, name: str, **fields):
+        with self._lock:
+            self._components[name] = {**fields}
+
+    def wait(self, name: str, timeout: float = None) -> bool:
+        """Block until a component has finished loading; True if it is ready."""
+        self.register(name)
+        self._events[name].wait(timeout)
+        return self.is_ready(name)
+
+    def is_ready(self, *names: str) -> bool:
+        with self._lock:
+            names = names or tuple(self._components)
+            return all(self._components.get(n, {}).get("state") == READY for n in names)
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {name: dict(info) for name, info in self._components.items()}
@@ -0,0 +1,87 @@
+"""
+Shared fixtures. HashEncoder stands in for BGE-M3 so the index, storage and
+snapshot tests run without the model: it is deterministic, so re-encoding a
+chunk's text gives the reference vector for brute-force comparisons.
+"""
+
+import os
+import re
+import sys
+import zlib
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rag import KnowledgeBase  # noqa: E402
+from rag.constants import EMBEDDING_DIMENSIONS  # noqa: E402
+
+
+class HashEncoder:
+    """BGEM3FlagModel.encode() stand-in: hashed bag-of-words dense vectors and lexical weights."""
+
+    def __init__(self):
+        self.encoded = 0  # texts encoded so far
+
+    def encode(self, sentences, return_dense=True, return_sparse=True, return_colbert_vecs=False, **kwargs):
+        single = isinstance(sentences, str)
+        if single:
+            sentences = [sentences]
+        self.encoded += len(sentences)
+        dense = np.zeros((len(sentences), EMBEDDING_DIMENSIONS), dtype="float32")
+        lexical = []
+        for i, text in enumerate(sentences):
+            weights = {}
+            for token in re.findall(r"\w+", text.lower()):
+                h = zlib.crc32(token.encode("utf-8"))
+                dense[i, h % EMBEDDING_DIMENSIONS] += 1.0
+                dense[i, (h >> 10) % EMBEDDING_DIMENSIONS] -= 0.5
+                key = str(h % 250000)
+                weights[key] = min(weights.get(key, 0.0) + 0.1, 0.5)
+            dense[i] += 1e-3
+            dense[i] /= np.linalg.norm(dense[i])
+            lexical.append(weights)
+        return {
+            "dense_vecs": dense[0] if single else dense,
+            "lexical_weights": lexical[0] if single else lexical,
+            "colbert_vecs": None,
+        }
+
+
+def encode_dense(encoder: HashEncoder, texts) -> np.ndarray:
+    return np.asarray(encoder.encode(list(texts))["dense_vecs"], dtype="float32").reshape(-1, EMBEDDING_DIMENSIONS)
+
+
+def brute_force(encoder: HashEncoder, kb: KnowledgeBase, query: str, n: int, source_name: str = None):
+    """Exact top-n (ids, scores) over the KnowledgeBase's live chunks, re-encoded from their text."""
+    chunks = kb.snapshot().chunks
+    ids = chunks.ids_for_source(source_name) if source_name else chunks.ids()
+    vectors = encode_dense(encoder, [chunks.text(i) for i in ids.tolist()])
+    scores = vectors @ encode_dense(encoder, [query])[0]
+    order = np.argsort(-scores, kind="stable")[:n]
+    return ids[order], scores[order]
+
+
+def make_text(rng: np.random.Generator, words: int) -> str:
+    vocab = [f"{stem}{n}" for stem in ("alpha", "beta", "gamma", "delta", "invoice", "policy", "leave", "tax")
+             for n in range(40)]
+    return " ".join(rng.choice(vocab, size=words).tolist())
+
+
+@pytest.fixture
+def encoder():
+    return HashEncoder()
+
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(7)
+
+
+@pytest.fixture
+def make_kb(encoder):
+    """Factory for KnowledgeBases on the shared encoder: make_kb() in memory, make_kb(path) persisted."""
+    def make(data_dir=None, model=encoder):
+        return KnowledgeBase(model, data_dir=str(data_dir) if data_dir else None)
+    return make
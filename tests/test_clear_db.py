@@ -0,0 +1,50 @@
+"""Clearing the knowledge base must not wait behind upload jobs occupying the ingest pool."""
+
+import asyncio
+import threading
+
+import pytest
+
+import executors
+from jobs import JobQueue
+from conftest import make_text
+
+
+@pytest.fixture
+def busy_ingest_pool():
+    """Every ingest worker stuck in a running job, with more jobs queued behind them."""
+    release = threading.Event()
+    running = threading.Semaphore(0)
+
+    def stuck(job):
+        running.release()
+        release.wait(30)
+
+    queue = JobQueue(executors.ingest_executor)
+    for _ in range(executors.INGEST_WORKERS + 3):
+        queue.submit(stuck)
+    for _ in range(executors.INGEST_WORKERS):
+        assert running.acquire(timeout=5)
+    yield
+    release.set()
+
+
+def _indexed_kb(make_kb, rng):
+    kb = make_kb()
+    kb.build_index(make_text(rng, 300), source_name="hr", doc_id="doc")
+    return kb
+
+
+def test_clear_returns_while_ingest_jobs_are_blocked(busy_ingest_pool, make_kb, rng):
+    kb = _indexed_kb(make_kb, rng)
+    asyncio.run(asyncio.wait_for(executors.run_maintenance(kb.clear), timeout=5))
+    assert len(kb.chunks) == 0
+
+
+def test_clear_db_endpoint_returns_while_ingest_jobs_are_blocked(busy_ingest_pool, make_kb, rng, monkeypatch):
+    server = pytest.importorskip("server")
+    kb = _indexed_kb(make_kb, rng)
+    monkeypatch.setattr(server, "rag", kb)
+    response = asyncio.run(asyncio.wait_for(server.clear_db(), timeout=5))
+    assert response == {"status": "ok"}
+    assert len(kb.chunks) == 0
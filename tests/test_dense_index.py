@@ -0,0 +1,172 @@
+"""DenseIndex past its ANN threshold: deletes and id filters must hold exactly, ranking must stay close to brute force."""
+
+import numpy as np
+import pytest
+
+import rag.dense_index
+from rag.dense_index import DenseIndex, IdSubset
+
+DIM = 32
+
+
+def _vectors(rng, n):
+    vecs = rng.standard_normal((n, DIM)).astype("float32")
+    return vecs / np.linalg.norm(vecs, axis=1, keepdims=True)
+
+
+def _exact(live, queries, n, subset=None):
+    ids = np.array(sorted(i for i in live if subset is None or i in subset), dtype="int64")
+    scores = queries @ np.stack([live[i] for i in ids.tolist()]).T
+    order = np.argsort(-scores, axis=1, kind="stable")[:, :n]
+    return ids[order], np.take_along_axis(scores, order, axis=1)
+
+
+def _recall(I, expected_ids):
+    return np.mean([len(set(got.tolist()) & set(want.tolist())) / len(want) for got, want in zip(I, expected_ids)])
+
+
+def _fill(index, rng, n, first_id=0, batch=150):
+    live = {}
+    for start in range(first_id, first_id + n, batch):
+        vecs = _vectors(rng, min(batch, first_id + n - start))
+        ids = np.arange(start, start + len(vecs), dtype="int64")
+        index.add(ids, vecs)
+        live.update(zip(ids.tolist(), vecs))
+    return live
+
+
+def _remove(index, live, doomed):
+    index.remove(doomed)
+    for chunk_id in doomed:
+        del live[chunk_id]
+
+
+def _check(index, live, queries, n=10, min_recall=0.8):
+    assert index.ntotal == len(live)
+    assert set(index.ids().tolist()) == set(live)
+    D, I = index.search(queries, n)
+    assert set(I.ravel().tolist()) <= set(live)
+    assert _recall(I, _exact(live, queries, n)[0]) >= min_recall
+
+
+@pytest.mark.parametrize("backend", ["hnsw", "ivf"])
+def test_promotion_keeps_deletes_out_of_results(backend):
+    rng = np.random.default_rng(11)
+    index = DenseIndex(dim=DIM, backend=backend, ann_threshold=3000)
+    queries = _vectors(rng, 20)
+    live = _fill(index, rng, 2900)
+    assert index.kind == "flat"
+    live.update(_fill(index, rng, 1600, first_id=2900))
+    assert index.kind == backend
+    _check(index, live, queries)
+    assert index.recall_check() >= 0.8
+
+    # Delete the current top hits, so a leak would show up in the results
+    _, I = index.search(queries, 5)
+    _remove(index, live, np.unique(I).tolist())
+    _check(index, live, queries)
+    _remove(index, live, rng.choice(sorted(live), size=300, replace=False).tolist())
+    _check(index, live, queries)
+    assert index.kind == backend  # deletes never demote the index
+
+
+def test_hnsw_rebuilds_once_tombstones_pile_up():
+    rng = np.random.default_rng(12)
+    index = DenseIndex(dim=DIM, backend="hnsw", ann_threshold=1000)
+    queries = _vectors(rng, 20)
+    live = _fill(index, rng, 1500)
+    assert index.kind == "hnsw"
+
+    _remove(index, live, sorted(live)[:200])  # under HNSW_TOMBSTONE_RATIO: hidden, still in the graph
+    assert len(index._deleted) == 200 and index._index.ntotal == 1500
+    _check(index, live, queries)
+
+    _remove(index, live, sorted(live)[:200])  # over the ratio: the graph is rebuilt without them
+    assert not index._deleted and index._index.ntotal == len(live) == 1100
+    assert index.kind == "hnsw"
+    _check(index, live, queries)
+
+
+@pytest.mark.parametrize("backend", ["hnsw", "ivf"])
+@pytest.mark.parametrize("exact_subset_max", [rag.dense_index.EXACT_SUBSET_MAX, 0])
+def test_filtered_search_stays_in_subset(backend, exact_subset_max, monkeypatch):
+    # With the default limit small filters are answered exactly; with 0 they go through the ANN filter
+    monkeypatch.setattr(rag.dense_index, "EXACT_SUBSET_MAX", exact_subset_max)
+    rng = np.random.default_rng(13)
+    index = DenseIndex(dim=DIM, backend=backend, ann_threshold=3000)
+    queries = _vectors(rng, 20)
+    live = _fill(index, rng, 4500)
+    _remove(index, live, rng.choice(sorted(live), size=400, replace=False).tolist())
+    subset = set(sorted(live)[::9])
+    excluded = set(sorted(subset & set(live))[::5])  # e.g. deleted after a snapshot was taken
+    kept = {i: v for i, v in live.items() if i not in excluded}
+
+    D, I = index.search(queries, 10, subset=IdSubset(sorted(subset)), exclude=IdSubset(sorted(excluded)))
+
+    assert set(I.ravel().tolist()) - {-1} <= (subset & set(kept))
+    expected_ids, expected_scores = _exact(kept, queries, 10, subset)
+    if exact_subset_max:
+        np.testing.assert_array_equal(I, expected_ids)
+        np.testing.assert_allclose(D, expected_scores, rtol=1e-5, atol=1e-5)
+    else:
+        assert _recall(I, expected_ids) >= 0.8
+
+
+class _Store:
+    """Full-precision vectors by id, like ChunkStore.vectors: KeyError for ids it no longer has."""
+
+    def __init__(self):
+        self.vectors = {}
+        self.lookups = []
+
+    def __call__(self, ids):
+        ids = np.asarray(ids, dtype="int64").tolist()
+        self.lookups.extend(ids)
+        return np.stack([self.vectors[i] for i in ids])
+
+
+@pytest.mark.parametrize("backend,codec", [("flat", "fp16"), ("flat", "sq8"), ("flat", "pq"), ("hnsw", "sq8")])
+def test_compressed_results_are_reranked_from_full_precision(backend, codec, monkeypatch):
+    monkeypatch.setattr(rag.dense_index, "CODEC_TRAIN_MIN", 500)
+    monkeypatch.setattr(rag.dense_index, "PQ_M", 8)
+    rng = np.random.default_rng(14)
+    store = _Store()
+    index = DenseIndex(dim=DIM, backend=backend, ann_threshold=1000, codec=codec, exact_vectors=store)
+    queries = _vectors(rng, 20)
+    for start in range(0, 1500, 150):
+        vecs = _vectors(rng, 150)
+        store.vectors.update(zip(range(start, start + 150), vecs))
+        index.add(np.arange(start, start + 150), vecs)
+    assert index.compressed and index.kind == backend
+    assert index.bytes_per_vector() < DIM * 4
+
+    store.lookups.clear()
+    D, I = index.search(queries[:1], 10)
+    assert len(store.lookups) == 10 * rag.dense_index.RERANK_FACTOR  # over-fetched candidates, re-scored
+    D, I = index.search(queries, 10)
+    exact_scores = np.einsum("qd,qkd->qk", queries, np.stack([store(row) for row in I]))
+    np.testing.assert_allclose(D, exact_scores, rtol=1e-6, atol=1e-6)  # full-precision scores, not codec ones
+    assert (np.diff(D, axis=1) <= 0).all()
+    assert _recall(I, _exact(store.vectors, queries, 10)[0]) >= 0.8
+
+    # Deleted from index and store: never returned, never looked up
+    doomed = np.unique(I[:, :3]).tolist()
+    snapshot = index.copy()
+    index.remove(doomed)
+    for chunk_id in doomed:
+        del store.vectors[chunk_id]
+    store.lookups.clear()
+    D, I = index.search(queries, 10)
+    assert not set(doomed) & set(I.ravel().tolist())
+    assert not set(doomed) & set(store.lookups)
+
+    # A snapshot taken before the delete hides them through exclude, as LayeredDenseIndex does
+    store.lookups.clear()
+    D, I = snapshot.search(queries, 10, exclude=IdSubset(doomed))
+    assert not set(doomed) & set(I.ravel().tolist())
+    assert not set(doomed) & set(store.lookups)
+    # and reconstructs ids gone from the store from its own copy, keeping the rest full precision
+    kept = sorted(store.vectors)[:5]
+    vectors = snapshot.reconstruct(kept + doomed[:2])
+    np.testing.assert_array_equal(vectors[:5], np.stack([store.vectors[i] for i in kept]))
+    assert np.all(np.isfinite(vectors[5:])) and np.all(np.linalg.norm(vectors[5:], axis=1) > 0.5)
@@ -0,0 +1,138 @@
+"""Deletes and source filters: results must match a brute-force search over what is left, with no re-encoding."""
+
+import itertools
+import logging
+import re
+import zlib
+
+import numpy as np
+import pytest
+
+from rag.constants import DENSE_WEIGHT, SPARSE_WEIGHT, EMBEDDING_DIMENSIONS
+from conftest import brute_force, encode_dense, make_text
+
+
+def _fill(kb, rng, docs=6, words=400):
+    for d in range(docs):
+        kb.build_index(make_text(rng, words), source_name=f"s{d % 2}", doc_id=f"doc{d}")
+
+
+def _dense_top(kb, encoder, query, n, source_name=None):
+    D, I = kb.snapshot().dense_search(encode_dense(encoder, [query]), n, source_name)
+    return I[0][I[0] >= 0], D[0][I[0] >= 0]
+
+
+def test_delete_by_doc_id_matches_brute_force(make_kb, encoder, rng):
+    kb = make_kb()
+    _fill(kb, rng)
+    removed = set(kb.chunks.ids_for_doc("doc2").tolist())
+    encoded = encoder.encoded
+
+    kb.clear("doc2")
+
+    assert encoder.encoded == encoded  # deletes never re-embed
+    assert not kb.chunks.ids_for_doc("doc2").size
+    for query in ("alpha3 policy7 tax12", "invoice1 leave30", make_text(rng, 20)):
+        ids, scores = _dense_top(kb, encoder, query, 10)
+        expected_ids, expected_scores = brute_force(encoder, kb, query, 10)
+        assert not removed & set(ids.tolist())
+        np.testing.assert_array_equal(ids, expected_ids)
+        np.testing.assert_allclose(scores, expected_scores, rtol=1e-5, atol=1e-5)
+
+
+def test_clear_by_source_matches_brute_force(make_kb, encoder, rng):
+    kb = make_kb()
+    _fill(kb, rng)
+    kb.clear_by_source("s1")
+
+    assert kb.chunks.source_count("s1") == 0
+    assert {doc["source_name"] for doc in kb.list_documents()} == {"s0"}
+    query = "gamma5 delta9 alpha0"
+    ids, _ = _dense_top(kb, encoder, query, 8)
+    np.testing.assert_array_equal(ids, brute_force(encoder, kb, query, 8)[0])
+    ids, _ = _dense_top(kb, encoder, query, 8, source_name="s0")
+    np.testing.assert_array_equal(ids, brute_force(encoder, kb, query, 8, source_name="s0")[0])
+
+
+def test_search_never_returns_deleted_chunks(make_kb, encoder, rng):
+    kb = make_kb()
+    text = make_text(rng, 300)
+    kb.build_index(text, source_name="hr", doc_id="old")
+    kb.build_index(make_text(rng, 300), source_name="hr", doc_id="new")
+    kb.clear("old")
+    result = kb.search_rag(text[:200], k=5)
+    old_texts = set(kb.chunker().chunk(kb._clean_text(text)))
+    assert not any(chunk in result for chunk in old_texts)
+
+
+def test_rare_source_filter_returns_its_own_hits(make_kb, encoder, rng):
+    kb = make_kb()
+    _fill(kb, rng, docs=8)
+    rare_text = " ".join(f"omega{n}" for n in rng.integers(0, 60, size=600).tolist())
+    kb.build_index(rare_text, source_name="rare", doc_id="rare/a.txt")
+    rare_ids = set(kb.chunks.ids_for_source("rare").tolist())
+    query = "alpha1 policy3 tax7"
+    # Unfiltered, every rare chunk ranks below the candidates a global top-N would keep
+    assert not rare_ids & set(brute_force(encoder, kb, query, 20)[0].tolist())
+
+    ids, scores = _dense_top(kb, encoder, query, 5, source_name="rare")
+    expected_ids, expected_scores = brute_force(encoder, kb, query, 5, source_name="rare")
+    assert len(ids) == min(5, len(rare_ids))
+    np.testing.assert_array_equal(ids, expected_ids)
+    np.testing.assert_allclose(scores, expected_scores, rtol=1e-5, atol=1e-5)
+    result = kb.search_rag(query, k=5, source_name="rare")
+    assert result.startswith("[rare]") and "[s0]" not in result and "[s1]" not in result
+
+
+def _dense_twin(token):
+    """Another token that HashEncoder puts on the same dense dimension, with no lexical overlap."""
+    target = zlib.crc32(token.encode("utf-8")) % EMBEDDING_DIMENSIONS
+    return next(twin for twin in (f"twin{n}" for n in itertools.count())
+                if zlib.crc32(twin.encode("utf-8")) % EMBEDDING_DIMENSIONS == target)
+
+
+def test_lexical_only_match_gets_the_hybrid_score(make_kb, encoder, rng, caplog):
+    kb = make_kb()
+    _fill(kb, rng, docs=2)
+    query = "zebra quokka"
+    # Decoys win the dense side through hash collisions but share no token with the query
+    twins = [_dense_twin("zebra"), _dense_twin("quokka")]
+    for d, repeat in enumerate((30, 20)):
+        kb.build_index(" ".join([twins[0]] * 30 + [twins[1]] * repeat), source_name="decoy", doc_id=f"decoy{d}")
+    kb.build_index(make_text(rng, 100) + " zebra", source_name="hr", doc_id="lexical")
+    [lexical_id] = kb.chunks.ids_for_doc("lexical").tolist()
+    lexical_text = kb.chunks.text(lexical_id)
+    # k=1 keeps 2 candidates per side: both dense ones are decoys, the lexical chunk only comes from the sparse side
+    assert lexical_id not in _dense_top(kb, encoder, query, 2)[0].tolist()
+
+    with caplog.at_level(logging.INFO, logger="rag"):
+        result = kb.search_rag(query, k=1)
+
+    assert f"[hr]: {lexical_text}" in result
+    encoded = encoder.encode([lexical_text, query])
+    dense = float(encoded["dense_vecs"][0] @ encoded["dense_vecs"][1])
+    sparse = sum(w * encoded["lexical_weights"][1].get(t, 0.0) for t, w in encoded["lexical_weights"][0].items())
+    assert dense > 0 and sparse > 0
+    logged = [float(m.group(1)) for m in (re.search(r"score=(\S+) src=hr text=(.*)", r.getMessage()) for r in caplog.records)
+              if m and lexical_text.startswith(m.group(2))]
+    assert logged == [pytest.approx(DENSE_WEIGHT * dense + SPARSE_WEIGHT * sparse, abs=1e-4)]
+
+
+def test_result_cache_never_serves_a_deleted_hit(make_kb, rng):
+    kb = make_kb()
+    _fill(kb, rng, docs=4)
+    kb.build_index(make_text(rng, 100), source_name="hr", doc_id="top")
+    [top_text] = [kb.chunks.text(i) for i in kb.chunks.ids_for_doc("top").tolist()]
+    query = top_text[:300]
+    first = kb.search_rag(query, k=3)
+    assert first.startswith(f"[hr]: {top_text}")
+    hits = kb.result_cache.hits
+    assert kb.search_rag(query, k=3) == first
+    assert kb.result_cache.hits == hits + 1  # the repeat was served from the cache
+
+    kb.clear("top")
+
+    after = kb.search_rag(query, k=3)
+    assert top_text not in after
+    assert after.startswith("[s")
+    assert kb.result_cache.hits == hits + 1
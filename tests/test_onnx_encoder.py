@@ -0,0 +1,67 @@
+"""
+ONNX / int8 BGE-M3 export against FlagEmbedding. Needs onnxruntime, FlagEmbedding
+and an exported model (python -m rag.onnx_encoder export); skipped otherwise.
+"""
+
+import os
+
+import numpy as np
+import pytest
+
+pytest.importorskip("onnxruntime")
+pytest.importorskip("transformers")
+flag_embedding = pytest.importorskip("FlagEmbedding")
+
+from rag.constants import EMBEDDING_MODEL_NAME, ONNX_MODEL_DIR  # noqa: E402
+from rag.onnx_encoder import (  # noqa: E402
+    FP32_FILE, INT8_FILE, PARITY_TOLERANCES, OnnxEncoder, _weighted_overlap, check_parity,
+)
+
+SENTENCES = [
+    "What are the opening hours on Saturday?",
+    "Appointments are two hours long with a one-hour break between them.",
+    "Leave requests must be approved by the reporting manager at least a week in advance.",
+    "अपॉइंटमेंट कैसे बुक करें?",
+    "అపాయింట్‌మెంట్ ఎలా బుక్ చేయాలి?",
+    "Invoice No: 4471 | Total: 1,250.00 INR | Due: 2024-03-31",
+    "The knowledge base stores dense vectors in FAISS and lexical weights in sparse matrices. " * 12,
+]
+
+ENCODE_ARGS = dict(return_dense=True, return_sparse=True, return_colbert_vecs=False)
+
+
+@pytest.fixture(scope="module")
+def reference():
+    return flag_embedding.BGEM3FlagModel(EMBEDDING_MODEL_NAME, use_fp16=False)
+
+
+@pytest.fixture(scope="module")
+def reference_output(reference):
+    return reference.encode(SENTENCES, **ENCODE_ARGS)
+
+
+@pytest.mark.parametrize("quantization, filename", [("fp32", FP32_FILE), ("int8", INT8_FILE)])
+def test_onnx_matches_flag_embedding(reference_output, quantization, filename):
+    if not os.path.exists(os.path.join(ONNX_MODEL_DIR, filename)):
+        pytest.skip(f"{filename} not exported to {ONNX_MODEL_DIR}")
+    candidate = OnnxEncoder(ONNX_MODEL_DIR, quantization=quantization)
+    output = candidate.encode(SENTENCES, **ENCODE_ARGS)
+    tolerances = PARITY_TOLERANCES[quantization]
+
+    ref_dense = np.asarray(reference_output["dense_vecs"], dtype="float32")
+    out_dense = np.asarray(output["dense_vecs"], dtype="float32")
+    ref_dense /= np.linalg.norm(ref_dense, axis=1, keepdims=True)
+    cosines = (ref_dense * out_dense).sum(axis=1)
+    for sentence, cosine in zip(SENTENCES, cosines.tolist()):
+        assert cosine >= tolerances["dense_cosine"], f"dense cosine {cosine:.5f} for {sentence[:40]!r}"
+
+    for sentence, ref, out in zip(SENTENCES, reference_output["lexical_weights"], output["lexical_weights"]):
+        overlap = _weighted_overlap(ref, out)
+        assert overlap >= tolerances["lexical_overlap"], f"lexical overlap {overlap:.4f} for {sentence[:40]!r}"
+
+
+def test_check_parity_reports_pass(reference):
+    if not os.path.exists(os.path.join(ONNX_MODEL_DIR, INT8_FILE)):
+        pytest.skip(f"{INT8_FILE} not exported to {ONNX_MODEL_DIR}")
+    report = check_parity(reference, OnnxEncoder(ONNX_MODEL_DIR, quantization="int8"), SENTENCES, "int8")
+    assert report["passed"], report
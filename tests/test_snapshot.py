@@ -0,0 +1,126 @@
+"""Layered dense index and KnowledgeBase snapshots: every view equals a brute-force search of its own version."""
+
+import threading
+
+import numpy as np
+
+import rag.snapshot
+from rag.dense_index import DenseIndex, IdSubset
+from rag.snapshot import LayeredDenseIndex
+from conftest import brute_force, encode_dense, make_text
+
+DIM = 32
+
+
+def _vectors(rng, n):
+    vecs = rng.standard_normal((n, DIM)).astype("float32")
+    return vecs / np.linalg.norm(vecs, axis=1, keepdims=True)
+
+
+def _exact(live, queries, n, subset=None):
+    ids = np.array(sorted(i for i in live if subset is None or i in subset), dtype="int64")
+    scores = queries @ np.stack([live[i] for i in ids.tolist()]).T
+    order = np.argsort(-scores, axis=1, kind="stable")[:, :n]
+    return ids[order], np.take_along_axis(scores, order, axis=1)
+
+
+def _check(view, live, queries, n=10):
+    assert view.ntotal == len(live)
+    D, I = view.search(queries, n)
+    expected_ids, expected_scores = _exact(live, queries, n)
+    np.testing.assert_array_equal(I, expected_ids)
+    np.testing.assert_allclose(D, expected_scores, rtol=1e-5, atol=1e-5)
+    subset = set(sorted(live)[::4])
+    base_ids = np.array([i for i in subset if i < view.base_upto], dtype="int64")
+    D, I = view.search(queries, n, subset=IdSubset(base_ids), delta_keep=np.isin(view.delta_ids, list(subset)))
+    expected_ids = _exact(live, queries, n, subset)[0]
+    np.testing.assert_array_equal(I[:, :expected_ids.shape[1]], expected_ids)
+    assert (I[:, expected_ids.shape[1]:] == -1).all()
+    sample = np.array(sorted(live)[::7], dtype="int64")
+    np.testing.assert_allclose(view.reconstruct(sample), np.stack([live[i] for i in sample.tolist()]), atol=1e-6)
+
+
+def test_views_match_brute_force_across_rebuilds(monkeypatch):
+    monkeypatch.setattr(rag.snapshot, "SNAPSHOT_DELTA_MIN", 64)
+    rng = np.random.default_rng(5)
+    index = LayeredDenseIndex(DenseIndex(dim=DIM, backend="flat"))
+    queries = _vectors(rng, 4)
+    live, next_id, history = {}, 0, []
+    for step in range(60):
+        n = int(rng.integers(1, 40))
+        vecs = _vectors(rng, n)
+        ids = np.arange(next_id, next_id + n, dtype="int64")
+        next_id += n
+        index.add(ids, vecs)
+        live.update(zip(ids.tolist(), vecs))
+        if step % 2:
+            doomed = rng.choice(sorted(live), size=len(live) // 8, replace=False).tolist()
+            index.remove(doomed)
+            for chunk_id in doomed:
+                del live[chunk_id]
+        view = index.view()
+        _check(view, live, queries)
+        history.append((view, dict(live)))
+    assert len({id(view.base) for view, _ in history}) > 3  # the buffer was folded into new bases
+    # Earlier views still answer for their own version after later writes and rebuilds
+    for view, version in history[::10]:
+        _check(view, version, queries)
+
+
+def test_reset_leaves_published_views_intact():
+    rng = np.random.default_rng(6)
+    index = LayeredDenseIndex(DenseIndex(dim=DIM, backend="flat"))
+    vecs = _vectors(rng, 100)
+    index.add(np.arange(100), vecs)
+    view = index.view()
+    index.reset()
+    assert index.view().ntotal == 0
+    _check(view, dict(zip(range(100), vecs)), _vectors(rng, 3))
+
+
+def test_snapshot_is_stable_while_the_knowledge_base_changes(make_kb, encoder, rng):
+    kb = make_kb()
+    for d in range(4):
+        kb.build_index(make_text(rng, 300), source_name=f"s{d % 2}", doc_id=f"doc{d}")
+    query = "alpha4 tax17 leave2"
+    snap = kb.snapshot()
+    ids_before, _ = brute_force(encoder, kb, query, 8)
+    texts_before = {i: snap.chunks.text(i) for i in snap.chunks.ids().tolist()}
+
+    kb.clear("doc0")
+    kb.build_index(make_text(rng, 300), source_name="s0", doc_id="doc4")
+
+    assert kb.snapshot().version > snap.version
+    assert {i: snap.chunks.text(i) for i in snap.chunks.ids().tolist()} == texts_before
+    D, I = snap.dense_search(encode_dense(encoder, [query]), 8)
+    np.testing.assert_array_equal(I[0], ids_before)
+    D, I = kb.snapshot().dense_search(encode_dense(encoder, [query]), 8)
+    np.testing.assert_array_equal(I[0], brute_force(encoder, kb, query, 8)[0])
+    for source in ("s0", "s1"):
+        D, I = kb.snapshot().dense_search(encode_dense(encoder, [query]), 5, source)
+        np.testing.assert_array_equal(I[0], brute_force(encoder, kb, query, 5, source)[0])
+
+
+def test_searches_during_ingestion(make_kb, rng):
+    kb = make_kb()
+    kb.build_index(make_text(rng, 300), source_name="hr", doc_id="seed")
+    texts = [make_text(rng, 300) for _ in range(20)]
+    errors, done = [], threading.Event()
+
+    def search():
+        while not done.is_set():
+            try:
+                result = kb.search_rag("alpha1 policy3 invoice9", k=3)
+                assert result.startswith("[")
+            except Exception as e:  # noqa: BLE001 - any failure is what the test is looking for
+                errors.append(e)
+
+    readers = [threading.Thread(target=search) for _ in range(3)]
+    for reader in readers:
+        reader.start()
+    for i, text in enumerate(texts):
+        kb.build_index(text, source_name="hr", doc_id=f"doc{i % 5}")
+    done.set()
+    for reader in readers:
+        reader.join()
+    assert not errors
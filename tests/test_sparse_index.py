@@ -0,0 +1,87 @@
+"""SparseIndex against brute-force dict dot products, across segment merges, deletes and re-adds."""
+
+import numpy as np
+import pytest
+
+from rag.sparse_index import SparseIndex, top_n
+
+
+def _random_weights(rng, n, vocab=300, tokens=12):
+    return [{str(t): float(w) for t, w in zip(rng.choice(vocab, size=tokens, replace=False).tolist(),
+                                              rng.uniform(0.01, 0.4, size=tokens).tolist())}
+            for _ in range(n)]
+
+
+def _brute_force(live, query):
+    return {chunk_id: sum(w * query.get(t, 0.0) for t, w in weights.items()) for chunk_id, weights in live.items()}
+
+
+def _check(view, live, rng):
+    for query in _random_weights(rng, 5, tokens=6) + [{"999999": 1.0}, {}]:
+        expected = _brute_force(live, query)
+        ids, scores = view.score_all(query)
+        got = dict(zip(ids.tolist(), scores.tolist()))
+        assert set(got) == {i for i, s in expected.items() if s > 0}
+        for chunk_id, score in got.items():
+            assert score == pytest.approx(expected[chunk_id], rel=1e-5)
+        candidates = sorted(live)[::3] + [10 ** 9]
+        np.testing.assert_allclose(view.score(candidates, query), [expected.get(i, 0.0) for i in candidates],
+                                   rtol=1e-5, atol=1e-7)
+        best = sorted(expected.items(), key=lambda item: -item[1])[:5]
+        assert [s for _, s in view.search(query, 5)] == pytest.approx([s for _, s in best if s > 0], rel=1e-5)
+
+
+def test_matches_brute_force_through_merges_and_deletes():
+    rng = np.random.default_rng(3)
+    index, live, next_id = SparseIndex(), {}, 0
+    for step in range(40):
+        n = int(rng.integers(1, 30))
+        weights = _random_weights(rng, n)
+        ids = list(range(next_id, next_id + n))
+        next_id += n
+        index.add_batch(ids, weights)
+        live.update(zip(ids, weights))
+        if step % 3 == 2:
+            doomed = rng.choice(sorted(live), size=len(live) // 5, replace=False).tolist()
+            index.remove_batch(doomed)
+            for chunk_id in doomed:
+                del live[chunk_id]
+        assert len(index) == len(live)
+        if step % 5 == 4:
+            _check(index, live, rng)
+    for chunk_id in rng.choice(sorted(live), size=10, replace=False).tolist():
+        assert index.weights(chunk_id) == pytest.approx(live[chunk_id])
+    _check(index, live, rng)
+
+
+def test_readding_an_id_replaces_its_weights():
+    index = SparseIndex()
+    index.add_batch([1, 2], [{"5": 0.3}, {"6": 0.2}])
+    index.add_batch([1], [{"7": 0.1}])
+    assert len(index) == 2
+    assert index.weights(1) == pytest.approx({"7": 0.1})
+    assert index.score([1], {"5": 1.0})[0] == 0
+
+
+def test_view_is_unaffected_by_later_writes():
+    rng = np.random.default_rng(4)
+    index = SparseIndex()
+    weights = _random_weights(rng, 50)
+    index.add_batch(range(50), weights)
+    view = index.view()
+    before = dict(zip(range(50), weights))
+
+    index.remove_batch(range(0, 50, 2))
+    index.add_batch(range(50, 80), _random_weights(rng, 30))
+    index.clear()
+
+    assert len(view) == 50
+    _check(view, before, rng)
+
+
+def test_top_n_orders_by_score():
+    ids = np.array([4, 8, 15, 16, 23], dtype="int64")
+    scores = np.array([0.1, 0.5, 0.3, 0.5, 0.05], dtype="float32")
+    assert [i for i, _ in top_n(ids, scores, 3)] in ([8, 16, 15], [16, 8, 15])
+    assert top_n(ids, scores, 0) == []
+    assert len(top_n(ids, scores, 10)) == 5
@@ -0,0 +1,124 @@
+"""Document upserts: only changed chunks are embedded, and overlapping upserts of one doc_id never mix."""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from rag.pipeline import ingest_documents, ingest_pages
+from conftest import make_text
+
+
+def _doc_texts(kb, doc_id):
+    return sorted(kb.chunks.text(i) for i in kb.chunks.ids_for_doc(doc_id).tolist())
+
+
+def _expected(kb, text):
+    return sorted(kb.chunker().chunk(kb._clean_text(text)))
+
+
+def _pages(text, words=150, delay=0.0):
+    tokens = text.split(" ")
+    for n, start in enumerate(range(0, len(tokens), words)):
+        time.sleep(delay)
+        yield {"text": " ".join(tokens[start:start + words]), "page": n + 1}
+
+
+def test_reupload_embeds_only_changed_chunks(make_kb, encoder, rng):
+    kb = make_kb()
+    text = make_text(rng, 2000)
+    kb.build_index(text, source_name="hr", doc_id="hr/a.txt")
+    kept_ids = set(kb.chunks.ids_for_doc("hr/a.txt").tolist())
+    tokens = text.split(" ")
+    edited = " ".join(tokens[:1000] + ["brandnew"] + tokens[1001:])
+    encoded = encoder.encoded
+
+    stats = ingest_pages(kb, _pages(edited), "hr", "hr/a.txt")
+
+    assert _doc_texts(kb, "hr/a.txt") == _expected(kb, edited)
+    assert stats["chunks_added"] == encoder.encoded - encoded
+    assert stats["chunks_added"] == stats["chunks_removed"] <= 2
+    assert len(kept_ids & set(kb.chunks.ids_for_doc("hr/a.txt").tolist())) == stats["chunks_reused"]
+
+
+def test_moving_category_reindexes(make_kb, rng):
+    kb = make_kb()
+    text = make_text(rng, 500)
+    kb.build_index(text, source_name="hr", doc_id="doc")
+    kb.build_index(text, source_name="finance", doc_id="doc")
+    assert kb.chunks.source_count("hr") == 0
+    assert kb.chunks.source_count("finance") == len(_expected(kb, text))
+
+
+def test_concurrent_upserts_of_one_document_never_mix(make_kb, rng):
+    kb = make_kb()
+    versions = [make_text(rng, 1500) for _ in range(4)]
+    with ThreadPoolExecutor(4) as pool:
+        list(pool.map(lambda text: ingest_pages(kb, _pages(text, delay=0.002), "hr", "hr/a.txt", batch_chunks=3),
+                      versions * 2))
+    assert _doc_texts(kb, "hr/a.txt") in [_expected(kb, text) for text in versions]
+    assert not kb._doc_locks
+
+
+def test_bulk_entries_with_one_name_apply_in_order(make_kb, rng):
+    kb = make_kb()
+    versions = [make_text(rng, 800) for _ in range(3)]
+    documents = [("a.txt", versions[0], "hr"), ("b.txt", versions[1], "hr"),
+                 ("a.txt", versions[1], "hr"), ("a.txt", versions[2], "hr")]
+    with ThreadPoolExecutor(2) as pool:
+        result = ingest_documents(kb, documents, extract=lambda text, name: [{"text": text}],
+                                  executor=pool, parallelism=2, batch_chunks=4)
+    assert result["failed"] == 0
+    assert _doc_texts(kb, "hr/a.txt") == _expected(kb, versions[2])
+    assert _doc_texts(kb, "hr/b.txt") == _expected(kb, versions[1])
+    assert not kb._doc_locks
+
+
+def test_failed_upsert_releases_document(make_kb, rng):
+    kb = make_kb()
+
+    def broken_pages():
+        yield {"text": make_text(rng, 200)}
+        raise RuntimeError("extraction failed")
+
+    try:
+        ingest_pages(kb, broken_pages(), "hr", "hr/a.txt")
+    except RuntimeError:
+        pass
+    assert not kb._doc_locks
+    kb.build_index(make_text(rng, 200), source_name="hr", doc_id="hr/a.txt")  # would block if still locked
+
+
+def test_failure_partway_rolls_back_to_the_previous_version(make_kb, rng):
+    kb = make_kb()
+    old, new = make_text(rng, 800), make_text(rng, 4000)  # long enough to stream chunks before the end
+    kb.build_index(old, source_name="hr", doc_id="hr/a.txt")
+    old_ids = sorted(kb.chunks.ids_for_doc("hr/a.txt").tolist())
+    added = []
+    kb_add = kb.add_documents
+
+    def add_documents(*args, **kwargs):
+        ids = kb_add(*args, **kwargs)
+        added.extend(ids.tolist())
+        return ids
+
+    kb.add_documents = add_documents
+
+    def failing_pages():
+        pages = list(_pages(new, words=100))
+        yield from pages[:-1]
+        deadline = time.monotonic() + 10
+        while not added and time.monotonic() < deadline:  # fail once a batch of the new version is indexed
+            time.sleep(0.005)
+        raise RuntimeError("OCR failed")
+
+    with pytest.raises(RuntimeError):
+        ingest_pages(kb, failing_pages(), "hr", "hr/a.txt", batch_chunks=1)
+
+    assert added
+    assert sorted(kb.chunks.ids_for_doc("hr/a.txt").tolist()) == old_ids
+    new_chunks = set(_expected(kb, new)) - set(_expected(kb, old))
+    for query in [new[:300], old[:300]]:
+        result = kb.search_rag(query, k=5)
+        assert not any(chunk in result for chunk in new_chunks)
+        assert result.startswith("[hr]")